@@ -3,6 +3,7 @@ import os
 from pathlib import Path
 from typing import Optional, List
 from dotenv import load_dotenv
+from PIL import Image
 
 # Load environment variables from .env file
 load_dotenv()
@@ -22,8 +23,9 @@ class Config:
     # Storage Settings
     STORAGE_DIR: str = os.getenv("STORAGE_DIR", "uploads")
     TEMP_DIR: str = os.getenv("TEMP_DIR", "temp")
-    MAX_FILE_SIZE: int = int(os.getenv("MAX_FILE_SIZE", "52428800"))  # 50MB default
+    MAX_FILE_SIZE: int = int(os.getenv("MAX_FILE_SIZE", "536870912"))  # 512MB default, room for orthomosaics
     ALLOWED_EXTENSIONS: List[str] = os.getenv("ALLOWED_EXTENSIONS", ".jpg,.jpeg,.png,.bmp,.tiff,.webp").split(",")
+    MAX_IMAGE_DIMENSION: int = int(os.getenv("MAX_IMAGE_DIMENSION", "32768"))  # Max width or height in pixels; images past MODELSHIP_STREAMING_MIN_PIXELS are streamed
     
     # Supabase Settings
     SUPABASE_URL: Optional[str] = os.getenv("SUPABASE_URL")
@@ -44,6 +46,19 @@ class Config:
     OVERLAP_WIDTH_RATIO: float = float(os.getenv("OVERLAP_WIDTH_RATIO", "0.2"))
     AUTO_SLICE_RESOLUTION: bool = os.getenv("AUTO_SLICE_RESOLUTION", "true").lower() == "true"
     
+    # Job Queue Settings
+    LABELING_FETCH_WORKERS: int = int(os.getenv("LABELING_FETCH_WORKERS", "4"))  # Image paths looked up concurrently
+    LABELING_DECODE_WORKERS: int = int(os.getenv("LABELING_DECODE_WORKERS", "2"))  # Images decoded concurrently
+    LABELING_WORKERS: int = int(os.getenv("LABELING_WORKERS", "4"))  # Images inferred concurrently
+    LABELING_PERSIST_WORKERS: int = int(os.getenv("LABELING_PERSIST_WORKERS", "2"))  # Annotation writes in flight
+    LABELING_STAGE_QUEUE_SIZE: int = int(os.getenv("LABELING_STAGE_QUEUE_SIZE", "2"))  # Images waiting in front of each stage
+    LABELING_REUSE_RESULTS: bool = os.getenv("LABELING_REUSE_RESULTS", "true").lower() == "true"  # Skip images already labeled with the same model and config
+    JOB_QUEUE_MAX_IMAGES: int = int(os.getenv("JOB_QUEUE_MAX_IMAGES", "10000"))  # Queued images before new jobs are refused
+    JOB_STORE_BACKEND: str = os.getenv("JOB_STORE_BACKEND", "sqlite")
+    JOB_STORE_PATH: str = os.getenv("JOB_STORE_PATH", "data/jobs.db")
+    JOB_STORE_FLUSH_INTERVAL: float = float(os.getenv("JOB_STORE_FLUSH_INTERVAL", "1.0"))  # Seconds between batched progress writes
+    JOB_RESULTS_DIR: str = os.getenv("JOB_RESULTS_DIR", "data/job_results")
+    
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "dev-secret-change-in-production")
     CORS_ORIGINS: List[str] = os.getenv("CORS_ORIGINS", "*").split(",")
@@ -82,6 +97,22 @@ class Config:
         if cls.MAX_FILE_SIZE <= 0:
             raise ValueError("MAX_FILE_SIZE must be positive")
         
+        if cls.MAX_IMAGE_DIMENSION <= 0:
+            raise ValueError("MAX_IMAGE_DIMENSION must be positive")
+        
+        for name in (
+            "LABELING_FETCH_WORKERS",
+            "LABELING_DECODE_WORKERS",
+            "LABELING_WORKERS",
+            "LABELING_PERSIST_WORKERS",
+            "LABELING_STAGE_QUEUE_SIZE"
+        ):
+            if getattr(cls, name) <= 0:
+                raise ValueError(f"{name} must be positive")
+        
+        if cls.JOB_STORE_FLUSH_INTERVAL <= 0:
+            raise ValueError("JOB_STORE_FLUSH_INTERVAL must be positive")
+        
         if not (0 <= cls.CONFIDENCE_THRESHOLD <= 1):
             raise ValueError("CONFIDENCE_THRESHOLD must be between 0 and 1")
 
@@ -90,4 +121,8 @@ settings = Config()
 
 # Ensure directories exist and validate config on import
 settings.ensure_directories()
-settings.validate_config() 
\ No newline at end of file
+settings.validate_config()
+
+# Image sizes are limited by MAX_IMAGE_DIMENSION instead of PIL's
+# decompression bomb check, which would refuse large orthomosaics
+Image.MAX_IMAGE_PIXELS = max(Image.MAX_IMAGE_PIXELS or 0, settings.MAX_IMAGE_DIMENSION ** 2)
@@ -1,12 +1,20 @@
 # app/main.py
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+import asyncio
 import logging
 import time
+from contextlib import asynccontextmanager
 from app.core.config import settings
+from app.pipeline.config import config as model_config
+from app.pipeline.executor import loop_monitor, shutdown_inference_executor
+from app.pipeline.registry import model_registry
+from app.pipeline.workers import get_inference_workers, shutdown_inference_workers
+from app.storage.job_store import close_job_store
 from app.routes import upload, clean, label, preview, export
 
 # Configure logging
@@ -16,10 +24,67 @@ logger = logging.getLogger(__name__)
 # Create rate limiter
 limiter = Limiter(key_func=get_remote_address)
 
+
+# Readiness of this instance, reported to the load balancer by /ready
+readiness = {
+    "ready": False,
+    "phase": "starting",
+    "error": None,
+    "startup_time": None,
+    "models": []
+}
+
+
+async def warm_up_models():
+    """Load and warm up the configured models, then mark the instance ready."""
+    start_time = time.time()
+    readiness["phase"] = "warming_up"
+    try:
+        if model_config.INFERENCE_BACKEND == "process":
+            workers = get_inference_workers()
+            await asyncio.to_thread(workers.start)
+            readiness["models"] = [workers.stats()]
+        else:
+            readiness["models"] = await asyncio.to_thread(model_registry.warmup)
+    except Exception as e:
+        # Anything else (a missing runtime, a worker that died while
+        # starting) would otherwise leave the phase at warming_up for good
+        readiness.update(phase="failed", error=str(e))
+        logger.error(f"Model warmup failed, instance will not report ready: {e}")
+        return
+    
+    readiness.update(
+        ready=True,
+        phase="ready",
+        startup_time=round(time.time() - start_time, 3)
+    )
+    logger.info(f"Models warmed up in {readiness['startup_time']:.2f}s, instance ready")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up models in the background at startup and release them at shutdown."""
+    # The server answers /health (liveness) while models warm up; /ready
+    # only succeeds once they are done
+    warmup_task = asyncio.create_task(warm_up_models())
+    loop_monitor.start()
+    
+    yield
+    
+    warmup_task.cancel()
+    await loop_monitor.stop()
+    await label.shutdown_labeling_service()
+    shutdown_inference_executor()
+    shutdown_inference_workers()
+    model_registry.close()
+    close_job_store()
+
+
 app = FastAPI(
     title="ModelShip API",
     description="AI-powered auto-labeling platform for images",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add rate limiter error handler
@@ -70,5 +135,15 @@ async def root():
 @app.get("/health")
 @limiter.limit("60/minute")
 async def health_check():
-    """Health check endpoint."""
+    """Liveness check endpoint (does not wait for models, see /ready)."""
     return {"status": "healthy"}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check endpoint: 503 until models are loaded and warmed up."""
+    if not readiness["ready"]:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "not_ready", **readiness}
+        )
+    return {"status": "ready", **readiness}
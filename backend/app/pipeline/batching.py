@@ -0,0 +1,373 @@
+# app/pipeline/batching.py
+"""
+Cross-request micro-batching in front of a detector.
+
+Requests submit images (usually SAHI slices) one by one; a dispatcher thread
+groups everything that arrives within a short window into one batch, runs
+it, and routes each result back to its caller. A batch is flushed when it is
+full or when its oldest image has waited max_wait, whichever comes first.
+"""
+
+import logging
+import math
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .config import config
+from .detector import YOLOXDetector, DetectorError
+from .pool import DetectorPool, run_as_completed
+from .postprocess import Detections
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Item:
+    """An image waiting for a batch."""
+    image: np.ndarray
+    conf_thresh: float
+    nms_thresh: float
+    future: Future
+    enqueued_at: float
+
+
+@dataclass
+class BatchingStats:
+    """Counters of dispatched batches."""
+    batches: int = 0
+    images: int = 0
+    full_flushes: int = 0
+    deadline_flushes: int = 0
+    queue_wait_time: float = 0.0
+    max_queue_wait: float = 0.0
+    errors: int = 0
+
+
+def _gather(futures: List[Future]) -> Future:
+    """Combine per-image futures into one future of all results, in order."""
+    gathered: Future = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def _done(_: Future) -> None:
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        try:
+            if any(future.cancelled() for future in futures):
+                gathered.cancel()
+                return
+            error = next((future.exception() for future in futures if future.exception()), None)
+            if error is not None:
+                gathered.set_exception(error)
+            else:
+                gathered.set_result([future.result() for future in futures])
+        except InvalidStateError:
+            pass  # Cancelled by the caller meanwhile
+
+    def _cancel(done: Future) -> None:
+        if done.cancelled():
+            for future in futures:
+                future.cancel()
+
+    if not futures:
+        gathered.set_result([])
+        return gathered
+    gathered.add_done_callback(_cancel)
+    for future in futures:
+        future.add_done_callback(_done)
+    return gathered
+
+
+class MicroBatcher:
+    """Collects images from concurrent callers into shared detector batches."""
+
+    def __init__(
+        self,
+        detector: Union[YOLOXDetector, DetectorPool],
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None
+    ):
+        """
+        Initialize the batcher and start its dispatcher thread.
+
+        Args:
+            detector: Detector or detector pool running the batches
+            max_batch_size: Images per batch (defaults to config, or to the
+                detector's max batch size)
+            max_wait_ms: Longest time an image waits for a batch to fill
+                (defaults to config)
+        """
+        self.detector = detector
+        self.conf_thresh = detector.conf_thresh
+        self.nms_thresh = detector.nms_thresh
+        self.max_batch_size = max(1, min(
+            max_batch_size or config.MICRO_BATCH_MAX_SIZE or detector.max_batch_size,
+            detector.max_batch_size
+        ))
+        self.max_wait = (
+            config.MICRO_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+        ) / 1000.0
+
+        self._queue: "queue.Queue[Optional[_Item]]" = queue.Queue()
+        self._stats = BatchingStats()
+        self._stats_lock = threading.Lock()
+        # Held while enqueueing and while closing, so no image can be queued
+        # behind the stop sentinel
+        self._submit_lock = threading.Lock()
+        self._closed = False
+        self._dispatcher = threading.Thread(
+            target=self._run,
+            name="micro-batcher",
+            daemon=True
+        )
+        self._dispatcher.start()
+        logger.info(
+            f"Micro-batching up to {self.max_batch_size} images "
+            f"or {self.max_wait * 1000:.1f} ms"
+        )
+
+    @property
+    def model_path(self) -> Path:
+        return self.detector.model_path
+
+    @property
+    def input_size(self) -> Tuple[int, int]:
+        return self.detector.input_size
+
+    @property
+    def session_info(self) -> Dict:
+        return self.detector.session_info
+
+    @property
+    def load_stats(self) -> Dict[str, float]:
+        return self.detector.load_stats
+
+    def _run(self) -> None:
+        """Collect queued images into batches until closed."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            deadline = item.enqueued_at + self.max_wait
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._dispatch(batch)
+            if stopping:
+                return
+
+    def _dispatch(self, batch: List[_Item]) -> None:
+        """Run a batch, one detector call per threshold setting."""
+        now = time.perf_counter()
+        waits = [now - item.enqueued_at for item in batch]
+        with self._stats_lock:
+            self._stats.batches += 1
+            self._stats.images += len(batch)
+            if len(batch) >= self.max_batch_size:
+                self._stats.full_flushes += 1
+            else:
+                self._stats.deadline_flushes += 1
+            self._stats.queue_wait_time += sum(waits)
+            self._stats.max_queue_wait = max(self._stats.max_queue_wait, max(waits))
+
+        groups: Dict[Tuple[float, float], List[_Item]] = {}
+        for item in batch:
+            if item.future.set_running_or_notify_cancel():
+                groups.setdefault((item.conf_thresh, item.nms_thresh), []).append(item)
+
+        for (conf_thresh, nms_thresh), items in groups.items():
+            images = [item.image for item in items]
+            if isinstance(self.detector, DetectorPool):
+                # Keep collecting while the pool's sessions run this batch
+                try:
+                    future = self.detector.submit(images, conf_thresh, nms_thresh)
+                except Exception as e:
+                    # The callers' futures are already running; fail them
+                    # instead of the dispatcher thread
+                    future = Future()
+                    future.set_exception(e)
+                    self._route(items, future)
+                    continue
+                future.add_done_callback(
+                    lambda done, items=items: self._route(items, done)
+                )
+            else:
+                future = Future()
+                try:
+                    future.set_result(self.detector.detect_batch(images, conf_thresh, nms_thresh))
+                except Exception as e:
+                    future.set_exception(e)
+                self._route(items, future)
+
+    def _route(self, items: List[_Item], done: Future) -> None:
+        """Hand each caller its image's result."""
+        error = done.exception()
+        if error is not None:
+            with self._stats_lock:
+                self._stats.errors += 1
+            for item in items:
+                item.future.set_exception(error)
+            return
+        for item, detections in zip(items, done.result()):
+            item.future.set_result(detections)
+
+    def submit(
+        self,
+        images: List[np.ndarray],
+        conf_thresh: Optional[float] = None,
+        nms_thresh: Optional[float] = None
+    ) -> List[Future]:
+        """
+        Queue images for the next batches.
+
+        Returns:
+            One future per image resolving to its Detections
+        """
+        futures = []
+        with self._submit_lock:
+            if self._closed:
+                raise DetectorError("Micro-batcher is closed")
+            for image in images:
+                future: Future = Future()
+                self._queue.put(_Item(
+                    image=image,
+                    conf_thresh=self.conf_thresh if conf_thresh is None else conf_thresh,
+                    nms_thresh=self.nms_thresh if nms_thresh is None else nms_thresh,
+                    future=future,
+                    enqueued_at=time.perf_counter()
+                ))
+                futures.append(future)
+        return futures
+
+    def detect_batch(
+        self,
+        images: List[np.ndarray],
+        conf_thresh: Optional[float] = None,
+        nms_thresh: Optional[float] = None
+    ) -> List[Detections]:
+        """
+        Run detection on many images, batched together with other callers.
+
+        Args:
+            images: BGR images (or slices) as numpy arrays
+            conf_thresh: Optional override for confidence threshold
+            nms_thresh: Optional override for NMS threshold
+
+        Returns:
+            Detections per input image, in input order
+        """
+        return [future.result() for future in self.submit(images, conf_thresh, nms_thresh)]
+
+    def detect_as_completed(
+        self,
+        images: List[np.ndarray],
+        conf_thresh: Optional[float] = None,
+        nms_thresh: Optional[float] = None,
+        parallelism: Optional[int] = None
+    ) -> Iterator[Tuple[int, List[Detections]]]:
+        """
+        Run detection on many images with at most `parallelism` batches of
+        them in flight, yielding results as they complete (see
+        pool.run_as_completed).
+
+        Args:
+            images: BGR images (or slices) as numpy arrays
+            conf_thresh: Optional override for confidence threshold
+            nms_thresh: Optional override for NMS threshold
+            parallelism: Most batches in flight at once (defaults to config,
+                or to the pool's session count)
+
+        Yields:
+            Tuples of (index of the chunk's first image, Detections per image)
+        """
+        parallelism = max(1, parallelism or config.SLICE_PARALLELISM or getattr(self.detector, "size", 1))
+        chunk_size = min(math.ceil(len(images) / parallelism), self.max_batch_size)
+        return run_as_completed(
+            lambda chunk: _gather(self.submit(chunk, conf_thresh, nms_thresh)),
+            images,
+            chunk_size,
+            parallelism
+        )
+
+    def detect(
+        self,
+        image: np.ndarray,
+        conf_thresh: Optional[float] = None,
+        nms_thresh: Optional[float] = None
+    ) -> List[Dict]:
+        """Run detection on one image (same output as YOLOXDetector.detect)."""
+        return self.detect_batch([image], conf_thresh, nms_thresh)[0].to_list()
+
+    def warmup(
+        self,
+        batch_sizes: Optional[List[int]] = None,
+        image_shape: Optional[Tuple[int, int]] = None,
+        runs: int = 1
+    ):
+        """Warm the wrapped detector, including the micro-batch size."""
+        batch_sizes = batch_sizes or [1, self.max_batch_size, self.detector.max_batch_size]
+        return self.detector.warmup(batch_sizes, image_shape, runs)
+
+    def stats(self) -> Dict:
+        """Get detector statistics plus batch fill and queue wait."""
+        with self._stats_lock:
+            s = self._stats
+            batching = {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queue_depth": self._queue.qsize(),
+                "batches": s.batches,
+                "images": s.images,
+                "average_batch_size": s.images / s.batches if s.batches else 0.0,
+                "fill_ratio": s.images / (s.batches * self.max_batch_size) if s.batches else 0.0,
+                "full_flushes": s.full_flushes,
+                "deadline_flushes": s.deadline_flushes,
+                "average_queue_wait": s.queue_wait_time / s.images if s.images else 0.0,
+                "max_queue_wait": s.max_queue_wait,
+                "errors": s.errors
+            }
+        stats = self.detector.stats() if hasattr(self.detector, "stats") else {}
+        return {**stats, "micro_batching": batching}
+
+    def close(self) -> None:
+        """Flush queued images, stop the dispatcher and close the detector."""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._dispatcher.join()
+
+        # Fail whatever the dispatcher left behind, so no caller waits forever
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and item.future.set_running_or_notify_cancel():
+                item.future.set_exception(DetectorError("Micro-batcher is closed"))
+        if hasattr(self.detector, "close"):
+            self.detector.close()
+        logger.info("Micro-batcher closed")
@@ -0,0 +1,315 @@
+# app/pipeline/candidates.py
+"""
+Pre-threshold detection candidates and their cache.
+
+With candidates kept, the detector runs once at a low confidence floor
+with NMS disabled (postprocess.NO_NMS) and returns every scored box of
+each model input (slice, full frame or coarse pass). Confidence filtering,
+per-input NMS, clipping and the slice merge are then applied here, so any
+confidence threshold at or above the floor and any NMS threshold give the
+same result as a fresh run, without running the model again.
+
+Candidates are cached on disk per image and model version, and reviewers
+tuning thresholds re-threshold them in milliseconds.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from .config import config
+from .merge import merge_detections
+from .postprocess import Detections, batched_nms
+
+logger = logging.getLogger(__name__)
+
+
+class CandidateError(Exception):
+    """Custom exception for candidate cache errors."""
+    pass
+
+
+@dataclass
+class Candidates:
+    """Scored boxes of one image before thresholds, NMS and merging."""
+    boxes: np.ndarray      # (N, 4) float32, unclipped, relative to their model input's window
+    scores: np.ndarray     # (N,) float32
+    class_ids: np.ndarray  # (N,) int32
+    sources: np.ndarray    # (N,) int32 index into windows of the model input each box came from
+    windows: np.ndarray    # (S, 4) [x_min, y_min, x_max, y_max] image region of each model input
+    conf_floor: float      # Confidence threshold the candidates were detected at
+
+    @classmethod
+    def empty(cls, conf_floor: float) -> "Candidates":
+        """Create an empty candidate set."""
+        return cls.from_detections([], np.zeros((0, 4), dtype=np.float32), conf_floor)
+
+    @classmethod
+    def from_detections(
+        cls,
+        detections: List[Detections],
+        windows: np.ndarray,
+        conf_floor: float
+    ) -> "Candidates":
+        """
+        Collect the candidates of several model inputs.
+
+        Args:
+            detections: Candidates per model input, in the input's own
+                coordinates (detected with NMS disabled)
+            windows: (len(detections), 4) image region of each input
+            conf_floor: Confidence threshold they were detected at
+        """
+        local = Detections.concatenate(detections)
+        return cls(
+            boxes=local.boxes,
+            scores=local.scores,
+            class_ids=local.class_ids,
+            sources=np.repeat(np.arange(len(detections), dtype=np.int32), [len(d) for d in detections]),
+            windows=np.asarray(windows, dtype=np.float32).reshape(-1, 4),
+            conf_floor=conf_floor
+        )
+
+    @classmethod
+    def concatenate(cls, parts: List["Candidates"]) -> "Candidates":
+        """Join candidate sets of different model inputs of one image."""
+        conf_floor = max((part.conf_floor for part in parts), default=0.0)
+        if not parts:
+            return cls.empty(conf_floor)
+        first_source = np.cumsum([0] + [len(part.windows) for part in parts[:-1]])
+        return cls(
+            boxes=np.concatenate([part.boxes for part in parts]),
+            scores=np.concatenate([part.scores for part in parts]),
+            class_ids=np.concatenate([part.class_ids for part in parts]),
+            sources=np.concatenate([
+                part.sources + np.int32(first) for part, first in zip(parts, first_source)
+            ]).astype(np.int32),
+            windows=np.concatenate([part.windows for part in parts]),
+            conf_floor=conf_floor
+        )
+
+    def __len__(self) -> int:
+        return int(self.scores.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self.boxes, self.scores, self.class_ids, self.sources, self.windows))
+
+    def select(
+        self,
+        conf_thresh: float,
+        nms_thresh: float,
+        max_detections: Optional[int] = None,
+        class_agnostic: Optional[bool] = None
+    ) -> Detections:
+        """
+        Apply the detector's thresholds to the candidates of each model input.
+
+        Same as the detector's postprocessing of each input followed by
+        shifting it into place: boxes above conf_thresh, class-aware NMS
+        per input, the max_detections cap per input, clipping to the input.
+
+        Args:
+            conf_thresh: Confidence threshold, at least the floor
+            nms_thresh: NMS IoU threshold
+            max_detections: Boxes kept per input (defaults to config)
+            class_agnostic: Suppress across classes (defaults to config)
+
+        Returns:
+            Unmerged detections in image coordinates
+
+        Raises:
+            CandidateError: If conf_thresh is below the floor
+        """
+        if conf_thresh < self.conf_floor:
+            raise CandidateError(
+                f"Confidence threshold {conf_thresh} is below the {self.conf_floor} "
+                f"the candidates were detected at"
+            )
+        max_detections = max_detections or config.MAX_DETECTIONS
+        if class_agnostic is None:
+            class_agnostic = config.CLASS_AGNOSTIC_NMS
+
+        above = np.flatnonzero(self.scores > conf_thresh)
+        if above.size == 0:
+            return Detections.empty()
+        boxes = self.boxes[above]
+        sources = self.sources[above]
+
+        # NMS within each input: inputs (and classes) are shifted apart in
+        # float64 so they never overlap
+        groups = sources.astype(np.int64)
+        if not class_agnostic:
+            groups = groups * (int(self.class_ids.max()) + 1) + self.class_ids[above]
+        keep = above[batched_nms(boxes, self.scores[above], groups, nms_thresh)]
+
+        # Cap per input, keeping its highest-scoring boxes
+        by_source = keep[np.argsort(self.sources[keep], kind="stable")]
+        counts = np.bincount(self.sources[by_source], minlength=len(self.windows))
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        keep = by_source[np.arange(by_source.size) - starts < max_detections]
+
+        # Clip to the input, drop boxes outside it, then shift into place
+        sources = self.sources[keep]
+        windows = self.windows[sources]
+        boxes = self.boxes[keep].copy()
+        np.clip(boxes[:, 0::2], 0, (windows[:, 2] - windows[:, 0])[:, None], out=boxes[:, 0::2])
+        np.clip(boxes[:, 1::2], 0, (windows[:, 3] - windows[:, 1])[:, None], out=boxes[:, 1::2])
+        valid = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+        boxes, windows, keep = boxes[valid], windows[valid], keep[valid]
+        boxes[:, :2] += windows[:, :2]
+        boxes[:, 2:] += windows[:, :2]
+        return Detections(
+            boxes=np.ascontiguousarray(boxes, dtype=np.float32),
+            scores=np.ascontiguousarray(self.scores[keep]),
+            class_ids=np.ascontiguousarray(self.class_ids[keep])
+        )
+
+    def apply_thresholds(self, conf_thresh: float, nms_thresh: float) -> Detections:
+        """
+        Get the merged detections of the image at the given thresholds.
+
+        Returns:
+            Merged detections in image coordinates, highest score first
+        """
+        return merge_detections(self.select(conf_thresh, nms_thresh))
+
+    def save(self, path: Path) -> None:
+        """Write the candidates to an .npz file."""
+        np.savez(
+            path,
+            boxes=self.boxes,
+            scores=self.scores,
+            class_ids=self.class_ids,
+            sources=self.sources,
+            windows=self.windows,
+            conf_floor=np.float64(self.conf_floor)
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "Candidates":
+        """Read candidates written by save()."""
+        with np.load(path) as data:
+            return cls(
+                boxes=data["boxes"],
+                scores=data["scores"],
+                class_ids=data["class_ids"],
+                sources=data["sources"],
+                windows=data["windows"],
+                conf_floor=float(data["conf_floor"])
+            )
+
+
+@lru_cache(maxsize=1024)
+def _file_sha256(path: str, size: int, mtime_ns: int) -> str:
+    """Hash a file's content; cached per path, size and modification time."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_sha256(path: Union[str, Path]) -> str:
+    """
+    Get the SHA-256 of a file's content.
+
+    Args:
+        path: File to hash
+
+    Returns:
+        Hex digest; recent files are not read again until they change
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    return _file_sha256(str(path), stat.st_size, stat.st_mtime_ns)
+
+
+def model_version(
+    model_path: Optional[Union[str, Path]] = None,
+    input_size: Optional[Tuple[int, int]] = None
+) -> str:
+    """
+    Identify a model by the content of its file and its input size.
+
+    Args:
+        model_path: ONNX model file (defaults to config)
+        input_size: Model input size (defaults to config)
+
+    Returns:
+        Short hex digest, stable across copies of the same model file
+    """
+    content = file_sha256(model_path or config.model_path)
+    width, height = input_size or config.INPUT_SIZE
+    return hashlib.sha256(f"{content}:{width}x{height}".encode()).hexdigest()[:16]
+
+
+class CandidateCache:
+    """Candidates per image and model version, in .npz files evicted least recently used first."""
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_bytes: Optional[int] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Cache directory (defaults to config)
+            max_bytes: Cache size limit (defaults to config; 0 = unlimited)
+        """
+        self.cache_dir = Path(cache_dir or config.CANDIDATE_CACHE_DIR)
+        self.max_bytes = config.CANDIDATE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    def _path(self, image_id: str, version: str) -> Path:
+        key = hashlib.sha1(f"{image_id}:{version}".encode()).hexdigest()
+        return self.cache_dir / f"{key}.npz"
+
+    def put(self, image_id: str, version: str, candidates: Candidates) -> None:
+        """Store the candidates of an image detected by a model version."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Write under a temporary name so concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                candidates.save(tmp_file)
+            os.replace(tmp_path, self._path(image_id, version))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self._evict()
+
+    def get(self, image_id: str, version: str) -> Optional[Candidates]:
+        """Get the cached candidates of an image, or None."""
+        path = self._path(image_id, version)
+        try:
+            candidates = Candidates.load(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Dropping unreadable candidates of image {image_id}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)  # Mark as recently used
+        return candidates
+
+    def _evict(self) -> None:
+        """Drop least recently used entries beyond the size limit."""
+        if self.max_bytes <= 0:
+            return
+        entries = []
+        for entry in self.cache_dir.glob("*.npz"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        total = 0
+        for _, size, entry in sorted(entries, key=lambda item: item[0], reverse=True):
+            total += size
+            if total > self.max_bytes:
+                entry.unlink(missing_ok=True)
@@ -26,6 +26,100 @@ class ModelConfig(BaseSettings):
         default="classes.json",
         description="JSON file containing class names"
     )
+    MODEL_PRECISION: str = Field(
+        default="fp32",
+        description="Model variant to serve: the original float model or a quantized one built by app.pipeline.quantize (fp32, int8_dynamic or int8_static)"
+    )
+    
+    # ONNX Runtime session settings
+    EXECUTION_PROVIDERS: List[str] = Field(
+        default=["CPUExecutionProvider"],
+        description="ONNX Runtime execution providers in priority order"
+    )
+    INTRA_OP_NUM_THREADS: int = Field(
+        default=0,
+        description="Threads used within an operator (0 = ONNX Runtime default)"
+    )
+    INTER_OP_NUM_THREADS: int = Field(
+        default=0,
+        description="Threads used across operators in parallel mode (0 = ONNX Runtime default)"
+    )
+    EXECUTION_MODE: str = Field(
+        default="sequential",
+        description="Graph execution mode (sequential or parallel)"
+    )
+    GRAPH_OPTIMIZATION_LEVEL: str = Field(
+        default="all",
+        description="Graph optimization level (disable, basic, extended or all)"
+    )
+    ENABLE_MEM_ARENA: bool = Field(
+        default=True,
+        description="Use the CPU memory arena allocator"
+    )
+    ENABLE_MEM_PATTERN: bool = Field(
+        default=True,
+        description="Pre-plan memory allocations from the first run's pattern"
+    )
+    OPTIMIZED_MODEL_CACHE: bool = Field(
+        default=True,
+        description="Cache the optimized graph on disk so later starts skip optimization"
+    )
+    OPTIMIZED_MODEL_CACHE_DIR: Path = Field(
+        default=Path("models/cache"),
+        description="Directory for cached optimized models"
+    )
+    POOL_SIZE: int = Field(
+        default=0,
+        description="Number of inference sessions in the detector pool (0 = derive from core count)"
+    )
+    POOL_THREADS_PER_SESSION: int = Field(
+        default=0,
+        description="Intra-op threads per pooled session (0 = derive from core count)"
+    )
+    LOAD_BENCHMARK_RUNS: int = Field(
+        default=3,
+        description="Inference runs timed at load to log steady-state latency (0 to skip)"
+    )
+    WARMUP_INPUT_SIZES: List[Tuple[int, int]] = Field(
+        default=[],
+        description="Input sizes to load and warm up at startup (empty = INPUT_SIZE)"
+    )
+    WARMUP_BATCH_SIZES: List[int] = Field(
+        default=[],
+        description="Batch sizes to warm up at startup (empty = 1 and the max batch size)"
+    )
+    WARMUP_RUNS: int = Field(
+        default=1,
+        description="Warmup runs per input size and batch size"
+    )
+    MICRO_BATCHING: bool = Field(
+        default=True,
+        description="Batch images from concurrent requests together before inference"
+    )
+    MICRO_BATCH_MAX_SIZE: int = Field(
+        default=0,
+        description="Images per micro-batch (0 = the model's max batch size)"
+    )
+    MICRO_BATCH_MAX_WAIT_MS: float = Field(
+        default=5.0,
+        description="Longest time an image waits for its micro-batch to fill, in milliseconds"
+    )
+    SLICE_PARALLELISM: int = Field(
+        default=0,
+        description="Slice batches of one image in flight at once, leaving the rest of the pool to other requests (0 = all pool sessions)"
+    )
+    INFERENCE_BACKEND: str = Field(
+        default="thread",
+        description="Where labeling inference runs: detector pool threads in the API process, or worker processes (thread or process)"
+    )
+    EXECUTOR_THREADS: int = Field(
+        default=0,
+        description="Threads running image decode and inference off the event loop (0 = labeling decode plus inference workers)"
+    )
+    LOOP_LAG_INTERVAL_MS: float = Field(
+        default=500.0,
+        description="Interval at which event loop lag is measured, in milliseconds"
+    )
     
     # Model parameters
     INPUT_SIZE: Tuple[int, int] = Field(
@@ -40,6 +134,30 @@ class ModelConfig(BaseSettings):
         default=0.45,
         description="Non-maximum suppression threshold"
     )
+    OUTPUT_LAYOUT: str = Field(
+        default="auto",
+        description="Model output layout: decoded boxes, raw YOLOX head outputs, or auto-detect (auto, decoded, raw)"
+    )
+    STRIDES: Tuple[int, ...] = Field(
+        default=(8, 16, 32),
+        description="YOLOX head strides used to decode raw outputs"
+    )
+    MAX_CANDIDATES: int = Field(
+        default=1000,
+        description="Maximum number of top-scoring boxes entering NMS per image"
+    )
+    MAX_DETECTIONS: int = Field(
+        default=300,
+        description="Maximum number of detections kept per image after NMS"
+    )
+    CLASS_AGNOSTIC_NMS: bool = Field(
+        default=False,
+        description="Suppress overlapping boxes across classes instead of per class"
+    )
+    MAX_BATCH_SIZE: int = Field(
+        default=16,
+        description="Maximum number of images per inference call for models with a dynamic batch axis"
+    )
     
     # SAHI parameters
     SLICE_HEIGHT: int = Field(
@@ -58,15 +176,71 @@ class ModelConfig(BaseSettings):
         default=0.2,
         description="Horizontal overlap ratio between slices"
     )
+    FULL_FRAME_PASS: bool = Field(
+        default=False,
+        description="Also detect on the whole downscaled image, batched with the slices, to catch objects larger than a slice"
+    )
     AUTO_SLICE_RESOLUTION: bool = Field(
         default=True,
         description="Automatically adjust slice size based on image"
     )
+    MIN_OBJECT_SIZE: int = Field(
+        default=32,
+        description="Smallest object size in image pixels that auto slicing keeps detectable"
+    )
+    SLICE_SKIP_MIN_CONTRAST: float = Field(
+        default=0.0,
+        description="Skip slices whose downscaled thumbnail has no local contrast (0-255) above this; 0 runs every slice"
+    )
+    SLICING_MODE: str = Field(
+        default="exhaustive",
+        description="Default slicing mode (exhaustive or coarse_to_fine), can be overridden per request"
+    )
+    COARSE_CONF_THRESH: float = Field(
+        default=0.1,
+        description="Confidence threshold for candidates of the coarse full-frame pass in coarse_to_fine mode"
+    )
+    COARSE_SAMPLE_RATIO: float = Field(
+        default=0.1,
+        description="Fraction of slices without coarse candidates still run in coarse_to_fine mode"
+    )
+    STREAMING_MIN_PIXELS: int = Field(
+        default=40_000_000,
+        description="Images with more pixels are read slice by slice instead of decoded into memory"
+    )
+    STREAM_CHUNK_SLICES: int = Field(
+        default=0,
+        description="Slices read and detected at a time when streaming (0 = MAX_BATCH_SIZE)"
+    )
+    TILE_CACHE_DIR: Path = Field(
+        default=Path("temp/tile_cache"),
+        description="Directory for decoded images of streamed compressed images"
+    )
+    TILE_CACHE_MAX_BYTES: int = Field(
+        default=20 * 1024 ** 3,
+        description="Size limit of the tile cache; least recently used images are evicted (0 = unlimited)"
+    )
+    CANDIDATE_CACHE: bool = Field(
+        default=True,
+        description="Keep pre-threshold candidates per image and model so thresholds can be changed without inference"
+    )
+    CANDIDATE_CONF_THRESH: float = Field(
+        default=0.05,
+        description="Confidence threshold candidates are detected at; the lowest threshold re-thresholding can apply"
+    )
+    CANDIDATE_CACHE_DIR: Path = Field(
+        default=Path("temp/candidate_cache"),
+        description="Directory for cached candidates"
+    )
+    CANDIDATE_CACHE_MAX_BYTES: int = Field(
+        default=2 * 1024 ** 3,
+        description="Size limit of the candidate cache; least recently used images are evicted (0 = unlimited)"
+    )
     
     # Postprocessing parameters
     POSTPROCESS_TYPE: str = Field(
         default="NMM",
-        description="Type of postprocessing (NMM or NMS)"
+        description="Slice merging strategy (NMS, NMM or GREEDYNMM)"
     )
     POSTPROCESS_MATCH_THRESHOLD: float = Field(
         default=0.5,
@@ -76,6 +250,10 @@ class ModelConfig(BaseSettings):
         default="IOU",
         description="Metric for matching predictions (IOU or IOS)"
     )
+    POSTPROCESS_CLASS_AGNOSTIC: bool = Field(
+        default=False,
+        description="Merge matching predictions across classes instead of per class"
+    )
     
     # Class mapping
     CLASSES: List[str] = Field(
@@ -140,15 +318,31 @@ class ModelConfig(BaseSettings):
                     f"Model file not found: {model_path}. "
                     "Please download the model file."
                 )
+            elif not self.model_path.exists():
+                logger.warning(
+                    f"Model variant not found: {self.model_path}. "
+                    f"Build it with: python -m app.pipeline.quantize --precision {self.MODEL_PRECISION}"
+                )
                 
         except Exception as e:
             logger.error(f"Path validation failed: {str(e)}")
     
     @property
-    def model_path(self) -> Path:
-        """Get full path to model file."""
+    def base_model_path(self) -> Path:
+        """Get full path to the original (fp32) model file."""
         return self.MODEL_DIR / self.MODEL_FILE
     
+    @property
+    def model_path(self) -> Path:
+        """Get full path to the model file for the configured precision."""
+        return self.get_model_variant_path(self.MODEL_PRECISION)
+    
+    def get_model_variant_path(self, precision: str) -> Path:
+        """Get path of a precision variant, stored next to the original model."""
+        if precision == "fp32":
+            return self.base_model_path
+        return self.MODEL_DIR / f"{Path(self.MODEL_FILE).stem}.{precision}.onnx"
+    
     @property
     def YOLOX_MODEL_PATH(self) -> Path:
         """Alias for model_path for backward compatibility."""
@@ -178,16 +372,59 @@ config = ModelConfig()
 MODELSHIP_MODEL_DIR=models
 MODELSHIP_MODEL_FILE=yolox_s.onnx
 MODELSHIP_CLASSES_FILE=classes.json
+MODELSHIP_MODEL_PRECISION=fp32
+MODELSHIP_EXECUTION_PROVIDERS=["CPUExecutionProvider"]
+MODELSHIP_INTRA_OP_NUM_THREADS=0
+MODELSHIP_INTER_OP_NUM_THREADS=0
+MODELSHIP_EXECUTION_MODE=sequential
+MODELSHIP_GRAPH_OPTIMIZATION_LEVEL=all
+MODELSHIP_ENABLE_MEM_ARENA=true
+MODELSHIP_ENABLE_MEM_PATTERN=true
+MODELSHIP_OPTIMIZED_MODEL_CACHE=true
+MODELSHIP_OPTIMIZED_MODEL_CACHE_DIR=models/cache
+MODELSHIP_POOL_SIZE=0
+MODELSHIP_POOL_THREADS_PER_SESSION=0
+MODELSHIP_LOAD_BENCHMARK_RUNS=3
+MODELSHIP_WARMUP_INPUT_SIZES=[]
+MODELSHIP_WARMUP_BATCH_SIZES=[]
+MODELSHIP_WARMUP_RUNS=1
+MODELSHIP_MICRO_BATCHING=true
+MODELSHIP_MICRO_BATCH_MAX_SIZE=0
+MODELSHIP_MICRO_BATCH_MAX_WAIT_MS=5.0
+MODELSHIP_SLICE_PARALLELISM=0
+MODELSHIP_INFERENCE_BACKEND=thread
+MODELSHIP_EXECUTOR_THREADS=0
+MODELSHIP_LOOP_LAG_INTERVAL_MS=500.0
 MODELSHIP_CONF_THRESH=0.3
 MODELSHIP_NMS_THRESH=0.45
+MODELSHIP_OUTPUT_LAYOUT=auto
+MODELSHIP_MAX_CANDIDATES=1000
+MODELSHIP_MAX_DETECTIONS=300
+MODELSHIP_CLASS_AGNOSTIC_NMS=false
+MODELSHIP_MAX_BATCH_SIZE=16
 MODELSHIP_SLICE_HEIGHT=512
 MODELSHIP_SLICE_WIDTH=512
 MODELSHIP_OVERLAP_HEIGHT_RATIO=0.2
 MODELSHIP_OVERLAP_WIDTH_RATIO=0.2
+MODELSHIP_FULL_FRAME_PASS=false
 MODELSHIP_AUTO_SLICE_RESOLUTION=true
+MODELSHIP_MIN_OBJECT_SIZE=32
+MODELSHIP_SLICE_SKIP_MIN_CONTRAST=0
+MODELSHIP_SLICING_MODE=exhaustive
+MODELSHIP_COARSE_CONF_THRESH=0.1
+MODELSHIP_COARSE_SAMPLE_RATIO=0.1
+MODELSHIP_STREAMING_MIN_PIXELS=40000000
+MODELSHIP_STREAM_CHUNK_SLICES=0
+MODELSHIP_TILE_CACHE_DIR=temp/tile_cache
+MODELSHIP_TILE_CACHE_MAX_BYTES=21474836480
+MODELSHIP_CANDIDATE_CACHE=true
+MODELSHIP_CANDIDATE_CONF_THRESH=0.05
+MODELSHIP_CANDIDATE_CACHE_DIR=temp/candidate_cache
+MODELSHIP_CANDIDATE_CACHE_MAX_BYTES=2147483648
 MODELSHIP_POSTPROCESS_TYPE=NMM
 MODELSHIP_POSTPROCESS_MATCH_THRESHOLD=0.5
 MODELSHIP_POSTPROCESS_MATCH_METRIC=IOU
+MODELSHIP_POSTPROCESS_CLASS_AGNOSTIC=false
 """
 
 # Example classes.json:
@@ -0,0 +1,119 @@
+# app/pipeline/decode.py
+"""
+Decoding of raw YOLOX head outputs into (x_center, y_center, w, h) boxes.
+
+Stock YOLOX ONNX exports emit per-anchor offsets relative to a grid cell
+and log-scale sizes relative to the stride. The grid and stride tables only
+depend on the input size, so they are built once and cached.
+"""
+
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+# Output layouts
+LAYOUT_AUTO = "auto"
+LAYOUT_DECODED = "decoded"
+LAYOUT_RAW = "raw"
+
+YOLOX_STRIDES: Tuple[int, ...] = (8, 16, 32)
+
+
+def num_anchors(input_size: Tuple[int, int], strides: Sequence[int] = YOLOX_STRIDES) -> int:
+    """Number of anchor points YOLOX predicts for an input size (width, height)."""
+    width, height = input_size
+    return sum((height // stride) * (width // stride) for stride in strides)
+
+
+@lru_cache(maxsize=16)
+def get_grids(
+    input_size: Tuple[int, int],
+    strides: Tuple[int, ...] = YOLOX_STRIDES
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get cached grid offsets and strides for an input size.
+
+    Args:
+        input_size: Model input size (width, height)
+        strides: Feature map strides, in head output order
+
+    Returns:
+        Tuple of read-only arrays:
+        - grids: (num_anchors, 2) cell (x, y) of each anchor
+        - expanded_strides: (num_anchors, 1) stride of each anchor
+    """
+    width, height = input_size
+    grids = []
+    expanded_strides = []
+    for stride in strides:
+        grid_w, grid_h = width // stride, height // stride
+        xv, yv = np.meshgrid(np.arange(grid_w), np.arange(grid_h))
+        grids.append(np.stack((xv, yv), axis=-1).reshape(-1, 2))
+        expanded_strides.append(np.full((grid_w * grid_h, 1), stride))
+
+    grid_table = np.concatenate(grids).astype(np.float32)
+    stride_table = np.concatenate(expanded_strides).astype(np.float32)
+    grid_table.setflags(write=False)
+    stride_table.setflags(write=False)
+    return grid_table, stride_table
+
+
+def detect_layout(
+    outputs: np.ndarray,
+    input_size: Tuple[int, int],
+    strides: Sequence[int] = YOLOX_STRIDES
+) -> str:
+    """
+    Guess whether model outputs hold raw head values or decoded boxes.
+
+    Decoded centers are pixel coordinates spread over the whole input,
+    while raw centers are offsets within a grid cell (roughly -1..2).
+
+    Args:
+        outputs: Model outputs of shape (..., num_anchors, 5 + num_classes)
+        input_size: Model input size (width, height)
+        strides: Feature map strides
+
+    Returns:
+        LAYOUT_RAW or LAYOUT_DECODED
+    """
+    if outputs.shape[-2] != num_anchors(input_size, strides):
+        return LAYOUT_DECODED
+    centers = np.abs(outputs[..., :2])
+    return LAYOUT_DECODED if float(centers.max()) > max(strides) else LAYOUT_RAW
+
+
+def decode_outputs(
+    outputs: np.ndarray,
+    input_size: Tuple[int, int],
+    strides: Tuple[int, ...] = YOLOX_STRIDES,
+    out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Apply grid offsets and strides to raw YOLOX outputs.
+
+    Args:
+        outputs: Raw outputs of shape (..., num_anchors, 5 + num_classes);
+            objectness and class scores are expected to be sigmoided
+            already, as in the official export
+        input_size: Model input size (width, height)
+        strides: Feature map strides, in head output order
+        out: Optional output array (may be `outputs` to decode in place)
+
+    Returns:
+        Outputs with boxes as (x_center, y_center, w, h) in input pixels
+    """
+    grids, expanded_strides = get_grids(tuple(input_size), tuple(strides))
+    if out is None:
+        out = outputs.copy()
+    elif out is not outputs:
+        out[...] = outputs
+
+    xy = out[..., :2]
+    xy += grids
+    xy *= expanded_strides
+    wh = out[..., 2:4]
+    np.exp(wh, out=wh)
+    wh *= expanded_strides
+    return out
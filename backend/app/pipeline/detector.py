@@ -1,13 +1,18 @@
 # app/pipeline/detector.py
 import numpy as np
-import cv2
-import onnxruntime
 from pathlib import Path
 import logging
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 import time
 
 from .config import config
+from .decode import (
+    LAYOUT_AUTO, LAYOUT_DECODED, LAYOUT_RAW,
+    decode_outputs, detect_layout, num_anchors
+)
+from .postprocess import NO_NMS, Detections, postprocess
+from .preprocess import Preprocessor
+from .session import create_session
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +30,10 @@ class YOLOXDetector:
         model_path: Union[str, Path],
         conf_thresh: float = 0.3,
         nms_thresh: float = 0.45,
-        input_size: Tuple[int, int] = (640, 640)
+        input_size: Tuple[int, int] = (640, 640),
+        max_batch_size: Optional[int] = None,
+        output_layout: Optional[str] = None,
+        session_overrides: Optional[Dict[str, Any]] = None
     ):
         """
         Initialize YOLOX detector.
@@ -35,6 +43,12 @@ class YOLOXDetector:
             conf_thresh: Confidence threshold for detections
             nms_thresh: Non-maximum suppression threshold
             input_size: Model input size (width, height)
+            max_batch_size: Maximum images per inference call for models
+                with a dynamic batch axis (defaults to config)
+            output_layout: "decoded", "raw" (YOLOX head outputs that need
+                grid/stride decoding) or "auto" (defaults to config)
+            session_overrides: Per-session overrides of the ONNX Runtime
+                settings in config (e.g. intra_op_num_threads)
         """
         self.model_path = Path(model_path)
         if not self.model_path.exists():
@@ -43,23 +57,61 @@ class YOLOXDetector:
         self.conf_thresh = conf_thresh
         self.nms_thresh = nms_thresh
         self.input_size = input_size
+        self.strides = tuple(config.STRIDES)
+        self.output_layout = (output_layout or config.OUTPUT_LAYOUT).lower()
+        if self.output_layout not in (LAYOUT_AUTO, LAYOUT_DECODED, LAYOUT_RAW):
+            raise DetectorError(f"Unknown output layout: {self.output_layout}")
+        self.preprocessor = Preprocessor(input_size)
         
         # Load model
         logger.info(f"Loading YOLOX model from {model_path}")
         try:
-            self.session = onnxruntime.InferenceSession(
-                str(model_path),
-                providers=['CUDAExecutionProvider', 'CPUExecutionProvider']
+            self.session, self.session_info = create_session(
+                self.model_path,
+                **(session_overrides or {})
             )
             
             # Get model metadata
-            self.input_name = self.session.get_inputs()[0].name
+            model_input = self.session.get_inputs()[0]
+            self.input_name = model_input.name
             self.output_name = self.session.get_outputs()[0].name
             
-            logger.info("Model loaded successfully")
+            # A symbolic or missing batch dimension means the model was
+            # exported with a dynamic batch axis
+            batch_dim = model_input.shape[0] if model_input.shape else None
+            if isinstance(batch_dim, int) and batch_dim > 0:
+                self.fixed_batch_size: Optional[int] = batch_dim
+                self.max_batch_size = batch_dim
+            else:
+                self.fixed_batch_size = None
+                self.max_batch_size = max(1, max_batch_size or config.MAX_BATCH_SIZE)
+            
+            # Raw outputs can only be decoded if there is one row per anchor
+            anchors_dim = self.session.get_outputs()[0].shape[-2]
+            if (
+                self.output_layout == LAYOUT_RAW
+                and isinstance(anchors_dim, int)
+                and anchors_dim != num_anchors(self.input_size, self.strides)
+            ):
+                raise DetectorError(
+                    f"Model has {anchors_dim} outputs per image, expected "
+                    f"{num_anchors(self.input_size, self.strides)} for raw YOLOX "
+                    f"outputs at input size {self.input_size}"
+                )
             
         except Exception as e:
             raise DetectorError(f"Failed to load model: {str(e)}")
+        
+        self.load_stats = self._measure_load_latency(config.LOAD_BENCHMARK_RUNS)
+        logger.info(
+            f"Model loaded successfully "
+            f"(batch: {self.fixed_batch_size or 'dynamic'}, max batch: {self.max_batch_size}, "
+            f"providers: {self.session_info['providers']}, "
+            f"optimized cache: {'hit' if self.session_info['cache_hit'] else 'miss'}) - "
+            f"cold start {self.load_stats['cold_start_time'] * 1000:.0f}ms, "
+            f"first run {self.load_stats['first_run_time'] * 1000:.1f}ms, "
+            f"steady state {self.load_stats['steady_state_latency'] * 1000:.1f}ms"
+        )
     
     def detect(
         self,
@@ -82,133 +134,210 @@ class YOLOXDetector:
             - class_id: Class ID from model
             - class_name: Class name (if available)
         """
+        return self.detect_batch([image], conf_thresh, nms_thresh)[0].to_list()
+    
+    def detect_batch(
+        self,
+        images: List[np.ndarray],
+        conf_thresh: Optional[float] = None,
+        nms_thresh: Optional[float] = None
+    ) -> List[Detections]:
+        """
+        Run object detection on many images with batched inference.
+        
+        Images are stacked into one (N, 3, H, W) tensor per inference call.
+        Models with a dynamic batch axis take up to max_batch_size images per
+        call; fixed-batch models are fed chunks of exactly their batch size,
+        padding the last chunk if needed.
+        
+        Args:
+            images: BGR images (or slices) as numpy arrays, any sizes
+            conf_thresh: Optional override for confidence threshold
+            nms_thresh: Optional override for NMS threshold
+            
+        Returns:
+            Detections (boxes, scores, class IDs arrays) per input image,
+            in input order
+        """
+        if not images:
+            return []
+        
+        conf_thresh = self.conf_thresh if conf_thresh is None else conf_thresh
+        nms_thresh = self.nms_thresh if nms_thresh is None else nms_thresh
+        
         try:
             start_time = time.time()
+            results: List[Detections] = []
             
-            # Preprocess image
-            input_data = self._preprocess(image)
-            
-            # Run inference
-            outputs = self.session.run(
-                [self.output_name],
-                {self.input_name: input_data}
-            )[0]
-            
-            # Ensure outputs is a numpy array
-            if not isinstance(outputs, np.ndarray):
-                outputs = np.array(outputs)
-            
-            # Postprocess detections
-            predictions = self._postprocess(
-                outputs,
-                image.shape[:2],  # Original (height, width)
-                conf_thresh or self.conf_thresh,
-                nms_thresh or self.nms_thresh
-            )
+            for chunk_start in range(0, len(images), self.max_batch_size):
+                chunk = images[chunk_start:chunk_start + self.max_batch_size]
+                
+                # Letterbox chunk into the reusable input buffer
+                input_data, ratios = self.preprocessor(
+                    chunk,
+                    batch_size=self.fixed_batch_size or len(chunk)
+                )
+                
+                # Run inference
+                outputs = self.session.run(
+                    [self.output_name],
+                    {self.input_name: input_data}
+                )[0]
+                
+                # Ensure outputs is a writable numpy array
+                if not isinstance(outputs, np.ndarray) or not outputs.flags.writeable:
+                    outputs = np.array(outputs)
+                
+                # Apply grid offsets and strides to raw head outputs
+                if self._resolve_layout(outputs) == LAYOUT_RAW:
+                    decode_outputs(outputs, self.input_size, self.strides, out=outputs)
+                
+                # Postprocess each item of the chunk
+                for i, image in enumerate(chunk):
+                    results.append(self._postprocess(
+                        outputs[i],
+                        image.shape[:2],  # Original (height, width)
+                        ratios[i],
+                        conf_thresh,
+                        nms_thresh
+                    ))
             
             inference_time = time.time() - start_time
-            logger.debug(f"Detection took {inference_time:.3f}s")
+            logger.debug(
+                f"Detection on {len(images)} images took {inference_time:.3f}s"
+            )
             
-            return predictions
+            return results
             
         except Exception as e:
             raise DetectorError(f"Detection failed: {str(e)}")
     
-    def _preprocess(self, image: np.ndarray) -> np.ndarray:
-        """Preprocess image for model input."""
-        # Resize
-        resized = cv2.resize(
-            image,
-            self.input_size,
-            interpolation=cv2.INTER_LINEAR
-        )
+    def _measure_load_latency(self, runs: int) -> Dict[str, float]:
+        """
+        Time the first inference and a few steady-state runs on a blank input.
         
-        # BGR to RGB
-        rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+        Args:
+            runs: Number of timed steady-state runs (0 skips all inference)
+            
+        Returns:
+            Dict with cold start (session creation), first run and mean
+            steady-state latency in seconds
+        """
+        stats = {
+            "cold_start_time": self.session_info["session_load_time"],
+            "first_run_time": 0.0,
+            "steady_state_latency": 0.0
+        }
+        if runs <= 0:
+            return stats
+        
+        try:
+            width, height = self.input_size
+            blank = np.full(
+                (self.fixed_batch_size or 1, 3, height, width),
+                self.preprocessor.pad_value,
+                dtype=np.float32
+            )
+            feed = {self.input_name: blank}
+            
+            start_time = time.perf_counter()
+            outputs = self.session.run([self.output_name], feed)[0]
+            stats["first_run_time"] = time.perf_counter() - start_time
+            self._resolve_layout(np.asarray(outputs))
+            
+            start_time = time.perf_counter()
+            for _ in range(runs):
+                self.session.run([self.output_name], feed)
+            stats["steady_state_latency"] = (time.perf_counter() - start_time) / runs
+            
+        except Exception as e:
+            logger.warning(f"Failed to measure load latency: {str(e)}")
         
-        # Normalize to [0, 1]
-        normalized = rgb.astype(np.float32) / 255.0
+        return stats
+    
+    def warmup(
+        self,
+        batch_sizes: Optional[List[int]] = None,
+        image_shape: Optional[Tuple[int, int]] = None,
+        runs: int = 1
+    ) -> Dict[int, float]:
+        """
+        Run full detections on blank images at each batch size.
         
-        # HWC to NCHW format
-        transposed = np.transpose(normalized, (2, 0, 1))
+        ONNX Runtime sizes its arenas and memory patterns per input shape on
+        first use, so every batch size served should be run once before
+        traffic arrives.
         
-        # Add batch dimension
-        batched = np.expand_dims(transposed, axis=0)
+        Args:
+            batch_sizes: Batch sizes to warm (defaults to 1 and max_batch_size)
+            image_shape: (height, width) of the warmup images (defaults to a
+                SAHI slice)
+            runs: Runs per batch size
+            
+        Returns:
+            Dict of batch size to the latency of its last run in seconds
+        """
+        batch_sizes = batch_sizes or [1, self.max_batch_size]
+        image_shape = image_shape or (config.SLICE_HEIGHT, config.SLICE_WIDTH)
+        blank = np.full((*image_shape, 3), 114, dtype=np.uint8)
         
-        return batched
+        timings = {}
+        for batch_size in sorted({min(max(size, 1), self.max_batch_size) for size in batch_sizes}):
+            for _ in range(max(runs, 1)):
+                start_time = time.perf_counter()
+                self.detect_batch([blank] * batch_size)
+                timings[batch_size] = time.perf_counter() - start_time
+        return timings
+    
+    def _resolve_layout(self, outputs: np.ndarray) -> str:
+        """Get the output layout, detecting it from the first outputs if set to auto."""
+        if self.output_layout == LAYOUT_AUTO:
+            self.output_layout = detect_layout(outputs, self.input_size, self.strides)
+            logger.info(f"Detected '{self.output_layout}' model output layout")
+        return self.output_layout
+    
+    def _preprocess(self, image: np.ndarray) -> np.ndarray:
+        """Preprocess a single image for model input."""
+        input_data, _ = self.preprocessor([image])
+        return input_data
     
     def _postprocess(
         self,
         outputs: np.ndarray,
         original_shape: Tuple[int, int],
+        ratio: float,
         conf_thresh: float,
         nms_thresh: float
-    ) -> List[Dict]:
+    ) -> Detections:
         """
         Postprocess raw model outputs.
         
         Args:
-            outputs: Raw model outputs
+            outputs: Raw model outputs for one image, shape (num_anchors, 5 + num_classes)
             original_shape: Original image (height, width)
+            ratio: Letterbox ratio used when preprocessing the image
             conf_thresh: Confidence threshold
             nms_thresh: NMS threshold
             
         Returns:
-            List of processed detections
+            Detections in original image coordinates
         """
-        predictions = []
-        
-        # Get predictions above threshold
-        scores = outputs[..., 4:5] * outputs[..., 5:]  # cls conf * obj conf
-        boxes = outputs[..., :4]
-        
-        # Filter by confidence
-        mask = scores.max(1) > conf_thresh
-        boxes = boxes[mask]
-        scores = scores[mask]
-        
-        if boxes.shape[0] == 0:
-            return predictions
-            
-        # Get class predictions
-        class_ids = np.argmax(scores, axis=1)
-        confidences = scores.max(1)
-        
-        # Convert boxes to corners (xywh -> xyxy)
-        boxes = self._xywh2xyxy(boxes)
-        
-        # Scale boxes to original image size
-        scale_x = original_shape[1] / self.input_size[0]
-        scale_y = original_shape[0] / self.input_size[1]
-        boxes[:, [0, 2]] *= scale_x
-        boxes[:, [1, 3]] *= scale_y
-        
-        # Apply NMS
-        indices = cv2.dnn.NMSBoxes(
-            boxes.tolist(),
-            confidences.tolist(),
-            conf_thresh,
-            nms_thresh
-        )
+        detections = postprocess(outputs, conf_thresh, nms_thresh)
+        if len(detections) == 0:
+            return detections
         
-        # Format predictions
-        for idx in indices:
-            idx = idx if isinstance(idx, int) else idx.item()
-            predictions.append({
-                "bbox": boxes[idx].tolist(),
-                "confidence": float(confidences[idx]),
-                "class_id": int(class_ids[idx]),
-                "class_name": config.get_class_name(class_ids[idx])
-            })
-        
-        return predictions
-    
-    @staticmethod
-    def _xywh2xyxy(boxes: np.ndarray) -> np.ndarray:
-        """Convert boxes from (x, y, w, h) to (x1, y1, x2, y2) format."""
-        xyxy = boxes.copy()
-        xyxy[:, 0] = boxes[:, 0] - boxes[:, 2] / 2  # x1 = x - w/2
-        xyxy[:, 1] = boxes[:, 1] - boxes[:, 3] / 2  # y1 = y - h/2
-        xyxy[:, 2] = boxes[:, 0] + boxes[:, 2] / 2  # x2 = x + w/2
-        xyxy[:, 3] = boxes[:, 1] + boxes[:, 3] / 2  # y2 = y + h/2
-        return xyxy 
\ No newline at end of file
+        # Undo letterbox resize and clip to original image. Candidates
+        # (NMS disabled) are clipped once thresholded, after their NMS
+        boxes = detections.boxes
+        boxes /= ratio
+        if nms_thresh >= NO_NMS:
+            return detections
+        np.clip(boxes[:, 0::2], 0, original_shape[1], out=boxes[:, 0::2])
+        np.clip(boxes[:, 1::2], 0, original_shape[0], out=boxes[:, 1::2])
+        
+        # Drop boxes that lie entirely in the padding
+        valid = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+        if not valid.all():
+            detections = detections.select(valid)
+        
+        return detections
@@ -0,0 +1,208 @@
+# app/pipeline/executor.py
+"""
+Execution layer between the event loop and blocking pipeline work.
+
+Decode and inference run on a dedicated, sized thread pool instead of
+asyncio's default executor, which job store writes and other to_thread
+calls share: a burst of those can no longer delay inference, nor can
+inference occupy every default thread. The executor reports how many
+calls wait for a thread, and a monitor on the event loop measures how
+late its callbacks run, which is what blocking work on the loop would
+show up as.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_executor_threads(threads: Optional[int] = None) -> int:
+    """
+    Get the number of executor threads.
+
+    Args:
+        threads: Requested threads (defaults to config; 0 = one per
+            concurrent decode and inference of the labeling pipeline)
+
+    Returns:
+        Number of threads to start
+    """
+    threads = config.EXECUTOR_THREADS if threads is None else threads
+    if threads > 0:
+        return threads
+    return settings.LABELING_DECODE_WORKERS + settings.LABELING_WORKERS
+
+
+class InferenceExecutor:
+    """Sized thread pool for decode and inference, with queue depth and timing."""
+
+    def __init__(self, threads: Optional[int] = None):
+        """
+        Initialize the executor. Threads start on first use.
+
+        Args:
+            threads: Number of threads (defaults to config)
+        """
+        self.threads = resolve_executor_threads(threads)
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._peak_queued = 0
+        self._wait_seconds = 0.0
+        self._run_seconds = 0.0
+
+    def _call(self, submitted: float, fn: Callable, *args, **kwargs) -> Any:
+        """Run fn on an executor thread, recording wait and run time."""
+        started = time.perf_counter()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._wait_seconds += started - submitted
+        failed = True
+        try:
+            result = fn(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._run_seconds += time.perf_counter() - started
+                if failed:
+                    self._failed += 1
+                else:
+                    self._completed += 1
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking function on the executor and await its result.
+
+        Args:
+            fn: Function to call
+            *args: Positional arguments for fn
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            What fn returned
+        """
+        with self._lock:
+            self._queued += 1
+            self._peak_queued = max(self._peak_queued, self._queued)
+        call = functools.partial(self._call, time.perf_counter(), fn, *args, **kwargs)
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._executor, call)
+        except RuntimeError:
+            # Already shut down
+            with self._lock:
+                self._queued -= 1
+            raise
+        return await future
+
+    def stats(self) -> Dict:
+        """Get thread count, queue depth and time spent waiting and running."""
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "threads": self.threads,
+                "queued": self._queued,
+                "peak_queued": self._peak_queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "average_wait_ms": round(1000 * self._wait_seconds / finished, 3) if finished else 0.0,
+                "average_run_ms": round(1000 * self._run_seconds / finished, 3) if finished else 0.0
+            }
+
+    def close(self) -> None:
+        """Stop the threads after running calls finish; queued calls are cancelled."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop runs a callback scheduled at a fixed interval."""
+
+    def __init__(self, interval: Optional[float] = None, stall_threshold: float = 0.1):
+        """
+        Initialize the monitor.
+
+        Args:
+            interval: Seconds between measurements (defaults to config)
+            stall_threshold: Lag in seconds counted as a stall
+        """
+        self.interval = config.LOOP_LAG_INTERVAL_MS / 1000 if interval is None else interval
+        self.stall_threshold = stall_threshold
+        self._task: Optional[asyncio.Task] = None
+        self._samples = 0
+        self._total_lag = 0.0
+        self._last_lag = 0.0
+        self._max_lag = 0.0
+        self._stalls = 0
+
+    def start(self) -> None:
+        """Start measuring on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._measure(), name="loop-lag-monitor")
+
+    async def _measure(self) -> None:
+        """Sleep for the interval and record how much longer it took."""
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - expected, 0.0)
+            self._samples += 1
+            self._total_lag += lag
+            self._last_lag = lag
+            self._max_lag = max(self._max_lag, lag)
+            if lag >= self.stall_threshold:
+                self._stalls += 1
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms")
+
+    def stats(self) -> Dict:
+        """Get the last, mean and worst lag in milliseconds and the number of stalls."""
+        return {
+            "interval_ms": round(self.interval * 1000, 3),
+            "samples": self._samples,
+            "last_lag_ms": round(self._last_lag * 1000, 3),
+            "mean_lag_ms": round(1000 * self._total_lag / self._samples, 3) if self._samples else 0.0,
+            "max_lag_ms": round(self._max_lag * 1000, 3),
+            "stalls": self._stalls
+        }
+
+    async def stop(self) -> None:
+        """Stop measuring."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Global instances shared by the labeling service and the API
+_inference_executor: Optional[InferenceExecutor] = None
+loop_monitor = LoopLagMonitor()
+
+
+def get_inference_executor() -> InferenceExecutor:
+    """Get the shared executor, creating it on first use."""
+    global _inference_executor
+    if _inference_executor is None:
+        _inference_executor = InferenceExecutor()
+    return _inference_executor
+
+
+def shutdown_inference_executor() -> None:
+    """Stop the shared executor if it was started."""
+    global _inference_executor
+    if _inference_executor is not None:
+        _inference_executor.close()
+        _inference_executor = None
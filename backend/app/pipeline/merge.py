@@ -0,0 +1,414 @@
+# app/pipeline/merge.py
+"""
+Merging of detections from overlapping image slices.
+
+Objects crossing slice borders are detected once per slice they appear in.
+The merge engine reduces those duplicates with one of SAHI's strategies,
+working on the box and score arrays directly:
+
+- NMS: keep the highest-scoring box of each match, drop the rest
+- GREEDYNMM: like NMS, but each kept box absorbs the boxes it suppressed,
+  growing to their union
+- NMM: non-maximum merging where matches are transitive: a box merged into
+  a kept box hands its own unmatched neighbours to that kept box too
+
+Two boxes match when their IOU (intersection over union) or IOS
+(intersection over the smaller box) is above the match threshold. As in
+SAHI, a box only merges if it still matches the kept box as merged so far,
+and the merged box keeps the kept box's score and class.
+
+Boxes only ever interact with the boxes they are connected to by matches,
+so detections of a streamed image can be merged incrementally: once a
+group of connected boxes lies above every slice still to come, nothing can
+change its result (see IncrementalMerger).
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .config import config
+from .postprocess import (
+    Detections,
+    overlapping_pairs,
+    paired_ios,
+    paired_iou,
+    resolve_suppression
+)
+
+logger = logging.getLogger(__name__)
+
+MERGE_TYPES = ("NMS", "NMM", "GREEDYNMM")
+MATCH_METRICS = ("IOU", "IOS")
+
+
+class MergeError(Exception):
+    """Custom exception for detection merging errors."""
+    pass
+
+
+@dataclass
+class MergeGroups:
+    """Kept boxes and the boxes to merge into each of them."""
+    keeps: np.ndarray    # (K,) indices of kept boxes, highest score first
+    members: np.ndarray  # (M,) indices of boxes to merge, in merge order per group
+    groups: np.ndarray   # (M,) position in keeps of the box each member merges into
+
+
+def _match_metric(boxes_a: np.ndarray, boxes_b: np.ndarray, match_metric: str) -> np.ndarray:
+    """Element-wise match metric between two (N, 4) xyxy box arrays."""
+    if match_metric == "IOS":
+        return paired_ios(boxes_a, boxes_b)
+    return paired_iou(boxes_a, boxes_b)
+
+
+def match_pairs(
+    boxes: np.ndarray,
+    class_ids: np.ndarray,
+    match_metric: str,
+    match_threshold: float,
+    class_agnostic: bool
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find all pairs of matching boxes.
+
+    Args:
+        boxes: (N, 4) boxes in xyxy format
+        class_ids: (N,) class IDs
+        match_metric: IOU or IOS
+        match_threshold: Boxes match when the metric is above this, as in SAHI
+        class_agnostic: Match boxes across classes
+
+    Returns:
+        Two index arrays (first, second), one entry per matching pair
+    """
+    boxes = boxes.astype(np.float64)
+    if not class_agnostic:
+        # Shift each class apart so boxes of different classes never overlap
+        # (see postprocess.batched_nms)
+        boxes = boxes - float(boxes.min())
+        boxes = boxes + class_ids.astype(np.float64)[:, None] * (float(boxes.max()) + 1.0)
+    first, second = overlapping_pairs(boxes)
+    hit = _match_metric(boxes[first], boxes[second], match_metric) > match_threshold
+    return first[hit], second[hit]
+
+
+def _orient(
+    first: np.ndarray,
+    second: np.ndarray,
+    rank: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Orient pairs from the higher-ranked box to the lower-ranked one."""
+    first_wins = rank[first] < rank[second]
+    return np.where(first_wins, first, second), np.where(first_wins, second, first)
+
+
+def nms_groups(order: np.ndarray, first: np.ndarray, second: np.ndarray) -> MergeGroups:
+    """
+    Keep the boxes greedy NMS keeps, merging nothing.
+
+    Args:
+        order: Box indices, highest score first
+        first, second: Matching pairs from match_pairs()
+    """
+    count = order.size
+    rank = np.empty(count, dtype=np.int64)
+    rank[order] = np.arange(count)
+    keep = resolve_suppression(count, *_orient(first, second, rank))
+    empty = np.zeros((0,), dtype=np.int64)
+    return MergeGroups(keeps=order[keep[order]], members=empty, groups=empty)
+
+
+def greedy_nmm_groups(order: np.ndarray, first: np.ndarray, second: np.ndarray) -> MergeGroups:
+    """
+    Keep the boxes greedy NMS keeps, each absorbing the boxes it suppresses.
+
+    A suppressed box may match several kept boxes; greedily it goes to the
+    highest-scoring one, which is processed first. Members of a group merge
+    highest score first.
+
+    Args:
+        order: Box indices, highest score first
+        first, second: Matching pairs from match_pairs()
+    """
+    count = order.size
+    rank = np.empty(count, dtype=np.int64)
+    rank[order] = np.arange(count)
+    high, low = _orient(first, second, rank)
+    keep = resolve_suppression(count, high, low)
+    keeps = order[keep[order]]
+
+    # Every suppressed box has a kept box suppressing it; take the best one
+    absorbs = keep[high] & ~keep[low]
+    owner_rank = np.full(count, count, dtype=np.int64)
+    np.minimum.at(owner_rank, low[absorbs], rank[high[absorbs]])
+
+    members = order[~keep[order]]
+    keep_position = np.full(count, -1, dtype=np.int64)
+    keep_position[keeps] = np.arange(keeps.size)
+    groups = keep_position[order[owner_rank[members]]]
+
+    # Members are already in score order; a stable sort groups them
+    by_group = np.argsort(groups, kind="stable")
+    return MergeGroups(keeps=keeps, members=members[by_group], groups=groups[by_group])
+
+
+def nmm_groups(order: np.ndarray, first: np.ndarray, second: np.ndarray) -> MergeGroups:
+    """
+    Group boxes by non-maximum merging.
+
+    Boxes are visited highest score first. A box not yet claimed becomes a
+    kept box and claims its unclaimed matches; a claimed box passes its
+    unclaimed matches on to the box that claimed it. Claims are transitive,
+    so this one pass is sequential, but it only visits boxes with matches
+    and works on their precomputed neighbour lists. Members of a group merge
+    in the order they were claimed, lowest score first within one claim,
+    like SAHI's nmm.
+
+    Args:
+        order: Box indices, highest score first
+        first, second: Matching pairs from match_pairs()
+    """
+    count = order.size
+    rank = np.empty(count, dtype=np.int64)
+    rank[order] = np.arange(count)
+
+    # Neighbour lists, each sorted lowest score first
+    sources = np.concatenate([first, second])
+    targets = np.concatenate([second, first])
+    by_source = np.lexsort((-rank[targets], sources))
+    sources = sources[by_source]
+    targets = targets[by_source].tolist()
+    boxes_with_matches, starts, degrees = np.unique(sources, return_index=True, return_counts=True)
+    neighbours = {
+        box: targets[start:start + degree]
+        for box, start, degree in zip(boxes_with_matches.tolist(), starts.tolist(), degrees.tolist())
+    }
+
+    owner = [-1] * count
+    is_keep = [False] * count
+    claim_order = [0] * count
+    claims = 0
+    for box in order[np.isin(order, boxes_with_matches)].tolist():
+        if owner[box] < 0:
+            is_keep[box] = True
+            claimer = box
+        else:
+            claimer = owner[box]
+        for neighbour in neighbours[box]:
+            if owner[neighbour] < 0 and not is_keep[neighbour]:
+                owner[neighbour] = claimer
+                claim_order[neighbour] = claims
+                claims += 1
+
+    owner = np.asarray(owner, dtype=np.int64)
+    keeps = order[owner[order] < 0]
+    members = np.flatnonzero(owner >= 0)
+    keep_position = np.full(count, -1, dtype=np.int64)
+    keep_position[keeps] = np.arange(keeps.size)
+    groups = keep_position[owner[members]]
+
+    by_claim = np.lexsort((np.asarray(claim_order, dtype=np.int64)[members], groups))
+    return MergeGroups(keeps=keeps, members=members[by_claim], groups=groups[by_claim])
+
+
+def merge_groups(
+    boxes: np.ndarray,
+    groups: MergeGroups,
+    match_metric: str,
+    match_threshold: float
+) -> np.ndarray:
+    """
+    Grow each kept box to the union of its group.
+
+    Members merge one at a time in group order, and only while they still
+    match the box merged so far (metric above the threshold); members that
+    no longer match are dropped. All groups advance together, one member
+    each per step, so the number of steps is the size of the largest group.
+
+    Returns:
+        (K, 4) merged boxes, one per kept box
+    """
+    merged = boxes[groups.keeps].astype(np.float64)
+    if groups.members.size == 0:
+        return merged
+
+    # Position of each member within its group
+    group_starts = np.searchsorted(groups.groups, groups.groups, side="left")
+    positions = np.arange(groups.members.size) - group_starts
+    by_position = np.argsort(positions, kind="stable")
+    step_ends = np.cumsum(np.bincount(positions))
+
+    step_start = 0
+    for step_end in step_ends.tolist():
+        step = by_position[step_start:step_end]
+        step_start = step_end
+        group = groups.groups[step]
+        member_boxes = boxes[groups.members[step]].astype(np.float64)
+        current = merged[group]
+        matched = _match_metric(current, member_boxes, match_metric) > match_threshold
+        group, current, member_boxes = group[matched], current[matched], member_boxes[matched]
+        merged[group, :2] = np.minimum(current[:, :2], member_boxes[:, :2])
+        merged[group, 2:] = np.maximum(current[:, 2:], member_boxes[:, 2:])
+
+    return merged
+
+
+def merge_detections(
+    detections: Detections,
+    postprocess_type: Optional[str] = None,
+    match_metric: Optional[str] = None,
+    match_threshold: Optional[float] = None,
+    class_agnostic: Optional[bool] = None
+) -> Detections:
+    """
+    Merge duplicate detections, e.g. of objects spanning several slices.
+
+    Args:
+        detections: Detections in image coordinates
+        postprocess_type: NMS, NMM or GREEDYNMM, defaults to config
+        match_metric: IOU or IOS, defaults to config
+        match_threshold: Match threshold, defaults to config
+        class_agnostic: Merge boxes across classes, defaults to config
+
+    Returns:
+        Merged detections, highest score first
+
+    Raises:
+        MergeError: If the postprocess type or match metric is unknown
+    """
+    postprocess_type = (postprocess_type or config.POSTPROCESS_TYPE).upper()
+    match_metric = (match_metric or config.POSTPROCESS_MATCH_METRIC).upper()
+    if match_threshold is None:
+        match_threshold = config.POSTPROCESS_MATCH_THRESHOLD
+    if class_agnostic is None:
+        class_agnostic = config.POSTPROCESS_CLASS_AGNOSTIC
+
+    if postprocess_type not in MERGE_TYPES:
+        raise MergeError(f"Unknown postprocess type {postprocess_type}, expected one of {MERGE_TYPES}")
+    if match_metric not in MATCH_METRICS:
+        raise MergeError(f"Unknown match metric {match_metric}, expected one of {MATCH_METRICS}")
+
+    order = np.argsort(-detections.scores, kind="stable")
+    if len(detections) <= 1:
+        return detections.select(order)
+
+    first, second = match_pairs(
+        detections.boxes, detections.class_ids, match_metric, match_threshold, class_agnostic
+    )
+    if postprocess_type == "NMS":
+        groups = nms_groups(order, first, second)
+    elif postprocess_type == "GREEDYNMM":
+        groups = greedy_nmm_groups(order, first, second)
+    else:
+        groups = nmm_groups(order, first, second)
+
+    merged = detections.select(groups.keeps)
+    merged.boxes = np.ascontiguousarray(
+        merge_groups(detections.boxes, groups, match_metric, match_threshold),
+        dtype=np.float32
+    )
+    return merged
+
+
+def connected_components(count: int, first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """
+    Label the connected components of the graph of matching pairs.
+
+    Returns:
+        (count,) component label per box, the smallest index in its component
+    """
+    labels = np.arange(count)
+    while True:
+        new_labels = labels.copy()
+        lowest = np.minimum(labels[first], labels[second])
+        np.minimum.at(new_labels, first, lowest)
+        np.minimum.at(new_labels, second, lowest)
+        new_labels = new_labels[new_labels]  # Follow labels to their roots
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+class IncrementalMerger:
+    """
+    Merge detections of an image arriving slice row by slice row.
+
+    Detections are added together with a frontier: the top edge of the
+    slices still to come. Slices only produce boxes within their bounds, so
+    a connected group of matching boxes lying entirely above the frontier
+    is final and is merged and set aside right away. Only the groups near
+    the frontier stay pending, so memory stays bounded however many slices
+    the image has, and the result equals merge_detections on all detections.
+    """
+
+    def __init__(
+        self,
+        postprocess_type: Optional[str] = None,
+        match_metric: Optional[str] = None,
+        match_threshold: Optional[float] = None,
+        class_agnostic: Optional[bool] = None
+    ):
+        """
+        Initialize the merger; arguments default to config as in
+        merge_detections().
+        """
+        self.postprocess_type = (postprocess_type or config.POSTPROCESS_TYPE).upper()
+        self.match_metric = (match_metric or config.POSTPROCESS_MATCH_METRIC).upper()
+        self.match_threshold = (
+            config.POSTPROCESS_MATCH_THRESHOLD if match_threshold is None else match_threshold
+        )
+        self.class_agnostic = (
+            config.POSTPROCESS_CLASS_AGNOSTIC if class_agnostic is None else class_agnostic
+        )
+        self.pending = Detections.empty()
+        self.merged: List[Detections] = []
+        self.peak_pending = 0
+
+    def _merge(self, detections: Detections) -> Detections:
+        return merge_detections(
+            detections,
+            self.postprocess_type,
+            self.match_metric,
+            self.match_threshold,
+            self.class_agnostic
+        )
+
+    def add(self, detections: Detections, frontier: float) -> None:
+        """
+        Add detections and merge every group that is final.
+
+        Args:
+            detections: Detections in image coordinates
+            frontier: Smallest y_min of any slice still to come
+        """
+        pending = Detections.concatenate([self.pending, detections])
+        self.peak_pending = max(self.peak_pending, len(pending))
+        if len(pending) == 0:
+            return
+
+        first, second = match_pairs(
+            pending.boxes,
+            pending.class_ids,
+            self.match_metric,
+            self.match_threshold,
+            self.class_agnostic
+        )
+        labels = connected_components(len(pending), first, second)
+        bottom = np.zeros(len(pending), dtype=pending.boxes.dtype)
+        np.maximum.at(bottom, labels, pending.boxes[:, 3])
+        final = bottom[labels] <= frontier
+
+        if final.any():
+            self.merged.append(self._merge(pending.select(final)))
+        self.pending = pending.select(~final)
+
+    def finish(self) -> Detections:
+        """Merge what is still pending and get all merged detections, highest score first."""
+        if len(self.pending):
+            self.merged.append(self._merge(self.pending))
+            self.pending = Detections.empty()
+        detections = Detections.concatenate(self.merged)
+        return detections.select(np.argsort(-detections.scores, kind="stable"))
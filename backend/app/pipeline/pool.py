@@ -0,0 +1,372 @@
+# app/pipeline/pool.py
+"""
+Pool of detector sessions sharing one work queue.
+
+A single ONNX Runtime session does not keep a many-core machine busy, so the
+pool runs several sessions, each with a bounded number of threads, and
+spreads incoming batches over them.
+"""
+
+import logging
+import math
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .config import config
+from .detector import YOLOXDetector, DetectorError
+from .postprocess import Detections
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_pool_size(
+    size: Optional[int] = None,
+    threads_per_session: Optional[int] = None,
+    cpu_count: Optional[int] = None
+) -> Tuple[int, int]:
+    """
+    Get the number of sessions and threads per session.
+
+    Unset values come from config; zero in config means derive from the
+    core count so that sessions * threads_per_session fills the machine.
+
+    Returns:
+        Tuple of (sessions, threads per session)
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    size = size or config.POOL_SIZE
+    threads_per_session = threads_per_session or config.POOL_THREADS_PER_SESSION
+
+    if size and not threads_per_session:
+        threads_per_session = max(1, cpu_count // size)
+    elif not size:
+        threads_per_session = threads_per_session or min(2, cpu_count)
+        size = max(1, cpu_count // threads_per_session)
+
+    return size, threads_per_session
+
+
+def run_as_completed(
+    submit: Callable[[List[np.ndarray]], Future],
+    images: List[np.ndarray],
+    chunk_size: int,
+    parallelism: int
+) -> Iterator[Tuple[int, List[Detections]]]:
+    """
+    Run images in chunks and yield each chunk's results as it completes.
+
+    At most `parallelism` chunks are queued or running at a time; the next
+    chunk is submitted only when one finishes, so a large image cannot fill
+    the shared queue ahead of other requests. Chunks not yet done are
+    cancelled if the caller stops early.
+
+    Args:
+        submit: Queues a chunk, returning a future of one Detections per image
+        images: BGR images (or slices) as numpy arrays
+        chunk_size: Images per chunk
+        parallelism: Most chunks in flight at once
+
+    Yields:
+        Tuples of (index of the chunk's first image, Detections per image)
+    """
+    starts = list(range(0, len(images), max(chunk_size, 1)))
+    pending: Dict[Future, int] = {}
+    submitted = 0
+    try:
+        while submitted < len(starts) or pending:
+            while submitted < len(starts) and len(pending) < parallelism:
+                start = starts[submitted]
+                pending[submit(images[start:start + chunk_size])] = start
+                submitted += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+@dataclass
+class _Task:
+    """A batch queued for the pool."""
+    images: List[np.ndarray]
+    conf_thresh: Optional[float]
+    nms_thresh: Optional[float]
+    future: Future
+    enqueued_at: float
+
+
+@dataclass
+class SessionStats:
+    """Usage counters of one pool session."""
+    busy_time: float = 0.0
+    queue_wait_time: float = 0.0
+    tasks: int = 0
+    images: int = 0
+    errors: int = 0
+
+
+class DetectorPool:
+    """Detector sessions fed from a shared work queue by worker threads."""
+
+    def __init__(
+        self,
+        model_path: Union[str, Path],
+        conf_thresh: float = 0.3,
+        nms_thresh: float = 0.45,
+        input_size: Tuple[int, int] = (640, 640),
+        size: Optional[int] = None,
+        threads_per_session: Optional[int] = None
+    ):
+        """
+        Initialize the pool and load one session per worker.
+
+        Args:
+            model_path: Path to ONNX model file
+            conf_thresh: Default confidence threshold
+            nms_thresh: Default NMS threshold
+            input_size: Model input size (width, height)
+            size: Number of sessions (defaults to config / core count)
+            threads_per_session: Intra-op threads per session (defaults to
+                config / core count)
+        """
+        self.size, self.threads_per_session = resolve_pool_size(size, threads_per_session)
+        self.conf_thresh = conf_thresh
+        self.nms_thresh = nms_thresh
+        self.input_size = input_size
+
+        logger.info(
+            f"Starting detector pool with {self.size} sessions "
+            f"x {self.threads_per_session} threads"
+        )
+        self.detectors = [
+            YOLOXDetector(
+                model_path=model_path,
+                conf_thresh=conf_thresh,
+                nms_thresh=nms_thresh,
+                input_size=input_size,
+                session_overrides={
+                    "intra_op_num_threads": self.threads_per_session,
+                    "inter_op_num_threads": 1
+                }
+            )
+            for _ in range(self.size)
+        ]
+
+        self._queue: "queue.Queue[Optional[_Task]]" = queue.Queue()
+        self._stats = [SessionStats() for _ in range(self.size)]
+        self._started_at = time.perf_counter()
+        # Held while enqueueing and while closing, so no batch can be queued
+        # behind the stop sentinels
+        self._submit_lock = threading.Lock()
+        self._closed = False
+        self._workers = [
+            threading.Thread(
+                target=self._worker,
+                args=(index,),
+                name=f"detector-pool-{index}",
+                daemon=True
+            )
+            for index in range(self.size)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    @property
+    def model_path(self) -> Path:
+        return self.detectors[0].model_path
+
+    @property
+    def max_batch_size(self) -> int:
+        return self.detectors[0].max_batch_size
+
+    @property
+    def session_info(self) -> Dict:
+        return self.detectors[0].session_info
+
+    @property
+    def load_stats(self) -> Dict[str, float]:
+        return self.detectors[0].load_stats
+
+    def _worker(self, index: int) -> None:
+        """Run queued batches on this worker's session until closed."""
+        detector = self.detectors[index]
+        stats = self._stats[index]
+        while True:
+            task = self._queue.get()
+            if task is None:
+                break
+            if not task.future.set_running_or_notify_cancel():
+                continue
+
+            start_time = time.perf_counter()
+            stats.queue_wait_time += start_time - task.enqueued_at
+            try:
+                result = detector.detect_batch(task.images, task.conf_thresh, task.nms_thresh)
+                task.future.set_result(result)
+            except Exception as e:
+                stats.errors += 1
+                task.future.set_exception(e)
+            finally:
+                stats.busy_time += time.perf_counter() - start_time
+                stats.tasks += 1
+                stats.images += len(task.images)
+
+    def submit(
+        self,
+        images: List[np.ndarray],
+        conf_thresh: Optional[float] = None,
+        nms_thresh: Optional[float] = None
+    ) -> Future:
+        """
+        Queue a batch for the next free session.
+
+        Returns:
+            Future resolving to one Detections per image
+        """
+        future: Future = Future()
+        with self._submit_lock:
+            if self._closed:
+                raise DetectorError("Detector pool is closed")
+            self._queue.put(_Task(
+                images=images,
+                conf_thresh=self.conf_thresh if conf_thresh is None else conf_thresh,
+                nms_thresh=self.nms_thresh if nms_thresh is None else nms_thresh,
+                future=future,
+                enqueued_at=time.perf_counter()
+            ))
+        return future
+
+    def detect_batch(
+        self,
+        images: List[np.ndarray],
+        conf_thresh: Optional[float] = None,
+        nms_thresh: Optional[float] = None
+    ) -> List[Detections]:
+        """
+        Run detection on many images, split over the pool's sessions.
+
+        Args:
+            images: BGR images (or slices) as numpy arrays
+            conf_thresh: Optional override for confidence threshold
+            nms_thresh: Optional override for NMS threshold
+
+        Returns:
+            Detections per input image, in input order
+        """
+        if not images:
+            return []
+
+        chunk_size = min(math.ceil(len(images) / self.size), self.max_batch_size)
+        futures = [
+            self.submit(images[start:start + chunk_size], conf_thresh, nms_thresh)
+            for start in range(0, len(images), chunk_size)
+        ]
+
+        results: List[Detections] = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+
+    def detect_as_completed(
+        self,
+        images: List[np.ndarray],
+        conf_thresh: Optional[float] = None,
+        nms_thresh: Optional[float] = None,
+        parallelism: Optional[int] = None
+    ) -> Iterator[Tuple[int, List[Detections]]]:
+        """
+        Run detection on many images over at most `parallelism` sessions,
+        yielding results as they complete (see run_as_completed).
+
+        Args:
+            images: BGR images (or slices) as numpy arrays
+            conf_thresh: Optional override for confidence threshold
+            nms_thresh: Optional override for NMS threshold
+            parallelism: Most sessions used at once (defaults to config, or
+                to all sessions)
+
+        Yields:
+            Tuples of (index of the chunk's first image, Detections per image)
+        """
+        parallelism = max(1, min(parallelism or config.SLICE_PARALLELISM or self.size, self.size))
+        chunk_size = min(math.ceil(len(images) / parallelism), self.max_batch_size)
+        return run_as_completed(
+            lambda chunk: self.submit(chunk, conf_thresh, nms_thresh),
+            images,
+            chunk_size,
+            parallelism
+        )
+
+    def detect(
+        self,
+        image: np.ndarray,
+        conf_thresh: Optional[float] = None,
+        nms_thresh: Optional[float] = None
+    ) -> List[Dict]:
+        """Run detection on one image (same output as YOLOXDetector.detect)."""
+        return self.detect_batch([image], conf_thresh, nms_thresh)[0].to_list()
+
+    def warmup(
+        self,
+        batch_sizes: Optional[List[int]] = None,
+        image_shape: Optional[Tuple[int, int]] = None,
+        runs: int = 1
+    ) -> List[Dict[int, float]]:
+        """Warm every session of the pool (see YOLOXDetector.warmup)."""
+        return [
+            detector.warmup(batch_sizes, image_shape, runs)
+            for detector in self.detectors
+        ]
+
+    def stats(self) -> Dict:
+        """Get per-session utilization and queue statistics."""
+        elapsed = max(time.perf_counter() - self._started_at, 1e-9)
+        total_tasks = sum(s.tasks for s in self._stats)
+        total_wait = sum(s.queue_wait_time for s in self._stats)
+        return {
+            "sessions": self.size,
+            "threads_per_session": self.threads_per_session,
+            "queue_depth": self._queue.qsize(),
+            "average_queue_wait": total_wait / total_tasks if total_tasks else 0.0,
+            "session_stats": [
+                {
+                    "session": index,
+                    "utilization": round(s.busy_time / elapsed, 4),
+                    "busy_time": round(s.busy_time, 4),
+                    "tasks": s.tasks,
+                    "images": s.images,
+                    "errors": s.errors
+                }
+                for index, s in enumerate(self._stats)
+            ]
+        }
+
+    def close(self) -> None:
+        """Stop workers after the queued batches are done."""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            for _ in self._workers:
+                self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+        # Fail whatever the workers left behind, so no caller waits forever
+        while True:
+            try:
+                task = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if task is not None and task.future.set_running_or_notify_cancel():
+                task.future.set_exception(DetectorError("Detector pool is closed"))
+        logger.info("Detector pool closed")
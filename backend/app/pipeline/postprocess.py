@@ -0,0 +1,320 @@
+# app/pipeline/postprocess.py
+"""
+Vectorized YOLOX postprocessing: score filtering, top-k and class-aware NMS.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import config
+
+# NMS threshold that disables NMS: postprocess() then returns every scored
+# candidate, highest score first, for later thresholding (see candidates.py).
+# max_candidates still caps them; max_detections does not apply
+NO_NMS = 1.0
+
+
+@dataclass
+class Detections:
+    """Detections of one image as contiguous arrays."""
+    boxes: np.ndarray      # (N, 4) float32 [x_min, y_min, x_max, y_max]
+    scores: np.ndarray     # (N,) float32
+    class_ids: np.ndarray  # (N,) int32
+
+    @classmethod
+    def empty(cls) -> "Detections":
+        """Create an empty detection set."""
+        return cls(
+            boxes=np.zeros((0, 4), dtype=np.float32),
+            scores=np.zeros((0,), dtype=np.float32),
+            class_ids=np.zeros((0,), dtype=np.int32)
+        )
+
+    @classmethod
+    def concatenate(
+        cls,
+        detections: List["Detections"],
+        offsets: Optional[np.ndarray] = None
+    ) -> "Detections":
+        """
+        Join detection sets, optionally shifting each by an (x, y) offset.
+
+        Args:
+            detections: Detection sets, e.g. one per image slice
+            offsets: (len(detections), 2) offsets added to each set's boxes
+
+        Returns:
+            All detections in one set
+        """
+        if not detections:
+            return cls.empty()
+        boxes = np.concatenate([d.boxes for d in detections])
+        if offsets is not None and len(boxes):
+            counts = [len(d) for d in detections]
+            shifts = np.repeat(np.asarray(offsets, dtype=np.float32), counts, axis=0)
+            boxes[:, :2] += shifts
+            boxes[:, 2:] += shifts
+        return cls(
+            boxes=boxes,
+            scores=np.concatenate([d.scores for d in detections]),
+            class_ids=np.concatenate([d.class_ids for d in detections])
+        )
+
+    def __len__(self) -> int:
+        return int(self.scores.shape[0])
+
+    def select(self, indices: np.ndarray) -> "Detections":
+        """Get the subset at the given indices (or boolean mask)."""
+        return Detections(
+            boxes=np.ascontiguousarray(self.boxes[indices]),
+            scores=np.ascontiguousarray(self.scores[indices]),
+            class_ids=np.ascontiguousarray(self.class_ids[indices])
+        )
+
+    def to_list(self) -> List[Dict]:
+        """
+        Convert to a list of detection dicts with:
+        - bbox: [x_min, y_min, x_max, y_max]
+        - confidence: Detection confidence
+        - class_id: Class ID from model
+        - class_name: Class name (if available)
+        """
+        return [
+            {
+                "bbox": box,
+                "confidence": score,
+                "class_id": class_id,
+                "class_name": config.get_class_name(class_id)
+            }
+            for box, score, class_id in zip(
+                self.boxes.tolist(),
+                self.scores.tolist(),
+                self.class_ids.tolist()
+            )
+        ]
+
+
+def xywh2xyxy(boxes: np.ndarray) -> np.ndarray:
+    """Convert boxes from (x_center, y_center, w, h) to (x1, y1, x2, y2)."""
+    half_wh = boxes[:, 2:4] * 0.5
+    return np.concatenate([boxes[:, :2] - half_wh, boxes[:, :2] + half_wh], axis=1)
+
+
+def _paired_areas(boxes_a: np.ndarray, boxes_b: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Element-wise intersection and box areas of two (N, 4) xyxy box arrays."""
+    inter_w = np.minimum(boxes_a[:, 2], boxes_b[:, 2]) - np.maximum(boxes_a[:, 0], boxes_b[:, 0])
+    inter_h = np.minimum(boxes_a[:, 3], boxes_b[:, 3]) - np.maximum(boxes_a[:, 1], boxes_b[:, 1])
+    inter = np.clip(inter_w, 0, None) * np.clip(inter_h, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    return inter, area_a, area_b
+
+
+def paired_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Element-wise IoU between two (N, 4) xyxy box arrays."""
+    inter, area_a, area_b = _paired_areas(boxes_a, boxes_b)
+    return inter / np.maximum(area_a + area_b - inter, 1e-9)
+
+
+def paired_ios(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Element-wise intersection over the smaller box's area between two (N, 4) xyxy box arrays."""
+    inter, area_a, area_b = _paired_areas(boxes_a, boxes_b)
+    return inter / np.maximum(np.minimum(area_a, area_b), 1e-9)
+
+
+def box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """IoU matrix (N, M) between (N, 4) and (M, 4) xyxy box arrays."""
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    inter = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def overlapping_pairs(boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find all index pairs of boxes whose x-intervals intersect.
+
+    Boxes are swept in order of x_min; each box is paired with the boxes
+    that start before it ends. Boxes that do not share any x range cannot
+    overlap, so this prunes the quadratic all-pairs comparison down to the
+    locally crowded pairs.
+
+    Returns:
+        Two index arrays (first, second), one entry per candidate pair
+    """
+    count = boxes.shape[0]
+    by_x = np.argsort(boxes[:, 0], kind="stable")
+    x_min = boxes[by_x, 0]
+    window_end = np.searchsorted(x_min, boxes[by_x, 2], side="left")
+
+    pair_counts = np.maximum(window_end - np.arange(count) - 1, 0)
+    total = int(pair_counts.sum())
+    if total == 0:
+        empty = np.zeros((0,), dtype=np.int64)
+        return empty, empty
+
+    first = np.repeat(np.arange(count), pair_counts)
+    group_start = np.repeat(np.cumsum(pair_counts) - pair_counts, pair_counts)
+    second = first + 1 + (np.arange(total) - group_start)
+
+    return by_x[first], by_x[second]
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_thresh: float) -> np.ndarray:
+    """
+    Non-maximum suppression, equivalent to greedy NMS.
+
+    Instead of suppressing box by box, all overlapping pairs are found at
+    once and the keep mask is iterated to its fixed point: a box is kept
+    iff no kept higher-scoring box overlaps it by more than iou_thresh.
+    After k iterations the k highest-scoring boxes are final, and in
+    practice this converges in a handful of iterations (the longest chain
+    of suppressions).
+
+    Args:
+        boxes: (N, 4) boxes in xyxy format
+        scores: (N,) scores
+        iou_thresh: Boxes overlapping a kept box by more than this are dropped
+
+    Returns:
+        Indices of kept boxes, highest score first
+    """
+    count = boxes.shape[0]
+    order = np.argsort(-scores, kind="stable")
+    if count <= 1:
+        return order.astype(np.int64)
+
+    first, second = overlapping_pairs(boxes)
+    hit = paired_iou(boxes[first], boxes[second]) > iou_thresh
+    first, second = first[hit], second[hit]
+    if first.size == 0:
+        return order.astype(np.int64)
+
+    # Orient every pair from the higher-ranked box to the one it suppresses
+    rank = np.empty(count, dtype=np.int64)
+    rank[order] = np.arange(count)
+    first_wins = rank[first] < rank[second]
+    suppressor = np.where(first_wins, first, second)
+    victim = np.where(first_wins, second, first)
+
+    keep = resolve_suppression(count, suppressor, victim)
+    return order[keep[order]].astype(np.int64)
+
+
+def resolve_suppression(count: int, suppressor: np.ndarray, victim: np.ndarray) -> np.ndarray:
+    """
+    Get the greedy NMS keep mask from (suppressor, victim) pairs.
+
+    Every pair must point from the higher-ranked box to the lower-ranked
+    one. The mask is iterated to its fixed point: a box is kept iff no kept
+    box suppresses it.
+
+    Returns:
+        (count,) boolean keep mask
+    """
+    keep = np.ones(count, dtype=bool)
+    while True:
+        new_keep = np.ones(count, dtype=bool)
+        new_keep[victim[keep[suppressor]]] = False
+        if np.array_equal(new_keep, keep):
+            return keep
+        keep = new_keep
+
+
+def batched_nms(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    class_ids: np.ndarray,
+    iou_thresh: float
+) -> np.ndarray:
+    """
+    Class-aware NMS in a single pass.
+
+    Boxes are moved to start at 0 (coordinates may be negative) and each
+    class is shifted by a class-dependent offset larger than any coordinate,
+    so boxes of different classes can never overlap and are never even
+    paired up by the sweep in nms(). Shifting in float64 keeps the IoU of
+    boxes far from the origin exact.
+    """
+    if boxes.shape[0] == 0:
+        return np.zeros((0,), dtype=np.int64)
+    shifted = boxes.astype(np.float64) - float(boxes.min())
+    max_coordinate = float(shifted.max()) + 1.0
+    offsets = class_ids.astype(np.float64)[:, None] * max_coordinate
+    return nms(shifted + offsets, scores, iou_thresh)
+
+
+def postprocess(
+    outputs: np.ndarray,
+    conf_thresh: float,
+    nms_thresh: float,
+    max_candidates: Optional[int] = None,
+    max_detections: Optional[int] = None,
+    class_agnostic: Optional[bool] = None
+) -> Detections:
+    """
+    Turn decoded YOLOX outputs of one image into final detections.
+
+    Args:
+        outputs: (num_anchors, 5 + num_classes) array of
+            [x_center, y_center, w, h, objectness, class scores...]
+        conf_thresh: Minimum objectness * class score
+        nms_thresh: NMS IoU threshold (NO_NMS or above to skip NMS and the
+            max_detections cap)
+        max_candidates: Keep at most this many top-scoring boxes before NMS
+        max_detections: Keep at most this many boxes after NMS
+        class_agnostic: Suppress overlapping boxes across classes
+
+    Returns:
+        Detections in model input coordinates
+    """
+    max_candidates = max_candidates or config.MAX_CANDIDATES
+    max_detections = max_detections or config.MAX_DETECTIONS
+    if class_agnostic is None:
+        class_agnostic = config.CLASS_AGNOSTIC_NMS
+
+    # Objectness bounds the final score, so filter on it before
+    # touching the (num_anchors x num_classes) class scores
+    candidates = np.flatnonzero(outputs[:, 4] > conf_thresh)
+    if candidates.size == 0:
+        return Detections.empty()
+
+    candidate_outputs = outputs[candidates]
+    class_scores = candidate_outputs[:, 5:]
+    class_ids = class_scores.argmax(axis=1)
+    scores = candidate_outputs[:, 4] * class_scores[np.arange(class_ids.size), class_ids]
+
+    mask = scores > conf_thresh
+    if not mask.any():
+        return Detections.empty()
+    candidate_outputs = candidate_outputs[mask]
+    scores = scores[mask]
+    class_ids = class_ids[mask]
+
+    # Cap candidates entering NMS
+    if scores.size > max_candidates:
+        top = np.argpartition(-scores, max_candidates - 1)[:max_candidates]
+        candidate_outputs = candidate_outputs[top]
+        scores = scores[top]
+        class_ids = class_ids[top]
+
+    boxes = xywh2xyxy(candidate_outputs[:, :4])
+
+    if nms_thresh >= NO_NMS:
+        keep = np.argsort(-scores, kind="stable")
+    elif class_agnostic:
+        keep = nms(boxes, scores, nms_thresh)
+    else:
+        keep = batched_nms(boxes, scores, class_ids, nms_thresh)
+    if nms_thresh < NO_NMS:
+        keep = keep[:max_detections]
+
+    return Detections(
+        boxes=np.ascontiguousarray(boxes[keep], dtype=np.float32),
+        scores=np.ascontiguousarray(scores[keep], dtype=np.float32),
+        class_ids=np.ascontiguousarray(class_ids[keep], dtype=np.int32)
+    )
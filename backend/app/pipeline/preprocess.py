@@ -0,0 +1,142 @@
+# app/pipeline/preprocess.py
+"""
+Letterbox preprocessing into reusable NCHW float32 input buffers.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+
+# YOLOX pads letterboxed images with gray (114, 114, 114)
+PAD_VALUE = 114.0 / 255.0
+
+# Number of distinct resize shapes to keep staging buffers for, per thread
+_MAX_STAGING_BUFFERS = 8
+
+
+class Preprocessor:
+    """
+    Converts BGR images to the model's NCHW float32 RGB input.
+
+    Images are resized with their aspect ratio preserved, placed in the
+    top-left corner of the input and padded with gray, so boxes map back to
+    the original image by dividing by a single ratio. Input tensors and
+    resize staging buffers are allocated once per thread and reused, so a
+    steady stream of frames does not allocate.
+    """
+
+    def __init__(self, input_size: Tuple[int, int], pad_value: float = PAD_VALUE):
+        """
+        Initialize preprocessor.
+
+        Args:
+            input_size: Model input size (width, height)
+            pad_value: Value of padded pixels in the normalized input
+        """
+        self.input_size = tuple(input_size)
+        self.pad_value = np.float32(pad_value)
+        self._scale = np.float32(1.0 / 255.0)
+        self._local = threading.local()
+
+    def _get_input_buffer(self, batch_size: int) -> np.ndarray:
+        """Get this thread's input buffer with room for batch_size images."""
+        buffer = getattr(self._local, "input_buffer", None)
+        if buffer is None or buffer.shape[0] < batch_size:
+            width, height = self.input_size
+            buffer = np.empty((batch_size, 3, height, width), dtype=np.float32)
+            self._local.input_buffer = buffer
+        return buffer
+
+    def _get_staging_buffer(self, height: int, width: int) -> np.ndarray:
+        """Get this thread's uint8 resize target for the given shape."""
+        staging = getattr(self._local, "staging", None)
+        if staging is None:
+            staging = self._local.staging = OrderedDict()
+
+        key = (height, width)
+        buffer = staging.get(key)
+        if buffer is None:
+            buffer = np.empty((height, width, 3), dtype=np.uint8)
+            staging[key] = buffer
+            if len(staging) > _MAX_STAGING_BUFFERS:
+                staging.popitem(last=False)
+        else:
+            staging.move_to_end(key)
+        return buffer
+
+    def letterbox_ratio(self, image_shape: Tuple[int, int]) -> float:
+        """
+        Get the resize ratio used for an image of the given (height, width).
+
+        Model-space boxes divided by this ratio are in image coordinates.
+        """
+        width, height = self.input_size
+        return min(width / image_shape[1], height / image_shape[0])
+
+    def _fill(self, image: np.ndarray, target: np.ndarray) -> float:
+        """Letterbox one image into a (3, H, W) slot of the input buffer."""
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        elif image.shape[2] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+
+        ratio = self.letterbox_ratio(image.shape[:2])
+        _, input_height, input_width = target.shape
+        new_width = min(max(int(round(image.shape[1] * ratio)), 1), input_width)
+        new_height = min(max(int(round(image.shape[0] * ratio)), 1), input_height)
+
+        if (new_height, new_width) == image.shape[:2]:
+            resized = image
+        else:
+            resized = self._get_staging_buffer(new_height, new_width)
+            cv2.resize(
+                image,
+                (new_width, new_height),
+                dst=resized,
+                interpolation=cv2.INTER_LINEAR
+            )
+
+        # BGR -> RGB, uint8 -> float32 in [0, 1] and HWC -> CHW in one pass
+        for channel in range(3):
+            np.multiply(
+                resized[:, :, 2 - channel],
+                self._scale,
+                out=target[channel, :new_height, :new_width]
+            )
+
+        # Pad bottom and right
+        target[:, new_height:, :] = self.pad_value
+        target[:, :new_height, new_width:] = self.pad_value
+
+        return ratio
+
+    def __call__(
+        self,
+        images: List[np.ndarray],
+        batch_size: int = 0
+    ) -> Tuple[np.ndarray, List[float]]:
+        """
+        Preprocess images into one input tensor.
+
+        Args:
+            images: BGR images as numpy arrays, any sizes
+            batch_size: Batch size of the returned tensor; slots beyond
+                len(images) are zero-filled (defaults to len(images))
+
+        Returns:
+            Tuple of:
+            - Input tensor of shape (batch_size, 3, H, W). It is a view of a
+              reused buffer and is only valid until this thread's next call.
+            - Letterbox ratio per image
+        """
+        batch_size = max(batch_size, len(images))
+        buffer = self._get_input_buffer(batch_size)[:batch_size]
+
+        ratios = [self._fill(image, buffer[i]) for i, image in enumerate(images)]
+        if batch_size > len(images):
+            buffer[len(images):] = 0.0
+
+        return buffer, ratios
@@ -0,0 +1,389 @@
+# app/pipeline/quantize.py
+"""
+INT8 quantization of the detection model, with an accuracy/speed report.
+
+Builds a dynamic or static INT8 variant of the configured model next to the
+original in MODEL_DIR; static quantization is calibrated on already uploaded
+images. The report compares the variant against the fp32 model on a local
+image set: latency, throughput and detection agreement (recall of the fp32
+detections, matched by class and IoU).
+
+Usage (from the backend directory):
+    python -m app.pipeline.quantize --precision int8_static
+    python -m app.pipeline.quantize --precision int8_dynamic --eval-dir samples/
+Then serve the variant with MODELSHIP_MODEL_PRECISION=int8_static.
+"""
+
+import argparse
+import json
+import logging
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import cv2
+import numpy as np
+import onnxruntime
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quant_pre_process,
+    quantize_dynamic,
+    quantize_static,
+)
+
+from ..core.config import settings
+from .config import config
+from .detector import YOLOXDetector
+from .postprocess import Detections, box_iou
+from .preprocess import Preprocessor
+
+logger = logging.getLogger(__name__)
+
+PRECISIONS = ("int8_dynamic", "int8_static")
+
+# Only the compute-heavy ops; the YOLOX head concatenates pixel boxes and
+# 0-1 scores into one tensor, which a single int8 scale cannot represent
+QUANTIZED_OP_TYPES = ["Conv", "MatMul", "Gemm"]
+
+
+class QuantizationError(Exception):
+    """Custom exception for model quantization errors."""
+    pass
+
+
+def find_images(directory: Path, limit: Optional[int] = None, seed: int = 0) -> List[Path]:
+    """
+    Find image files below a directory.
+
+    Args:
+        directory: Directory to search recursively
+        limit: Maximum number of images, sampled reproducibly
+        seed: Sampling seed
+
+    Returns:
+        Sorted list of image paths
+    """
+    extensions = settings.get_allowed_extensions_set()
+    paths = sorted(
+        path for path in Path(directory).rglob("*")
+        if path.is_file() and path.suffix.lower() in extensions
+    )
+    if limit and len(paths) > limit:
+        paths = sorted(random.Random(seed).sample(paths, limit))
+    return paths
+
+
+def load_images(paths: Sequence[Path]) -> List[np.ndarray]:
+    """Decode images, skipping unreadable files."""
+    images = []
+    for path in paths:
+        image = cv2.imread(str(path))
+        if image is None:
+            logger.warning(f"Skipping unreadable image {path}")
+            continue
+        images.append(image)
+    return images
+
+
+class ImageCalibrationReader(CalibrationDataReader):
+    """Feeds preprocessed images to the static quantization calibrator."""
+
+    def __init__(self, image_paths: Sequence[Path], input_name: str, input_size: tuple):
+        self.input_name = input_name
+        self.preprocessor = Preprocessor(input_size)
+        self._paths = iter(image_paths)
+        self.count = 0
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        for path in self._paths:
+            image = cv2.imread(str(path))
+            if image is None:
+                continue
+            batch, _ = self.preprocessor([image], batch_size=1)
+            self.count += 1
+            # The preprocessor reuses its buffer, the calibrator keeps inputs
+            return {self.input_name: batch.copy()}
+        return None
+
+
+def quantize_model(
+    precision: str,
+    model_path: Optional[Path] = None,
+    output_path: Optional[Path] = None,
+    calibration_dir: Optional[Path] = None,
+    calibration_size: int = 100,
+    input_size: Optional[tuple] = None
+) -> Path:
+    """
+    Build an INT8 variant of a model.
+
+    Args:
+        precision: int8_dynamic (weights only, no calibration) or
+            int8_static (weights and activations, calibrated)
+        model_path: fp32 model (defaults to the configured model)
+        output_path: Output file (defaults to the variant path in MODEL_DIR)
+        calibration_dir: Images for static calibration (defaults to STORAGE_DIR)
+        calibration_size: Maximum number of calibration images
+        input_size: Model input size (defaults to config)
+
+    Returns:
+        Path of the quantized model
+    """
+    if precision not in PRECISIONS:
+        raise QuantizationError(f"Unknown precision {precision}, expected one of {PRECISIONS}")
+
+    model_path = Path(model_path or config.base_model_path)
+    output_path = Path(output_path or config.get_model_variant_path(precision))
+    input_size = tuple(input_size or config.INPUT_SIZE)
+    if not model_path.exists():
+        raise QuantizationError(f"Model file not found: {model_path}")
+
+    start_time = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Shape inference and graph cleanup make more nodes quantizable
+        prepared_path = Path(tmp_dir) / "prepared.onnx"
+        try:
+            quant_pre_process(str(model_path), str(prepared_path), skip_symbolic_shape=True)
+        except Exception as e:
+            logger.warning(f"Quantization preprocessing failed, using model as is: {str(e)}")
+            prepared_path = model_path
+
+        try:
+            if precision == "int8_dynamic":
+                # The CPU ConvInteger kernel needs unsigned weights
+                quantize_dynamic(
+                    str(prepared_path),
+                    str(output_path),
+                    op_types_to_quantize=QUANTIZED_OP_TYPES,
+                    weight_type=QuantType.QUInt8
+                )
+            else:
+                calibration_paths = find_images(
+                    calibration_dir or Path(settings.STORAGE_DIR),
+                    limit=calibration_size
+                )
+                if not calibration_paths:
+                    raise QuantizationError(
+                        "Static quantization needs calibration images, none found in "
+                        f"{calibration_dir or settings.STORAGE_DIR}"
+                    )
+                input_name = onnxruntime.InferenceSession(
+                    str(prepared_path),
+                    providers=["CPUExecutionProvider"]
+                ).get_inputs()[0].name
+                reader = ImageCalibrationReader(calibration_paths, input_name, input_size)
+                quantize_static(
+                    str(prepared_path),
+                    str(output_path),
+                    reader,
+                    op_types_to_quantize=QUANTIZED_OP_TYPES,
+                    quant_format=QuantFormat.QDQ,
+                    per_channel=True,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    calibrate_method=CalibrationMethod.MinMax
+                )
+                logger.info(f"Calibrated on {reader.count} images")
+        except QuantizationError:
+            raise
+        except Exception as e:
+            raise QuantizationError(f"Quantization failed: {str(e)}")
+
+    logger.info(
+        f"Wrote {precision} model to {output_path} in {time.perf_counter() - start_time:.1f}s "
+        f"({model_path.stat().st_size / 1e6:.1f} MB -> {output_path.stat().st_size / 1e6:.1f} MB)"
+    )
+    return output_path
+
+
+def match_detections(
+    reference: Detections,
+    candidate: Detections,
+    iou_thresh: float = 0.5
+) -> int:
+    """
+    Count reference detections found again by the candidate.
+
+    Reference detections are matched greedily in score order to the
+    unmatched candidate detection of the same class with the highest IoU.
+
+    Returns:
+        Number of matched reference detections
+    """
+    if len(reference) == 0 or len(candidate) == 0:
+        return 0
+    iou = box_iou(reference.boxes, candidate.boxes)
+    iou[reference.class_ids[:, None] != candidate.class_ids[None, :]] = 0.0
+
+    matched = 0
+    for index in np.argsort(-reference.scores, kind="stable"):
+        best = int(np.argmax(iou[index]))
+        if iou[index, best] >= iou_thresh:
+            matched += 1
+            iou[:, best] = 0.0
+    return matched
+
+
+def benchmark_model(
+    model_path: Path,
+    images: List[np.ndarray],
+    input_size: tuple,
+    batch_size: int = 8
+) -> Dict:
+    """
+    Measure latency and throughput of a model and collect its detections.
+
+    Returns:
+        Dict with timing statistics and per-image detections
+    """
+    detector = YOLOXDetector(
+        model_path=model_path,
+        conf_thresh=config.CONF_THRESH,
+        nms_thresh=config.NMS_THRESH,
+        input_size=input_size
+    )
+
+    # Single-image latency, as seen by one request
+    detections = []
+    latencies = []
+    for image in images:
+        start_time = time.perf_counter()
+        detections.append(detector.detect_batch([image])[0])
+        latencies.append(time.perf_counter() - start_time)
+
+    # Batched throughput, as seen by the pool under load
+    batch_size = min(batch_size, detector.max_batch_size)
+    start_time = time.perf_counter()
+    for start in range(0, len(images), batch_size):
+        detector.detect_batch(images[start:start + batch_size])
+    elapsed = time.perf_counter() - start_time
+
+    latencies.sort()
+    return {
+        "model_path": str(model_path),
+        "file_size": model_path.stat().st_size,
+        "load_stats": detector.load_stats,
+        "latency_mean": statistics.fmean(latencies),
+        "latency_p50": latencies[len(latencies) // 2],
+        "latency_p95": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+        "throughput": len(images) / elapsed if elapsed > 0 else 0.0,
+        "detections": detections
+    }
+
+
+def compare_models(
+    reference_path: Path,
+    candidate_path: Path,
+    images: List[np.ndarray],
+    iou_thresh: float = 0.5,
+    input_size: Optional[tuple] = None
+) -> Dict:
+    """
+    Compare a quantized model against its fp32 reference.
+
+    Args:
+        reference_path: fp32 model
+        candidate_path: Quantized model
+        images: Evaluation images
+        iou_thresh: IoU needed for two detections to agree
+        input_size: Model input size (defaults to config)
+
+    Returns:
+        Report with timing of both models, speedups and detection agreement
+    """
+    if not images:
+        raise QuantizationError("No evaluation images")
+    input_size = tuple(input_size or config.INPUT_SIZE)
+
+    reference = benchmark_model(reference_path, images, input_size)
+    candidate = benchmark_model(candidate_path, images, input_size)
+
+    reference_total = sum(len(d) for d in reference["detections"])
+    candidate_total = sum(len(d) for d in candidate["detections"])
+    matched = sum(
+        match_detections(ref, cand, iou_thresh)
+        for ref, cand in zip(reference["detections"], candidate["detections"])
+    )
+
+    for result in (reference, candidate):
+        del result["detections"]
+    return {
+        "images": len(images),
+        "iou_threshold": iou_thresh,
+        "confidence_threshold": config.CONF_THRESH,
+        "reference": reference,
+        "candidate": candidate,
+        "latency_speedup": reference["latency_mean"] / candidate["latency_mean"],
+        "throughput_speedup": (
+            candidate["throughput"] / reference["throughput"] if reference["throughput"] else 0.0
+        ),
+        "size_ratio": candidate["file_size"] / reference["file_size"],
+        "reference_detections": reference_total,
+        "candidate_detections": candidate_total,
+        # Share of fp32 detections the quantized model reproduces
+        "recall": matched / reference_total if reference_total else 1.0,
+        # Share of quantized detections that fp32 also made
+        "precision": matched / candidate_total if candidate_total else 1.0
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> Dict:
+    parser = argparse.ArgumentParser(description="Build and evaluate an INT8 model variant")
+    parser.add_argument("--precision", choices=PRECISIONS, default="int8_static")
+    parser.add_argument("--model", type=Path, help="fp32 model (default: configured model)")
+    parser.add_argument("--output", type=Path, help="Output model (default: variant in MODEL_DIR)")
+    parser.add_argument("--calibration-dir", type=Path, help="Calibration images (default: STORAGE_DIR)")
+    parser.add_argument("--calibration-size", type=int, default=100)
+    parser.add_argument("--eval-dir", type=Path, help="Evaluation images (default: STORAGE_DIR)")
+    parser.add_argument("--eval-size", type=int, default=50)
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU for detections to agree")
+    parser.add_argument("--skip-build", action="store_true", help="Only evaluate an existing variant")
+    parser.add_argument("--report", type=Path, help="Report file (default: next to the variant)")
+    args = parser.parse_args(argv)
+
+    model_path = Path(args.model or config.base_model_path)
+    output_path = Path(args.output or config.get_model_variant_path(args.precision))
+    if not args.skip_build:
+        quantize_model(
+            args.precision,
+            model_path=model_path,
+            output_path=output_path,
+            calibration_dir=args.calibration_dir,
+            calibration_size=args.calibration_size
+        )
+
+    eval_dir = args.eval_dir or Path(settings.STORAGE_DIR)
+    images = load_images(find_images(eval_dir, limit=args.eval_size, seed=1))
+    if not images:
+        logger.warning(f"No evaluation images in {eval_dir}, skipping report")
+        return {}
+
+    report = {
+        "precision": args.precision,
+        **compare_models(model_path, output_path, images, iou_thresh=args.iou)
+    }
+    report_path = args.report or output_path.with_suffix(".report.json")
+    report_path.write_text(json.dumps(report, indent=2))
+
+    print(
+        f"{args.precision} vs fp32 on {report['images']} images: "
+        f"latency {report['reference']['latency_mean'] * 1000:.1f} -> "
+        f"{report['candidate']['latency_mean'] * 1000:.1f} ms "
+        f"({report['latency_speedup']:.2f}x), "
+        f"throughput {report['throughput_speedup']:.2f}x, "
+        f"recall {report['recall']:.3f}, precision {report['precision']:.3f}, "
+        f"size {report['size_ratio']:.2f}x"
+    )
+    print(f"Report written to {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
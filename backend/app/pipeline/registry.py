@@ -0,0 +1,280 @@
+# app/pipeline/registry.py
+"""
+Process-wide registry of loaded detection models.
+
+Loading an ONNX model (session creation + graph optimization) is by far the
+most expensive step of the pipeline, so each model is loaded once per process
+and shared by every request that needs it.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from .batching import MicroBatcher
+from .config import config
+from .detector import DetectorError
+from .pool import DetectorPool
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistryError(Exception):
+    """Custom exception for model registry errors."""
+    pass
+
+
+def _get_rss_bytes() -> int:
+    """Get resident set size of the current process in bytes (0 if unknown)."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+@dataclass
+class ModelEntry:
+    """A loaded model and its bookkeeping."""
+    key: Tuple[str, Tuple[int, int]]
+    detector: Union[DetectorPool, MicroBatcher]
+    load_time: float
+    memory_bytes: int
+    file_size: int
+    loaded_at: datetime = field(default_factory=datetime.utcnow)
+    last_used: Optional[datetime] = None
+    ref_count: int = 0
+    total_acquisitions: int = 0
+    warmup_time: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        """Serialize entry statistics (without the detector itself)."""
+        return {
+            "model_path": self.key[0],
+            "input_size": list(self.key[1]),
+            "load_time": round(self.load_time, 4),
+            "memory_bytes": self.memory_bytes,
+            "file_size": self.file_size,
+            "loaded_at": self.loaded_at.isoformat(),
+            "last_used": self.last_used.isoformat() if self.last_used else None,
+            "ref_count": self.ref_count,
+            "total_acquisitions": self.total_acquisitions,
+            "warmed_up": self.warmup_time is not None,
+            "warmup_time": round(self.warmup_time, 4) if self.warmup_time is not None else None,
+            "providers": self.detector.session_info["providers"],
+            "optimized_cache_hit": self.detector.session_info["cache_hit"],
+            "latency": self.detector.load_stats,
+            "pool": self.detector.stats()
+        }
+
+
+class ModelRegistry:
+    """
+    Loads each model once and shares its detector pool across requests,
+    behind a micro-batcher unless MICRO_BATCHING is off.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, Tuple[int, int]], ModelEntry] = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _make_key(
+        model_path: Optional[Union[str, Path]],
+        input_size: Optional[Tuple[int, int]]
+    ) -> Tuple[str, Tuple[int, int]]:
+        path = Path(model_path) if model_path else config.model_path
+        size = tuple(input_size) if input_size else tuple(config.INPUT_SIZE)
+        return str(path.resolve()), size
+
+    def load(
+        self,
+        model_path: Optional[Union[str, Path]] = None,
+        input_size: Optional[Tuple[int, int]] = None
+    ) -> ModelEntry:
+        """
+        Load a model if it is not loaded yet.
+
+        Args:
+            model_path: Path to ONNX model file (defaults to configured model)
+            input_size: Model input size (defaults to configured input size)
+
+        Returns:
+            Registry entry for the model
+        """
+        key = self._make_key(model_path, input_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry
+
+            rss_before = _get_rss_bytes()
+            start_time = time.perf_counter()
+            try:
+                detector = DetectorPool(
+                    model_path=key[0],
+                    conf_thresh=config.CONF_THRESH,
+                    nms_thresh=config.NMS_THRESH,
+                    input_size=key[1]
+                )
+                if config.MICRO_BATCHING:
+                    detector = MicroBatcher(detector)
+            except DetectorError as e:
+                raise ModelRegistryError(f"Failed to load model {key[0]}: {str(e)}")
+            load_time = time.perf_counter() - start_time
+
+            entry = ModelEntry(
+                key=key,
+                detector=detector,
+                load_time=load_time,
+                memory_bytes=max(_get_rss_bytes() - rss_before, 0),
+                file_size=Path(key[0]).stat().st_size
+            )
+            self._entries[key] = entry
+            logger.info(
+                f"Registered model {key[0]} (input {key[1]}) in {load_time:.2f}s, "
+                f"~{entry.memory_bytes / 1024 / 1024:.1f} MB"
+            )
+            return entry
+
+    def warmup(
+        self,
+        input_sizes: Optional[List[Tuple[int, int]]] = None,
+        batch_sizes: Optional[List[int]] = None,
+        runs: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Load the configured model at each input size and warm it up.
+
+        Args:
+            input_sizes: Input sizes to load (defaults to config)
+            batch_sizes: Batch sizes to run (defaults to config, or 1 and
+                the max batch size)
+            runs: Runs per batch size (defaults to config)
+
+        Returns:
+            Statistics of the warmed models
+        """
+        input_sizes = input_sizes or config.WARMUP_INPUT_SIZES or [config.INPUT_SIZE]
+        batch_sizes = batch_sizes or config.WARMUP_BATCH_SIZES or None
+        runs = config.WARMUP_RUNS if runs is None else runs
+
+        warmed = []
+        for input_size in input_sizes:
+            entry = self.load(input_size=input_size)
+            start_time = time.perf_counter()
+            try:
+                entry.detector.warmup(batch_sizes, runs=runs)
+            except DetectorError as e:
+                raise ModelRegistryError(f"Failed to warm up model {entry.key[0]}: {str(e)}")
+            entry.warmup_time = time.perf_counter() - start_time
+            logger.info(
+                f"Warmed up model {entry.key[0]} (input {entry.key[1]}) "
+                f"in {entry.warmup_time:.2f}s"
+            )
+            warmed.append(entry.to_dict())
+        return warmed
+
+    def acquire(
+        self,
+        model_path: Optional[Union[str, Path]] = None,
+        input_size: Optional[Tuple[int, int]] = None
+    ) -> Union[DetectorPool, MicroBatcher]:
+        """Get a shared detector pool, loading it on first use, and take a reference."""
+        with self._lock:
+            entry = self.load(model_path, input_size)
+            entry.ref_count += 1
+            entry.total_acquisitions += 1
+            entry.last_used = datetime.utcnow()
+            return entry.detector
+
+    def release(self, detector: Union[DetectorPool, MicroBatcher]) -> None:
+        """Drop a reference previously taken with acquire()."""
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.detector is detector:
+                    entry.ref_count = max(entry.ref_count - 1, 0)
+                    return
+        logger.warning("Released a detector that is not owned by the registry")
+
+    @contextmanager
+    def lease(
+        self,
+        model_path: Optional[Union[str, Path]] = None,
+        input_size: Optional[Tuple[int, int]] = None
+    ) -> Iterator[Union[DetectorPool, MicroBatcher]]:
+        """Context manager that acquires and releases a shared detector."""
+        detector = self.acquire(model_path, input_size)
+        try:
+            yield detector
+        finally:
+            self.release(detector)
+
+    def unload(
+        self,
+        model_path: Optional[Union[str, Path]] = None,
+        input_size: Optional[Tuple[int, int]] = None,
+        force: bool = False
+    ) -> bool:
+        """
+        Unload a model.
+
+        Args:
+            model_path: Path to ONNX model file
+            input_size: Model input size
+            force: Unload even if the model is still referenced
+
+        Returns:
+            True if a model was unloaded
+        """
+        key = self._make_key(model_path, input_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            if entry.ref_count > 0 and not force:
+                raise ModelRegistryError(
+                    f"Model {key[0]} still has {entry.ref_count} active references"
+                )
+            del self._entries[key]
+            entry.detector.close()
+            logger.info(f"Unloaded model {key[0]}")
+            return True
+
+    def close(self) -> None:
+        """Unload every model, regardless of references."""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            entry.detector.close()
+        logger.info("Model registry closed")
+
+    def is_loaded(
+        self,
+        model_path: Optional[Union[str, Path]] = None,
+        input_size: Optional[Tuple[int, int]] = None
+    ) -> bool:
+        """Check whether a model is loaded."""
+        return self._make_key(model_path, input_size) in self._entries
+
+    def stats(self) -> Dict:
+        """Get load time, memory footprint and reference counts of all models."""
+        with self._lock:
+            models = [entry.to_dict() for entry in self._entries.values()]
+        return {
+            "loaded_models": len(models),
+            "total_memory_bytes": sum(m["memory_bytes"] for m in models),
+            "models": models
+        }
+
+
+# Create global instance
+model_registry = ModelRegistry()
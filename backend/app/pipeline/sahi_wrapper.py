@@ -5,110 +5,478 @@ Service for sliced image detection using SAHI.
 import numpy as np
 from pathlib import Path
 import logging
-from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
-from PIL import Image
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 import uuid
 
-from sahi.slicing import slice_image, SliceImageResult
-from sahi.prediction import ObjectPrediction
-from sahi.postprocess.combine import postprocess_object_predictions
-
-from .detector import YOLOXDetector, DetectorError
+from .candidates import Candidates
+from .config import config
+from .detector import YOLOXDetector
+from .merge import IncrementalMerger
+from .pool import DetectorPool
+from .postprocess import NO_NMS, Detections
+from .slicing import (
+    SliceConfig,
+    SlicePlan,
+    plan_slices,
+    screen_images,
+    screen_slices,
+    select_slices,
+    slice_views
+)
+from .tiling import ArraySource, ImageSource
 from ..models.annotation import Annotation, BoundingBox
 
 logger = logging.getLogger(__name__)
 
+
+@dataclass
+class SlicedPrediction:
+    """Merged detections of one image and how its slices were run."""
+    detections: Detections
+    plan: SlicePlan
+    skipped_slices: int = 0  # Slices not run: screened out as empty or away from coarse candidates
+    mode: str = "exhaustive"
+    model_inputs: int = 0  # Model inputs run, slices plus any full-frame pass
+    exhaustive_model_inputs: int = 0  # Model inputs exhaustive slicing would run
+    streamed: bool = False  # Read slice by slice instead of decoded whole
+    candidates: Optional[Candidates] = None  # Pre-threshold candidates, if kept
+
+    @property
+    def compute_saved(self) -> float:
+        """Share of model inputs saved compared with exhaustive slicing."""
+        if self.exhaustive_model_inputs == 0:
+            return 0.0
+        return 1.0 - self.model_inputs / self.exhaustive_model_inputs
+
+    def stats(self) -> Dict:
+        """Get slicing statistics for the image."""
+        return {
+            **self.plan.to_dict(),
+            "mode": self.mode,
+            "skipped_slices": self.skipped_slices,
+            "inferred_slices": len(self.plan.grid) - self.skipped_slices,
+            "model_inputs": self.model_inputs,
+            "exhaustive_model_inputs": self.exhaustive_model_inputs,
+            "compute_saved": round(self.compute_saved, 4),
+            "streamed": self.streamed
+        }
+
+
 @dataclass
-class SliceConfig:
-    """Configuration for image slicing."""
-    slice_height: int = 512
-    slice_width: int = 512
-    overlap_height_ratio: float = 0.2
-    overlap_width_ratio: float = 0.2
+class _Thresholds:
+    """Thresholds of one prediction, and its candidates if they are kept."""
+    conf: float
+    nms: float
+    parts: Optional[List[Candidates]] = None  # Candidates per detector run
+    
+    @property
+    def floor(self) -> float:
+        """Confidence threshold candidates are detected at."""
+        return min(config.CANDIDATE_CONF_THRESH, self.conf)
+    
+    def detect(self, conf: Optional[float] = None) -> Tuple[float, float]:
+        """Get the thresholds to run the detector with."""
+        conf = self.conf if conf is None else conf
+        if self.parts is None:
+            return conf, self.nms
+        return min(conf, self.floor), NO_NMS
+    
+    def collect(
+        self,
+        detections: List[Detections],
+        windows: np.ndarray,
+        conf: Optional[float] = None
+    ) -> Detections:
+        """Get detections of model inputs in image coordinates, keeping their candidates."""
+        if self.parts is None:
+            return Detections.concatenate(detections, windows[:, :2])
+        conf = self.conf if conf is None else conf
+        part = Candidates.from_detections(detections, windows, min(conf, self.floor))
+        self.parts.append(part)
+        return part.select(conf, self.nms)
+    
+    def candidates(self) -> Optional[Candidates]:
+        """Get all candidates kept, if any."""
+        return None if self.parts is None else Candidates.concatenate(self.parts)
+
 
 class SAHIWrapper:
     """Wrapper for SAHI sliced inference."""
     
     def __init__(
         self,
-        detector: YOLOXDetector,
+        detector: Union[YOLOXDetector, DetectorPool],
         slice_config: Optional[SliceConfig] = None
     ):
         """Initialize SAHI wrapper.
         
         Args:
-            detector: YOLOX detector instance
+            detector: YOLOX detector or detector pool instance
             slice_config: Configuration for image slicing
         """
         self.detector = detector
         self.slice_config = slice_config or SliceConfig()
         
-    def predict(self, image: np.ndarray) -> List[Annotation]:
+    def _thresholds(
+        self,
+        conf_thresh: Optional[float],
+        nms_thresh: Optional[float],
+        keep_candidates: bool
+    ) -> _Thresholds:
+        """Resolve a prediction's thresholds against the detector's defaults."""
+        return _Thresholds(
+            conf=self.detector.conf_thresh if conf_thresh is None else conf_thresh,
+            nms=self.detector.nms_thresh if nms_thresh is None else nms_thresh,
+            parts=[] if keep_candidates else None
+        )
+        
+    def plan(self, image_shape: Tuple[int, ...]) -> SlicePlan:
+        """Get the slice grid for an image of the given shape."""
+        return plan_slices(
+            image_shape[0],
+            image_shape[1],
+            self.slice_config,
+            getattr(self.detector, "input_size", None)
+        )
+        
+    def predict(
+        self,
+        image: np.ndarray,
+        parallelism: Optional[int] = None,
+        conf_thresh: Optional[float] = None,
+        nms_thresh: Optional[float] = None
+    ) -> List[Annotation]:
         """Run sliced inference on image.
         
         Args:
             image: Input image as numpy array
-            
+            parallelism: Most slice batches in flight at once (defaults to
+                config)
+            conf_thresh: Confidence threshold (defaults to the detector's)
+            nms_thresh: NMS threshold (defaults to the detector's)
+        
         Returns:
             List of detected annotations
         """
-        # Convert numpy array to PIL Image
-        pil_image = Image.fromarray(image)
-        
-        # Slice image
-        slice_result = slice_image(
-            image=pil_image,
-            slice_height=self.slice_config.slice_height,
-            slice_width=self.slice_config.slice_width,
-            overlap_height_ratio=self.slice_config.overlap_height_ratio,
-            overlap_width_ratio=self.slice_config.overlap_width_ratio
+        return self.to_annotations(self.predict_detections(image, parallelism, conf_thresh, nms_thresh))
+    
+    def predict_detections(
+        self,
+        image: np.ndarray,
+        parallelism: Optional[int] = None,
+        conf_thresh: Optional[float] = None,
+        nms_thresh: Optional[float] = None
+    ) -> Detections:
+        """Run sliced inference on image and return merged detections as arrays.
+        
+        Args:
+            image: Input image as numpy array
+            parallelism: Most slice batches in flight at once (defaults to
+                config)
+            conf_thresh: Confidence threshold (defaults to the detector's)
+            nms_thresh: NMS threshold (defaults to the detector's)
+        
+        Returns:
+            Merged detections in image coordinates
+        """
+        return self.predict_sliced(
+            image,
+            parallelism=parallelism,
+            conf_thresh=conf_thresh,
+            nms_thresh=nms_thresh
+        ).detections
+    
+    def predict_sliced(
+        self,
+        image: np.ndarray,
+        mode: Optional[str] = None,
+        parallelism: Optional[int] = None,
+        conf_thresh: Optional[float] = None,
+        nms_thresh: Optional[float] = None,
+        keep_candidates: bool = False
+    ) -> SlicedPrediction:
+        """Run sliced inference on image and report how it was sliced.
+        
+        With a detector pool, the image's slices are spread over up to
+        `parallelism` sessions at once and merged as they complete, so a
+        single large image finishes sooner without taking the whole pool
+        from concurrent requests.
+        
+        Thresholds are passed to the detector per call and never change
+        its defaults, which other requests share.
+        
+        Args:
+            image: Input image as numpy array
+            mode: Slicing mode (exhaustive or coarse_to_fine), defaults to
+                the slice configuration
+            parallelism: Most slice batches in flight at once (defaults to
+                config, or to all pool sessions)
+            conf_thresh: Confidence threshold (defaults to the detector's)
+            nms_thresh: NMS threshold (defaults to the detector's)
+            keep_candidates: Also return the pre-threshold candidates, for
+                re-thresholding without inference (see candidates.py)
+        
+        Returns:
+            Merged detections in image coordinates with the slice plan
+            
+        Raises:
+            DetectorError: If detection fails on any model input; a partial
+                result would pass for the image having fewer objects
+        """
+        mode = mode or self.slice_config.mode
+        thresholds = self._thresholds(conf_thresh, nms_thresh, keep_candidates)
+        plan = self.plan(image.shape)
+        full_frame = self.slice_config.full_frame and plan.sliced
+        prediction = SlicedPrediction(
+            Detections.empty(),
+            plan,
+            mode=mode,
+            exhaustive_model_inputs=len(plan.grid) + full_frame
         )
         
-        # Run detection on slices
-        predictions = []
-        for slice_data in slice_result.images:
-            try:
-                slice_predictions = self.detector.detect(np.array(slice_data))
-                # Convert to SAHI ObjectPrediction format
-                sahi_predictions = [
-                    ObjectPrediction(
-                        bbox=pred["bbox"],
-                        category_id=pred["class_id"],
-                        category_name=str(pred["class_id"]),  # Use class_id as name if not available
-                        score=pred["confidence"]
-                    ) for pred in slice_predictions
-                ]
-                predictions.extend(sahi_predictions)
-            except DetectorError as e:
-                logger.warning(f"Detection failed for slice: {e}")
-                continue
-                
-        # Merge predictions using postprocess_object_predictions function
-        merged_predictions = postprocess_object_predictions(
-            object_predictions=predictions,
-            match_threshold=0.5,
-            match_metric="IOU"
+        # Skip slices with nothing in them
+        run = screen_slices(image, plan.grid, self.slice_config)
+        
+        # Coarse to fine: a pass over the whole downscaled image finds
+        # candidates, and only slices around them run at full resolution.
+        # The pass also stands in for the full frame pass
+        coarse = None
+        frame = np.array([[0, 0, image.shape[1], image.shape[0]]], dtype=plan.grid.dtype)
+        if mode == "coarse_to_fine" and plan.sliced:
+            prediction.model_inputs += 1
+            coarse_conf = self.slice_config.coarse_conf_thresh
+            found = self.detector.detect_batch([image], *thresholds.detect(coarse_conf))
+            coarse = thresholds.collect(found, frame, coarse_conf)
+            run &= select_slices(plan.grid, coarse.boxes, self.slice_config)
+            # Candidates below the detection threshold only guide slicing
+            coarse = coarse.select(coarse.scores > thresholds.conf)
+            full_frame = False
+        
+        prediction.skipped_slices = int(len(run) - np.count_nonzero(run))
+        windows = plan.grid[run]
+        if prediction.skipped_slices:
+            logger.debug(f"Skipping {prediction.skipped_slices} of {len(run)} slices")
+        
+        # Slice image into views of the original array (no copies)
+        images = slice_views(image, windows)
+        
+        # The full frame catches objects larger than a slice. It goes first:
+        # until it is done no slice's detections are final
+        if full_frame:
+            images.insert(0, image)
+            windows = np.vstack([frame, windows])
+        
+        merger = IncrementalMerger()
+        if coarse is not None:
+            merger.add(coarse, frontier=0)
+        if images:
+            prediction.model_inputs += len(images)
+            self._detect_merging(images, windows, merger, thresholds, parallelism)
+        prediction.detections = merger.finish()
+        prediction.candidates = thresholds.candidates()
+        return prediction
+    
+    def _detect_as_completed(
+        self,
+        images: List[np.ndarray],
+        conf_thresh: float,
+        nms_thresh: float,
+        parallelism: Optional[int] = None
+    ) -> Iterator[Tuple[int, List[Detections]]]:
+        """Run detection, yielding (first index, detections) per completed chunk."""
+        detect = getattr(self.detector, "detect_as_completed", None)
+        if detect is None:
+            # A single detector splits the batch into as few runs as its
+            # batch size allows
+            yield 0, self.detector.detect_batch(images, conf_thresh, nms_thresh)
+            return
+        yield from detect(images, conf_thresh, nms_thresh, parallelism=parallelism)
+    
+    def _detect_merging(
+        self,
+        images: List[np.ndarray],
+        windows: np.ndarray,
+        merger: IncrementalMerger,
+        thresholds: _Thresholds,
+        parallelism: Optional[int] = None
+    ) -> None:
+        """Detect on the images cut from windows, merging chunks as they complete."""
+        tops = windows[:, 1].astype(np.float64)
+        outstanding = np.ones(len(images), dtype=bool)
+        for start, chunk in self._detect_as_completed(images, *thresholds.detect(), parallelism):
+            end = start + len(chunk)
+            outstanding[start:end] = False
+            # Nothing above the top of the slices still running can change
+            frontier = tops[outstanding].min() if outstanding.any() else np.inf
+            merger.add(thresholds.collect(chunk, windows[start:end]), frontier)
+    
+    def predict_source(
+        self,
+        source: ImageSource,
+        mode: Optional[str] = None,
+        conf_thresh: Optional[float] = None,
+        nms_thresh: Optional[float] = None,
+        keep_candidates: bool = False
+    ) -> SlicedPrediction:
+        """Run sliced inference on an image source, streaming it unless it is in memory.
+        
+        Args:
+            source: Image source from tiling.open_image_source
+            mode: Slicing mode, defaults to the slice configuration
+            conf_thresh: Confidence threshold (defaults to the detector's)
+            nms_thresh: NMS threshold (defaults to the detector's)
+            keep_candidates: Also return the pre-threshold candidates
+            
+        Returns:
+            Merged detections in image coordinates with the slice plan
+        """
+        if isinstance(source, ArraySource):
+            return self.predict_sliced(
+                source.image,
+                mode,
+                conf_thresh=conf_thresh,
+                nms_thresh=nms_thresh,
+                keep_candidates=keep_candidates
+            )
+        return self.predict_stream(
+            source,
+            mode,
+            conf_thresh=conf_thresh,
+            nms_thresh=nms_thresh,
+            keep_candidates=keep_candidates
         )
+    
+    def predict_stream(
+        self,
+        source: ImageSource,
+        mode: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        conf_thresh: Optional[float] = None,
+        nms_thresh: Optional[float] = None,
+        keep_candidates: bool = False
+    ) -> SlicedPrediction:
+        """Run sliced inference reading the image slice by slice.
+        
+        Only chunk_size slices are in memory at a time, and detections are
+        merged as slice rows complete (see merge.IncrementalMerger), so
+        memory stays bounded however large the image is. Full frame and
+        coarse passes run on an overview downscaled while reading.
         
-        # Convert to annotations
+        Args:
+            source: Image source
+            mode: Slicing mode, defaults to the slice configuration
+            chunk_size: Slices read and detected at a time (defaults to config)
+            conf_thresh: Confidence threshold (defaults to the detector's)
+            nms_thresh: NMS threshold (defaults to the detector's)
+            keep_candidates: Also return the pre-threshold candidates
+            
+        Returns:
+            Merged detections in image coordinates with the slice plan
+            
+        Raises:
+            DetectorError: If detection fails on any model input
+        """
+        mode = mode or self.slice_config.mode
+        thresholds = self._thresholds(conf_thresh, nms_thresh, keep_candidates)
+        chunk_size = chunk_size or config.STREAM_CHUNK_SLICES or config.MAX_BATCH_SIZE
+        plan = self.plan(source.shape)
+        full_frame = self.slice_config.full_frame and plan.sliced
+        prediction = SlicedPrediction(
+            Detections.empty(),
+            plan,
+            mode=mode,
+            exhaustive_model_inputs=len(plan.grid) + full_frame,
+            streamed=True
+        )
+        merger = IncrementalMerger()
+        run = np.ones(len(plan.grid), dtype=bool)
+        
+        # Whole-image passes see no more than the model input anyway
+        coarse_pass = mode == "coarse_to_fine" and plan.sliced
+        if coarse_pass or full_frame:
+            input_size = getattr(self.detector, "input_size", None) or config.INPUT_SIZE
+            overview, factor = source.overview(max(input_size))
+            pass_conf = self.slice_config.coarse_conf_thresh if coarse_pass else thresholds.conf
+            prediction.model_inputs += 1
+            found = self.detector.detect_batch([overview], *thresholds.detect(pass_conf))
+            found[0].boxes *= factor
+            frame = np.array(
+                [[0, 0, overview.shape[1] * factor, overview.shape[0] * factor]],
+                dtype=plan.grid.dtype
+            )
+            whole = thresholds.collect(found, frame, pass_conf)
+            if coarse_pass:
+                run &= select_slices(plan.grid, whole.boxes, self.slice_config)
+                whole = whole.select(whole.scores > thresholds.conf)
+            merger.add(whole, frontier=0)
+        
+        # Read, screen and detect slices a chunk at a time, in row order
+        indices = np.flatnonzero(run)
+        inferred = 0
+        for start in range(0, len(indices), chunk_size):
+            windows = plan.grid[indices[start:start + chunk_size]]
+            images = [source.read(window) for window in windows.tolist()]
+            if self.slice_config.skip_min_contrast > 0:
+                keep = screen_images(images, self.slice_config)
+                images = [image for image, kept in zip(images, keep) if kept]
+                windows = windows[keep]
+            
+            if images:
+                prediction.model_inputs += len(images)
+                inferred += len(images)
+                slice_detections = self.detector.detect_batch(images, *thresholds.detect())
+                detections = thresholds.collect(slice_detections, windows)
+            else:
+                detections = Detections.empty()
+            del images
+            
+            # Slices to come start at or below the next one in row order
+            following = start + chunk_size
+            frontier = plan.grid[indices[following], 1] if following < len(indices) else np.inf
+            merger.add(detections, frontier)
+        
+        prediction.skipped_slices = len(plan.grid) - inferred
+        prediction.detections = merger.finish()
+        prediction.candidates = thresholds.candidates()
+        logger.debug(
+            f"Streamed {inferred} of {len(plan.grid)} slices, "
+            f"at most {merger.peak_pending} detections pending merge"
+        )
+        return prediction
+    
+    @staticmethod
+    def to_annotations(detections: Detections, image_id: str = "") -> List[Annotation]:
+        """Convert detections to annotations.
+        
+        Args:
+            detections: Detections in image coordinates
+            image_id: Image ID to set on the annotations (may be set by caller later)
+            
+        Returns:
+            List of annotations
+        """
         annotations = []
-        for pred in merged_predictions:
+        for box, score, class_id in zip(
+            detections.boxes.tolist(),
+            detections.scores.tolist(),
+            detections.class_ids.tolist()
+        ):
             bbox = BoundingBox(
-                x_min=pred.bbox[0],
-                y_min=pred.bbox[1],
-                x_max=pred.bbox[2],
-                y_max=pred.bbox[3]
+                x_min=box[0],
+                y_min=box[1],
+                x_max=box[2],
+                y_max=box[3]
             )
             annotation = Annotation(
                 id=str(uuid.uuid4()),
-                image_id="",  # Will be set by caller
-                class_id=pred.category.id,
-                class_name=pred.category.name,
-                confidence=pred.score,
+                image_id=image_id,
+                class_id=class_id,
+                class_name=config.get_class_name(class_id),
+                confidence=score,
                 bbox=bbox,
                 area=bbox.area
             )
             annotations.append(annotation)
             
-        return annotations
\ No newline at end of file
+        return annotations
@@ -0,0 +1,193 @@
+# app/pipeline/session.py
+"""
+ONNX Runtime session creation with tuned options and an on-disk cache of
+optimized models.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import platform
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+import onnxruntime
+
+from ..core.utils import get_file_hash
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+EXECUTION_MODES = {
+    "sequential": onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": onnxruntime.ExecutionMode.ORT_PARALLEL,
+}
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+class SessionError(Exception):
+    """Custom exception for inference session errors."""
+    pass
+
+
+def resolve_session_settings(**overrides: Any) -> Dict[str, Any]:
+    """
+    Get session settings from config, with optional per-session overrides.
+
+    Args:
+        **overrides: Any of providers, intra_op_num_threads,
+            inter_op_num_threads, execution_mode, graph_optimization_level,
+            enable_mem_arena, enable_mem_pattern (None values are ignored)
+
+    Returns:
+        Dict of resolved session settings
+    """
+    settings = {
+        "providers": list(config.EXECUTION_PROVIDERS),
+        "intra_op_num_threads": config.INTRA_OP_NUM_THREADS,
+        "inter_op_num_threads": config.INTER_OP_NUM_THREADS,
+        "execution_mode": config.EXECUTION_MODE.lower(),
+        "graph_optimization_level": config.GRAPH_OPTIMIZATION_LEVEL.lower(),
+        "enable_mem_arena": config.ENABLE_MEM_ARENA,
+        "enable_mem_pattern": config.ENABLE_MEM_PATTERN,
+    }
+    unknown = set(overrides) - set(settings)
+    if unknown:
+        raise SessionError(f"Unknown session settings: {sorted(unknown)}")
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+
+    if settings["execution_mode"] not in EXECUTION_MODES:
+        raise SessionError(f"Unknown execution mode: {settings['execution_mode']}")
+    if settings["graph_optimization_level"] not in GRAPH_OPTIMIZATION_LEVELS:
+        raise SessionError(
+            f"Unknown graph optimization level: {settings['graph_optimization_level']}"
+        )
+
+    # Only request providers this build of ONNX Runtime actually has
+    available = set(onnxruntime.get_available_providers())
+    providers = [p for p in settings["providers"] if p in available]
+    if not providers:
+        logger.warning(
+            f"None of {settings['providers']} available, falling back to CPUExecutionProvider"
+        )
+        providers = ["CPUExecutionProvider"]
+    settings["providers"] = providers
+
+    return settings
+
+
+def build_session_options(settings: Dict[str, Any]) -> onnxruntime.SessionOptions:
+    """Build SessionOptions from resolved session settings."""
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = settings["intra_op_num_threads"]
+    options.inter_op_num_threads = settings["inter_op_num_threads"]
+    options.execution_mode = EXECUTION_MODES[settings["execution_mode"]]
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[settings["graph_optimization_level"]]
+    options.enable_cpu_mem_arena = settings["enable_mem_arena"]
+    options.enable_mem_pattern = settings["enable_mem_pattern"]
+    return options
+
+
+def get_cache_path(model_path: Path, settings: Dict[str, Any]) -> Path:
+    """
+    Get the optimized model cache path for a model and session settings.
+
+    The key covers the model content and everything that changes the
+    optimized graph: optimization level, providers, ONNX Runtime version
+    and CPU architecture.
+    """
+    key_data = json.dumps({
+        "model": get_file_hash(model_path),
+        "graph_optimization_level": settings["graph_optimization_level"],
+        "providers": settings["providers"],
+        "onnxruntime": onnxruntime.__version__,
+        "machine": platform.machine(),
+    }, sort_keys=True)
+    key = hashlib.sha256(key_data.encode()).hexdigest()[:16]
+    return Path(config.OPTIMIZED_MODEL_CACHE_DIR) / f"{model_path.stem}.{key}.onnx"
+
+
+def create_session(
+    model_path: Union[str, Path],
+    use_cache: Optional[bool] = None,
+    **overrides: Any
+) -> Tuple[onnxruntime.InferenceSession, Dict[str, Any]]:
+    """
+    Create an inference session, reusing a cached optimized model if present.
+
+    Args:
+        model_path: Path to ONNX model file
+        use_cache: Use the optimized model cache (defaults to config)
+        **overrides: Per-session overrides of config settings (see
+            resolve_session_settings)
+
+    Returns:
+        Tuple of (session, session info with settings, load time and cache use)
+    """
+    model_path = Path(model_path)
+    settings = resolve_session_settings(**overrides)
+    options = build_session_options(settings)
+    use_cache = config.OPTIMIZED_MODEL_CACHE if use_cache is None else use_cache
+    cache_hit = False
+    source_path = model_path
+    pending_cache_path = None
+
+    if use_cache and settings["graph_optimization_level"] != "disable":
+        try:
+            cache_path = get_cache_path(model_path, settings)
+            if cache_path.exists():
+                # Already optimized with the same settings
+                source_path = cache_path
+                options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS["disable"]
+                cache_hit = True
+            else:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                # Write to a private file first so concurrent processes
+                # never load a partially written cache entry
+                pending_cache_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+                options.optimized_model_filepath = str(pending_cache_path)
+        except OSError as e:
+            logger.warning(f"Optimized model cache unavailable: {str(e)}")
+            cache_path = None
+
+    start_time = time.perf_counter()
+    try:
+        session = onnxruntime.InferenceSession(
+            str(source_path),
+            sess_options=options,
+            providers=settings["providers"]
+        )
+    except Exception as e:
+        if pending_cache_path is not None:
+            # ONNX Runtime may have started writing the optimized model
+            pending_cache_path.unlink(missing_ok=True)
+        if cache_hit:
+            logger.warning(f"Failed to load cached model {source_path}, rebuilding: {str(e)}")
+            source_path.unlink(missing_ok=True)
+            return create_session(model_path, use_cache=use_cache, **overrides)
+        raise SessionError(f"Failed to create session: {str(e)}")
+    load_time = time.perf_counter() - start_time
+
+    if pending_cache_path is not None and pending_cache_path.exists():
+        try:
+            os.replace(pending_cache_path, cache_path)
+            logger.info(f"Cached optimized model at {cache_path}")
+        except OSError as e:
+            logger.warning(f"Failed to store optimized model cache: {str(e)}")
+            pending_cache_path.unlink(missing_ok=True)
+
+    info = {
+        **settings,
+        "source_path": str(source_path),
+        "cache_hit": cache_hit,
+        "session_load_time": load_time,
+    }
+    return session, info
@@ -0,0 +1,369 @@
+# app/pipeline/slicing.py
+"""
+Image slicing for sliced (SAHI) inference.
+
+Slices are NumPy views into the original image, so slicing allocates and
+copies nothing however large the image or the overlap. The grid follows
+SAHI's layout: row-major windows stepping by slice size minus overlap, with
+the last row and column shifted back to end at the image border.
+
+With auto slice resolution the slice size comes from the image and the
+smallest object of interest instead of being fixed: images that fit the
+model input are not sliced, and otherwise slices are as large as possible
+while that object stays detectable after the slice is downscaled to the
+model input.
+
+Slices can also be screened before inference: a slice whose downscaled
+thumbnail is flat (no local contrast anywhere, e.g. open water, sky or a
+studio backdrop) cannot contain an object and is skipped.
+
+In coarse-to-fine mode a pass over the whole downscaled image comes first,
+and only slices around its candidates (plus a sparse sample of the rest)
+run at full resolution.
+"""
+
+import math
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .config import config
+
+SLICING_MODES = ("exhaustive", "coarse_to_fine")
+
+
+@dataclass
+class SliceConfig:
+    """Configuration for image slicing."""
+    slice_height: int = 512
+    slice_width: int = 512
+    overlap_height_ratio: float = 0.2
+    overlap_width_ratio: float = 0.2
+    full_frame: bool = False  # Also detect on the whole (downscaled) image
+    auto_slice_resolution: bool = False  # Derive slice size per image
+    min_object_size: int = 32  # Smallest object (px) auto slicing keeps detectable
+    skip_min_contrast: float = 0.0  # Skip flat slices (see screen_slices), 0 disables
+    mode: str = "exhaustive"  # One of SLICING_MODES
+    coarse_conf_thresh: float = 0.1  # Candidate threshold of the coarse pass
+    coarse_sample_ratio: float = 0.1  # Share of candidate-free slices still run
+
+    @classmethod
+    def from_config(cls) -> "SliceConfig":
+        """Create slice configuration from the pipeline config."""
+        return cls(
+            slice_height=config.SLICE_HEIGHT,
+            slice_width=config.SLICE_WIDTH,
+            overlap_height_ratio=config.OVERLAP_HEIGHT_RATIO,
+            overlap_width_ratio=config.OVERLAP_WIDTH_RATIO,
+            full_frame=config.FULL_FRAME_PASS,
+            auto_slice_resolution=config.AUTO_SLICE_RESOLUTION,
+            min_object_size=config.MIN_OBJECT_SIZE,
+            skip_min_contrast=config.SLICE_SKIP_MIN_CONTRAST,
+            mode=config.SLICING_MODE,
+            coarse_conf_thresh=config.COARSE_CONF_THRESH,
+            coarse_sample_ratio=config.COARSE_SAMPLE_RATIO
+        )
+
+
+@dataclass
+class SlicePlan:
+    """Slice grid chosen for one image."""
+    grid: np.ndarray  # (N, 4) int [x_min, y_min, x_max, y_max]
+    slice_height: int
+    slice_width: int
+    overlap_height_ratio: float
+    overlap_width_ratio: float
+
+    @property
+    def rows(self) -> int:
+        return int(np.unique(self.grid[:, 1]).size)
+
+    @property
+    def cols(self) -> int:
+        return int(np.unique(self.grid[:, 0]).size)
+
+    @property
+    def sliced(self) -> bool:
+        return len(self.grid) > 1
+
+    def to_dict(self) -> Dict:
+        """Serialize the plan without the window coordinates."""
+        return {
+            "sliced": self.sliced,
+            "rows": self.rows,
+            "cols": self.cols,
+            "slices": len(self.grid),
+            "slice_height": self.slice_height,
+            "slice_width": self.slice_width,
+            "overlap_height_ratio": round(self.overlap_height_ratio, 4),
+            "overlap_width_ratio": round(self.overlap_width_ratio, 4)
+        }
+
+
+def get_axis_starts(length: int, size: int, overlap_ratio: float) -> np.ndarray:
+    """
+    Get window start positions along one image axis.
+
+    Args:
+        length: Image extent along the axis
+        size: Window extent along the axis
+        overlap_ratio: Fraction of the window shared with the next one
+
+    Returns:
+        Sorted array of start positions
+    """
+    if length <= size:
+        return np.zeros(1, dtype=np.int64)
+    step = max(size - int(overlap_ratio * size), 1)
+    count = -(-(length - size) // step) + 1  # ceil division
+    starts = np.arange(count, dtype=np.int64) * step
+    # The last window ends exactly at the border instead of running past it
+    return np.minimum(starts, length - size)
+
+
+def get_slice_grid(
+    height: int,
+    width: int,
+    slice_height: int,
+    slice_width: int,
+    overlap_height_ratio: float,
+    overlap_width_ratio: float
+) -> np.ndarray:
+    """
+    Get the slice windows covering an image.
+
+    Returns:
+        (N, 4) int array of [x_min, y_min, x_max, y_max] windows, row-major
+    """
+    y_starts = get_axis_starts(height, slice_height, overlap_height_ratio)
+    x_starts = get_axis_starts(width, slice_width, overlap_width_ratio)
+    y_min, x_min = np.meshgrid(y_starts, x_starts, indexing="ij")
+    x_min = x_min.ravel()
+    y_min = y_min.ravel()
+    return np.stack([
+        x_min,
+        y_min,
+        np.minimum(x_min + slice_width, width),
+        np.minimum(y_min + slice_height, height)
+    ], axis=1)
+
+
+def slice_views(image: np.ndarray, grid: np.ndarray) -> List[np.ndarray]:
+    """Get a view of the image for each [x_min, y_min, x_max, y_max] window."""
+    return [image[y_min:y_max, x_min:x_max] for x_min, y_min, x_max, y_max in grid.tolist()]
+
+
+def iter_slices(
+    image: np.ndarray,
+    slice_height: int,
+    slice_width: int,
+    overlap_height_ratio: float,
+    overlap_width_ratio: float
+) -> Iterator[Tuple[np.ndarray, Tuple[int, int]]]:
+    """
+    Yield the slices of an image.
+
+    Yields:
+        Tuples of (view into the image, (x_offset, y_offset))
+    """
+    grid = get_slice_grid(
+        image.shape[0],
+        image.shape[1],
+        slice_height,
+        slice_width,
+        overlap_height_ratio,
+        overlap_width_ratio
+    )
+    for x_min, y_min, x_max, y_max in grid.tolist():
+        yield image[y_min:y_max, x_min:x_max], (x_min, y_min)
+
+
+def _fit_axis(length: int, max_size: int, overlap_ratio: float) -> Tuple[int, float]:
+    """
+    Get the smallest number of windows of at most max_size covering an axis,
+    and size them to tile it evenly.
+
+    Returns:
+        Tuple of (window size, overlap ratio); one full-length window if the
+        axis fits
+    """
+    if length <= max_size:
+        return length, 0.0
+    # n windows of size s overlapping by ratio r cover s * (n - (n - 1) * r)
+    count = math.ceil((length / max_size - overlap_ratio) / (1 - overlap_ratio))
+    size = math.ceil(length / (count - (count - 1) * overlap_ratio))
+    return min(size, max_size), overlap_ratio
+
+
+def plan_slices(
+    height: int,
+    width: int,
+    slice_config: SliceConfig,
+    input_size: Optional[Tuple[int, int]] = None
+) -> SlicePlan:
+    """
+    Choose the slice grid for an image.
+
+    Without auto slice resolution this is the fixed grid of slice_config.
+    With it:
+    - images no larger than the model input are not sliced
+    - otherwise slices are the largest that still downscale the smallest
+      object of interest to at least twice the finest model stride, tiled
+      evenly over the image; images within that size are not sliced either
+    - overlap is at least the configured ratio and at least the smallest
+      object size, so such objects lie whole in some slice
+
+    Args:
+        height: Image height
+        width: Image width
+        slice_config: Slicing configuration
+        input_size: Model input size (width, height), defaults to config
+
+    Returns:
+        Slice plan for the image
+    """
+    if not slice_config.auto_slice_resolution:
+        slice_height = slice_config.slice_height
+        slice_width = slice_config.slice_width
+        overlap_height = slice_config.overlap_height_ratio
+        overlap_width = slice_config.overlap_width_ratio
+    else:
+        input_width, input_height = input_size or config.INPUT_SIZE
+        # Objects this small after downscaling still reach the finest head
+        detectable_size = 2 * min(config.STRIDES)
+        scale = slice_config.min_object_size / detectable_size
+        max_width = max(int(input_width * scale), 64)
+        max_height = max(int(input_height * scale), 64)
+
+        if (height <= input_height and width <= input_width) or (
+            height <= max_height and width <= max_width
+        ):
+            slice_height, slice_width = height, width
+            overlap_height = overlap_width = 0.0
+        else:
+            overlap_height = min(
+                max(slice_config.overlap_height_ratio, slice_config.min_object_size / max_height), 0.5
+            )
+            overlap_width = min(
+                max(slice_config.overlap_width_ratio, slice_config.min_object_size / max_width), 0.5
+            )
+            slice_height, overlap_height = _fit_axis(height, max_height, overlap_height)
+            slice_width, overlap_width = _fit_axis(width, max_width, overlap_width)
+
+    return SlicePlan(
+        grid=get_slice_grid(
+            height, width, slice_height, slice_width, overlap_height, overlap_width
+        ),
+        slice_height=slice_height,
+        slice_width=slice_width,
+        overlap_height_ratio=overlap_height,
+        overlap_width_ratio=overlap_width
+    )
+
+
+def slice_contrast(image: np.ndarray, grid: np.ndarray, min_object_size: int = 32) -> np.ndarray:
+    """
+    Get the strongest local contrast inside each slice window.
+
+    The image is area-downscaled so that an object of min_object_size still
+    covers a few pixels; this averages away sensor noise and JPEG artifacts
+    but keeps the edges of anything worth detecting. Contrast is the largest
+    difference between neighbouring thumbnail pixels in any channel, so
+    smooth illumination gradients do not count either.
+
+    Args:
+        image: Image as (H, W) or (H, W, C) uint8 array
+        grid: (N, 4) [x_min, y_min, x_max, y_max] slice windows
+        min_object_size: Smallest object of interest in image pixels
+
+    Returns:
+        (N,) contrast per slice on the 0-255 scale
+    """
+    height, width = image.shape[:2]
+    factor = max(min_object_size // 4, 1)
+    thumbnail = cv2.resize(
+        image,
+        (max(width // factor, 1), max(height // factor, 1)),
+        interpolation=cv2.INTER_AREA
+    )
+    channels = 1 if thumbnail.ndim == 2 else thumbnail.shape[2]
+
+    # Neighbour differences per channel; with the channels left interleaved
+    # in each row, the max over a window is also the max over channels
+    edges = np.zeros_like(thumbnail)
+    np.maximum(edges[:, 1:], cv2.absdiff(thumbnail[:, 1:], thumbnail[:, :-1]), out=edges[:, 1:])
+    np.maximum(edges[1:], cv2.absdiff(thumbnail[1:], thumbnail[:-1]), out=edges[1:])
+    edges = edges.reshape(edges.shape[0], -1)
+
+    # Windows in thumbnail pixels, widened to whole pixels
+    scale_y = thumbnail.shape[0] / height
+    scale_x = thumbnail.shape[1] / width
+    contrast = np.zeros(len(grid), dtype=np.float32)
+    for index, (x_min, y_min, x_max, y_max) in enumerate(grid.tolist()):
+        top, left = int(y_min * scale_y), int(x_min * scale_x)
+        bottom = max(math.ceil(y_max * scale_y), top + 1)
+        right = max(math.ceil(x_max * scale_x), left + 1)
+        contrast[index] = edges[top:bottom, left * channels:right * channels].max()
+    return contrast
+
+
+def screen_slices(image: np.ndarray, grid: np.ndarray, slice_config: SliceConfig) -> np.ndarray:
+    """
+    Decide which slices to run inference on.
+
+    Args:
+        image: Image the grid was planned for
+        grid: (N, 4) slice windows
+        slice_config: Slicing configuration; skip_min_contrast is the
+            sensitivity, higher values skip more slices
+
+    Returns:
+        (N,) boolean mask of slices to run
+    """
+    if slice_config.skip_min_contrast <= 0:
+        return np.ones(len(grid), dtype=bool)
+    contrast = slice_contrast(image, grid, slice_config.min_object_size)
+    return contrast >= slice_config.skip_min_contrast
+
+
+def screen_images(images: List[np.ndarray], slice_config: SliceConfig) -> np.ndarray:
+    """Decide which of the given slice images to run inference on, see screen_slices()."""
+    return np.array([
+        screen_slices(image, np.array([[0, 0, image.shape[1], image.shape[0]]]), slice_config)[0]
+        for image in images
+    ], dtype=bool)
+
+
+def select_slices(grid: np.ndarray, boxes: np.ndarray, slice_config: SliceConfig) -> np.ndarray:
+    """
+    Choose the slices of the fine pass in coarse-to-fine inference.
+
+    Slices overlapping a coarse candidate, grown by the smallest object size
+    to catch neighbours, run. Of the other slices an evenly spread
+    coarse_sample_ratio share runs as well, so objects the coarse pass
+    missed entirely still have a chance.
+
+    Args:
+        grid: (N, 4) slice windows
+        boxes: (M, 4) candidate boxes of the coarse pass in image coordinates
+        slice_config: Slicing configuration
+
+    Returns:
+        (N,) boolean mask of slices to run
+    """
+    margin = slice_config.min_object_size
+    grown = boxes + np.array([-margin, -margin, margin, margin], dtype=boxes.dtype)
+    selected = (
+        (grid[:, None, 0] < grown[None, :, 2])
+        & (grid[:, None, 2] > grown[None, :, 0])
+        & (grid[:, None, 1] < grown[None, :, 3])
+        & (grid[:, None, 3] > grown[None, :, 1])
+    ).any(axis=1)
+
+    rest = np.flatnonzero(~selected)
+    if slice_config.coarse_sample_ratio > 0 and rest.size:
+        step = max(round(1 / slice_config.coarse_sample_ratio), 1)
+        selected[rest[step // 2::step]] = True
+    return selected
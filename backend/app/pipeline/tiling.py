@@ -0,0 +1,431 @@
+# app/pipeline/tiling.py
+"""
+Image sources for streaming sliced inference.
+
+Images up to STREAMING_MIN_PIXELS are decoded into memory as before.
+Larger images (orthomosaics and the like) are never held in memory whole;
+slices are read from an image source one window at a time:
+
+- uncompressed rasters (plain TIFF, tiled or striped, BMP, PPM) are read
+  straight from the file through a memory map
+- everything else is decoded once into a raw tile cache on disk and read
+  from there, so the decode is paid once per image rather than per request
+  and worker
+
+The tile cache is written a band of rows at a time. Compressed TIFFs are
+decoded strip by strip (or tile row by tile row), so memory stays bounded
+however large they are; single compressed streams (PNG, JPEG, WebP) cannot
+be decoded in parts and are decoded whole.
+
+Windows are returned in BGR channel order like cv2.imread.
+"""
+
+import hashlib
+import io
+import itertools
+import logging
+import math
+import os
+import struct
+import tempfile
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image, TiffImagePlugin, TiffTags
+
+from app.core.config import settings
+from .config import config
+
+logger = logging.getLogger(__name__)
+
+if settings.MAX_IMAGE_DIMENSION ** 2 <= config.STREAMING_MIN_PIXELS:
+    logger.warning(
+        f"MAX_IMAGE_DIMENSION {settings.MAX_IMAGE_DIMENSION} refuses every image larger than "
+        f"MODELSHIP_STREAMING_MIN_PIXELS ({config.STREAMING_MIN_PIXELS}), so none will be streamed"
+    )
+
+# Raw modes readable straight from the file, with their channel counts
+RAW_MODES = {"L": 1, "RGB": 3, "RGBA": 4, "BGR": 3, "BGRX": 4, "BGRA": 4}
+
+# OpenCV conversion of each raw mode to BGR (None when it already is)
+RAW_TO_BGR = {
+    "L": cv2.COLOR_GRAY2BGR,
+    "RGB": cv2.COLOR_RGB2BGR,
+    "RGBA": cv2.COLOR_RGBA2BGR,
+    "BGR": None,
+    "BGRX": cv2.COLOR_BGRA2BGR,
+    "BGRA": cv2.COLOR_BGRA2BGR
+}
+
+# 8-bit TIFF modes decoded band by band
+TIFF_BAND_MODES = ("L", "P", "RGB", "RGBA", "CMYK", "YCbCr")
+
+# TIFF tags pointing elsewhere in the file (sub-IFDs), left out of band files
+TIFF_POINTER_TAGS = (330, 34665, 34853, 40965)
+
+# Rows read, downscaled or decoded at a time take about this many bytes
+BAND_BYTES = 32 << 20
+
+Window = Tuple[int, int, int, int]  # x_min, y_min, x_max, y_max
+
+
+class TilingError(Exception):
+    """Custom exception for image source errors."""
+    pass
+
+
+class ImageSource:
+    """Random access to the pixels of one image."""
+
+    shape: Tuple[int, int, int] = (0, 0, 3)
+    streamed = True
+
+    def read(self, window: Window) -> np.ndarray:
+        """Read a [x_min, y_min, x_max, y_max] window as a BGR array."""
+        raise NotImplementedError
+
+    def overview(self, max_side: int) -> Tuple[np.ndarray, int]:
+        """
+        Get the image downscaled to at most max_side, reading it in bands.
+
+        Returns:
+            Tuple of (downscaled BGR image, integer downscale factor)
+        """
+        height, width = self.shape[:2]
+        factor = max(math.ceil(max(height, width) / max_side), 1)
+        if factor == 1:
+            return np.ascontiguousarray(self.read((0, 0, width, height))), 1
+
+        out_width, out_height = max(width // factor, 1), max(height // factor, 1)
+        # Bands of whole factor-row groups
+        band_rows = factor * max(BAND_BYTES // (width * self.shape[2] * factor), 1)
+        bands = []
+        for top in range(0, out_height * factor, band_rows):
+            bottom = min(top + band_rows, out_height * factor)
+            band = self.read((0, top, out_width * factor, bottom))
+            bands.append(cv2.resize(
+                band,
+                (out_width, (bottom - top) // factor),
+                interpolation=cv2.INTER_AREA
+            ))
+        return np.concatenate(bands), factor
+
+    def close(self) -> None:
+        """Release the source."""
+
+    def __enter__(self) -> "ImageSource":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ArraySource(ImageSource):
+    """Image decoded into memory."""
+
+    streamed = False
+
+    def __init__(self, image: np.ndarray):
+        self.image = image
+        self.shape = image.shape if image.ndim == 3 else (*image.shape, 1)
+
+    def read(self, window: Window) -> np.ndarray:
+        x_min, y_min, x_max, y_max = window
+        return self.image[y_min:y_max, x_min:x_max]
+
+
+class RawFileSource(ImageSource):
+    """Uncompressed raster read straight from the file."""
+
+    def __init__(self, path: Path, size: Tuple[int, int], tiles: List, rawmode: str):
+        """
+        Initialize from the raw tiles PIL found in the file.
+
+        Args:
+            path: Image file
+            size: Image (width, height)
+            tiles: (extents, offset, stride, orientation) per tile
+            rawmode: Pixel layout, one of RAW_MODES
+        """
+        self.path = path
+        self.rawmode = rawmode
+        self.channels = RAW_MODES[rawmode]
+        self.shape = (size[1], size[0], 3)
+        self.tiles = tiles
+        self._buffer = np.memmap(path, dtype=np.uint8, mode="r")
+
+    @classmethod
+    def from_image(cls, path: Path, image: Image.Image) -> Optional["RawFileSource"]:
+        """Create a source if PIL reads the image as raw tiles in a supported layout."""
+        if not image.tile or getattr(image, "n_frames", 1) != 1:
+            return None
+        tiles = []
+        rawmode = None
+        for tile in image.tile:
+            codec, extents, offset, args = tile[:4]
+            if isinstance(args, str):
+                args = (args, 0, 1)
+            if codec != "raw" or args[0] not in RAW_MODES or (rawmode and args[0] != rawmode):
+                return None
+            rawmode = args[0]
+            stride = args[1] if len(args) > 1 and args[1] else 0
+            orientation = args[2] if len(args) > 2 else 1
+            tiles.append((extents, offset, stride, orientation))
+        return cls(path, image.size, tiles, rawmode)
+
+    def _tile_pixels(self, extents: Window, offset: int, stride: int, orientation: int) -> np.ndarray:
+        """View of one tile's pixels in the memory-mapped file."""
+        tile_width, tile_height = extents[2] - extents[0], extents[3] - extents[1]
+        stride = stride or tile_width * self.channels
+        rows = self._buffer[offset:offset + stride * tile_height].reshape(tile_height, stride)
+        pixels = rows[:, :tile_width * self.channels].reshape(tile_height, tile_width, self.channels)
+        return pixels[::-1] if orientation < 0 else pixels
+
+    def read(self, window: Window) -> np.ndarray:
+        x_min, y_min, x_max, y_max = window
+        out = np.empty((y_max - y_min, x_max - x_min, self.channels), dtype=np.uint8)
+        for extents, offset, stride, orientation in self.tiles:
+            left, top = max(x_min, extents[0]), max(y_min, extents[1])
+            right, bottom = min(x_max, extents[2]), min(y_max, extents[3])
+            if left >= right or top >= bottom:
+                continue
+            pixels = self._tile_pixels(extents, offset, stride, orientation)
+            out[top - y_min:bottom - y_min, left - x_min:right - x_min] = pixels[
+                top - extents[1]:bottom - extents[1],
+                left - extents[0]:right - extents[0]
+            ]
+        conversion = RAW_TO_BGR[self.rawmode]
+        return out if conversion is None else cv2.cvtColor(out, conversion)
+
+    def close(self) -> None:
+        self._buffer = None
+
+
+class TiffBands:
+    """
+    Compressed TIFF decoded a band of rows at a time.
+
+    Each band's strips (or row of tiles) are copied into a small TIFF of
+    their own with the original's tags, which PIL decodes like the whole
+    file, so every compression libtiff reads is supported.
+    """
+
+    def __init__(self, path: Path, image: TiffImagePlugin.TiffImageFile):
+        """
+        Initialize from the TIFF's tags.
+
+        Args:
+            path: Image file
+            image: The file opened with PIL
+        """
+        tags = image.tag_v2
+        self.path = path
+        self.width, self.height = image.size
+        if TiffImagePlugin.TILEOFFSETS in tags:
+            self.offsets_tag, self.counts_tag = TiffImagePlugin.TILEOFFSETS, 325
+            self.chunk_width, self.chunk_rows = tags[322], tags[323]
+        else:
+            self.offsets_tag, self.counts_tag = TiffImagePlugin.STRIPOFFSETS, TiffImagePlugin.STRIPBYTECOUNTS
+            self.chunk_width, self.chunk_rows = self.width, tags.get(TiffImagePlugin.ROWSPERSTRIP, self.height)
+        self.offsets = tuple(tags[self.offsets_tag])
+        self.counts = tuple(tags[self.counts_tag])
+        self.across = math.ceil(self.width / self.chunk_width)
+
+        # Tags of every band file; image length and chunk positions vary
+        little_endian = tags.prefix == b"II"
+        self.header = tags.prefix + (b"\x2a\x00" if little_endian else b"\x00\x2a")
+        self.header += struct.pack("<L" if little_endian else ">L", 8)  # IFD right after the header
+        self.tags = TiffImagePlugin.ImageFileDirectory_v2(ifh=self.header)
+        skipped = (self.offsets_tag, self.counts_tag, *TIFF_POINTER_TAGS)
+        for tag, value in tags.items():
+            if tag not in skipped:
+                self.tags.tagtype[tag] = tags.tagtype[tag]
+                self.tags[tag] = value
+        self.tags.tagtype[self.offsets_tag] = self.tags.tagtype[self.counts_tag] = TiffTags.LONG
+
+    @classmethod
+    def from_image(cls, path: Path, image: Image.Image) -> Optional["TiffBands"]:
+        """Create band access if the image is an 8-bit TIFF stored in several strips or tiles."""
+        if (
+            image.format != "TIFF"
+            or getattr(image, "n_frames", 1) != 1
+            or image.mode not in TIFF_BAND_MODES
+            or image.tag_v2.get(284, 1) != 1  # Planes stored separately
+            or image.tag_v2.get(274, 1) != 1  # Rotated, which cv2.imread would undo
+        ):
+            return None
+        try:
+            bands = cls(path, image)
+            bands._band_file([b""] * bands.across, bands.chunk_rows)  # Tags must serialize
+        except (KeyError, TypeError, ValueError, struct.error) as e:
+            logger.debug(f"Decoding TIFF {path} whole: {e}")
+            return None
+        chunks = bands.across * math.ceil(bands.height / bands.chunk_rows)
+        if bands.chunk_rows >= bands.height or len(bands.offsets) != chunks or len(bands.counts) != chunks:
+            return None
+        return bands
+
+    def _band_file(self, chunks: List[bytes], rows: int) -> bytes:
+        """A TIFF holding only the given strips or tiles."""
+        self.tags[TiffImagePlugin.IMAGELENGTH] = rows
+        self.tags[self.counts_tag] = tuple(len(chunk) for chunk in chunks)
+        offsets = tuple(itertools.accumulate([0] + [len(chunk) for chunk in chunks[:-1]]))
+        if self.offsets_tag == TiffImagePlugin.STRIPOFFSETS:
+            # PIL moves strip offsets past the IFD itself when serializing
+            self.tags[self.offsets_tag] = offsets
+        else:
+            # Serialized length does not depend on the offsets themselves
+            self.tags[self.offsets_tag] = offsets
+            start = 8 + len(self.tags.tobytes(8))
+            self.tags[self.offsets_tag] = tuple(start + offset for offset in offsets)
+        return b"".join([self.header, self.tags.tobytes(8), *chunks])
+
+    def bands(self, band_bytes: int = BAND_BYTES) -> Iterator[np.ndarray]:
+        """Decode the image top to bottom, yielding BGR bands of whole strips or tile rows."""
+        band_rows = self.chunk_rows * max(band_bytes // (self.width * 3 * self.chunk_rows), 1)
+        with open(self.path, "rb") as f:
+            for top in range(0, self.height, band_rows):
+                bottom = min(top + band_rows, self.height)
+                first = top // self.chunk_rows * self.across
+                last = math.ceil(bottom / self.chunk_rows) * self.across
+                chunks = []
+                for offset, count in zip(self.offsets[first:last], self.counts[first:last]):
+                    f.seek(offset)
+                    chunks.append(f.read(count))
+                with Image.open(io.BytesIO(self._band_file(chunks, bottom - top))) as band:
+                    yield cv2.cvtColor(np.asarray(band.convert("RGB")), cv2.COLOR_RGB2BGR)
+
+
+class TileCacheSource(ImageSource):
+    """Image decoded once into a raw array cached on disk."""
+
+    def __init__(
+        self,
+        path: Path,
+        size: Tuple[int, int],
+        cache_dir: Optional[Path] = None,
+        max_bytes: Optional[int] = None
+    ):
+        """
+        Initialize the source. The image is decoded on first read, or not at
+        all if an earlier request already cached it.
+
+        Args:
+            path: Image file
+            size: Image (width, height)
+            cache_dir: Cache directory (defaults to config)
+            max_bytes: Cache size limit; least recently used images are
+                evicted beyond it (defaults to config)
+        """
+        self.path = path
+        self.shape = (size[1], size[0], 3)
+        self.cache_dir = Path(cache_dir or config.TILE_CACHE_DIR)
+        self.max_bytes = config.TILE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        stat = path.stat()
+        key = hashlib.sha1(f"{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+        self.cache_path = self.cache_dir / f"{key}.npy"
+        self._image: Optional[np.ndarray] = None
+
+    def _decode_bands(self) -> Iterator[np.ndarray]:
+        """Decode the image top to bottom, in bands where the format allows it."""
+        with Image.open(self.path) as image:
+            bands = TiffBands.from_image(self.path, image)
+        if bands is not None:
+            yield from bands.bands()
+            return
+        logger.info(f"Decoding image {self.path.name} whole, its format cannot be decoded in bands")
+        image = cv2.imread(str(self.path), cv2.IMREAD_COLOR)
+        if image is None:
+            raise TilingError(f"Failed to decode image {self.path}")
+        yield image
+
+    def _build(self) -> None:
+        """Decode the image once and write it to the cache a band at a time."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Write under a temporary name so concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                # Same .npy header np.save writes for the whole array
+                np.lib.format.write_array_header_1_0(
+                    tmp_file,
+                    {"descr": "|u1", "fortran_order": False, "shape": self.shape}
+                )
+                rows = 0
+                for band in self._decode_bands():
+                    if band.shape[1:] != self.shape[1:] or rows + len(band) > self.shape[0]:
+                        raise TilingError(f"Decoded image {self.path} does not match its header size")
+                    tmp_file.write(np.ascontiguousarray(band).data)
+                    rows += len(band)
+                if rows != self.shape[0]:
+                    raise TilingError(f"Decoded image {self.path} does not match its header size")
+            os.replace(tmp_path, self.cache_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        logger.info(f"Cached decoded image {self.path.name} ({np.prod(self.shape) / 1024 / 1024:.0f} MB)")
+        self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used cache entries beyond the size limit."""
+        if self.max_bytes <= 0:
+            return
+        entries = sorted(self.cache_dir.glob("*.npy"), key=lambda entry: entry.stat().st_mtime, reverse=True)
+        total = 0
+        for entry in entries:
+            total += entry.stat().st_size
+            if total > self.max_bytes and entry != self.cache_path:
+                entry.unlink(missing_ok=True)
+
+    @property
+    def image(self) -> np.ndarray:
+        if self._image is None:
+            if not self.cache_path.exists():
+                self._build()
+            else:
+                os.utime(self.cache_path)  # Mark as recently used
+            self._image = np.load(self.cache_path, mmap_mode="r")
+        return self._image
+
+    def read(self, window: Window) -> np.ndarray:
+        x_min, y_min, x_max, y_max = window
+        return self.image[y_min:y_max, x_min:x_max]
+
+    def close(self) -> None:
+        self._image = None
+
+
+def open_image_source(path: Union[str, Path], streaming_min_pixels: Optional[int] = None) -> ImageSource:
+    """
+    Open an image for sliced inference.
+
+    Args:
+        path: Image file
+        streaming_min_pixels: Images with more pixels are streamed instead
+            of decoded into memory (defaults to config)
+
+    Returns:
+        Image source; an ArraySource unless the image is streamed
+
+    Raises:
+        TilingError: If the image cannot be read
+    """
+    path = Path(path)
+    if streaming_min_pixels is None:
+        streaming_min_pixels = config.STREAMING_MIN_PIXELS
+
+    try:
+        with Image.open(path) as image:  # Reads the header only
+            width, height = image.size
+            if width * height > streaming_min_pixels:
+                source = RawFileSource.from_image(path, image)
+                return source or TileCacheSource(path, image.size)
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.debug(f"PIL could not open {path}, decoding with OpenCV: {e}")
+
+    image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+    if image is None:
+        raise TilingError(f"Failed to read image {path}")
+    return ArraySource(image)
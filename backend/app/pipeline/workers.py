@@ -0,0 +1,355 @@
+# app/pipeline/workers.py
+"""
+Out-of-process inference workers.
+
+Inference runs in a pool of worker processes so the API process stays
+responsive and a crash in native code only takes down a worker. Decoded
+images are handed over through shared memory instead of being pickled,
+and detections come back as compact arrays.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from .config import config
+from .detector import YOLOXDetector, DetectorError
+from .pool import resolve_pool_size
+from .sahi_wrapper import SAHIWrapper, SlicedPrediction, SliceConfig
+from .tiling import open_image_source
+
+logger = logging.getLogger(__name__)
+
+# Predictor owned by each worker process
+_worker_predictor: Optional[SAHIWrapper] = None
+
+
+def _init_worker(model_path: str, input_size: Tuple[int, int], threads: int) -> None:
+    """Load the model once per worker process."""
+    global _worker_predictor
+    detector = YOLOXDetector(
+        model_path=model_path,
+        conf_thresh=config.CONF_THRESH,
+        nms_thresh=config.NMS_THRESH,
+        input_size=input_size,
+        session_overrides={
+            "intra_op_num_threads": threads,
+            "inter_op_num_threads": 1
+        }
+    )
+    detector.warmup(config.WARMUP_BATCH_SIZES or None, runs=config.WARMUP_RUNS)
+    _worker_predictor = SAHIWrapper(
+        detector=detector,
+        slice_config=SliceConfig.from_config()
+    )
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attach to a block owned by the API process without tracking it here."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        # Spawned workers share the API process's resource tracker, where
+        # the block is already registered, so attaching adds nothing to it
+        return shared_memory.SharedMemory(name=name)
+
+
+def _predict_in_worker(
+    name: str,
+    shape: Tuple[int, ...],
+    dtype: str,
+    conf_thresh: Optional[float],
+    mode: Optional[str] = None,
+    nms_thresh: Optional[float] = None,
+    keep_candidates: bool = False
+) -> SlicedPrediction:
+    """Run sliced inference on an image in shared memory."""
+    if _worker_predictor is None:
+        raise DetectorError("Inference worker is not initialized")
+
+    block = _attach_shared_memory(name)
+    try:
+        image = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        prediction = _worker_predictor.predict_sliced(
+            image,
+            mode,
+            conf_thresh=conf_thresh,
+            nms_thresh=nms_thresh,
+            keep_candidates=keep_candidates
+        )
+        del image
+        return prediction
+    finally:
+        block.close()
+
+
+def _predict_file_in_worker(
+    path: str,
+    conf_thresh: Optional[float],
+    mode: Optional[str] = None,
+    nms_thresh: Optional[float] = None,
+    keep_candidates: bool = False
+) -> SlicedPrediction:
+    """Run sliced inference on an image file, streaming it if it is large."""
+    if _worker_predictor is None:
+        raise DetectorError("Inference worker is not initialized")
+
+    with open_image_source(path) as source:
+        return _worker_predictor.predict_source(
+            source,
+            mode,
+            conf_thresh=conf_thresh,
+            nms_thresh=nms_thresh,
+            keep_candidates=keep_candidates
+        )
+
+
+class InferenceProcessPool:
+    """Pool of worker processes running SAHI + YOLOX inference."""
+
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        input_size: Optional[Tuple[int, int]] = None,
+        workers: Optional[int] = None,
+        threads_per_worker: Optional[int] = None
+    ):
+        """
+        Initialize the worker pool. Workers start and load the model lazily
+        on first use (or in start()).
+
+        Args:
+            model_path: Path to ONNX model file (defaults to config)
+            input_size: Model input size (defaults to config)
+            workers: Number of worker processes (defaults to config / core count)
+            threads_per_worker: Intra-op threads per worker (defaults to
+                config / core count)
+        """
+        self.model_path = str(model_path or config.model_path)
+        self.input_size = tuple(input_size or config.INPUT_SIZE)
+        self.workers, self.threads_per_worker = resolve_pool_size(workers, threads_per_worker)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._stats = {"tasks": 0, "errors": 0, "crashes": 0, "bytes_transferred": 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                logger.info(
+                    f"Starting {self.workers} inference worker processes "
+                    f"x {self.threads_per_worker} threads"
+                )
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    # Never fork a process that has ONNX Runtime threads
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_path, self.input_size, self.threads_per_worker)
+                )
+            return self._executor
+
+    def start(self) -> None:
+        """Start all worker processes and wait until their models are loaded and warm."""
+        executor = self._get_executor()
+        warmup = np.zeros((8, 8, 3), dtype=np.uint8)
+        for future in [self.submit(warmup) for _ in range(self.workers)]:
+            future.result()
+        logger.info(f"Started {self.workers} inference workers ({type(executor).__name__})")
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        """Replace a broken executor, unless another caller already did."""
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self._stats["crashes"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def submit(
+        self,
+        image: np.ndarray,
+        conf_thresh: Optional[float] = None,
+        mode: Optional[str] = None,
+        nms_thresh: Optional[float] = None,
+        keep_candidates: bool = False
+    ) -> Future:
+        """
+        Queue an image for sliced inference in a worker process.
+
+        Args:
+            image: Decoded BGR image
+            conf_thresh: Optional override for confidence threshold
+            mode: Optional override for the slicing mode
+            nms_thresh: Optional override for NMS threshold
+            keep_candidates: Also return the pre-threshold candidates
+
+        Returns:
+            Future resolving to the SlicedPrediction for the image
+        """
+        image = np.ascontiguousarray(image)
+        block = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+        np.ndarray(image.shape, dtype=image.dtype, buffer=block.buf)[...] = image
+
+        def _release() -> None:
+            # The worker has detached; the API process owns the block
+            block.close()
+            block.unlink()
+
+        return self._run(
+            _release,
+            image.nbytes,
+            _predict_in_worker,
+            block.name,
+            image.shape,
+            image.dtype.str,
+            conf_thresh,
+            mode,
+            nms_thresh,
+            keep_candidates
+        )
+
+    def submit_file(
+        self,
+        path: str,
+        conf_thresh: Optional[float] = None,
+        mode: Optional[str] = None,
+        nms_thresh: Optional[float] = None,
+        keep_candidates: bool = False
+    ) -> Future:
+        """
+        Queue an image file for sliced inference in a worker process.
+
+        The worker reads the file itself, streaming it slice by slice if it
+        is large, so the image is never decoded in the API process.
+
+        Args:
+            path: Image file
+            conf_thresh: Optional override for confidence threshold
+            mode: Optional override for the slicing mode
+            nms_thresh: Optional override for NMS threshold
+            keep_candidates: Also return the pre-threshold candidates
+
+        Returns:
+            Future resolving to the SlicedPrediction for the image
+        """
+        return self._run(
+            lambda: None,
+            0,
+            _predict_file_in_worker,
+            str(path),
+            conf_thresh,
+            mode,
+            nms_thresh,
+            keep_candidates
+        )
+
+    def _run(self, release: Callable[[], None], nbytes: int, fn: Callable, *args) -> Future:
+        """Run a task in a worker, calling release once it is done."""
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._restart(executor)
+            release()
+            raise DetectorError("Inference workers crashed, restarting")
+
+        result: Future = Future()
+
+        def _done(worker_future: Future) -> None:
+            release()
+            if worker_future.cancelled():
+                result.cancel()
+                return
+            error = worker_future.exception()
+            with self._lock:
+                self._stats["tasks"] += 1
+                self._stats["bytes_transferred"] += nbytes
+                self._stats["errors"] += error is not None
+            if error is None:
+                result.set_result(worker_future.result())
+                return
+            if isinstance(error, BrokenProcessPool):
+                self._restart(executor)
+                error = DetectorError(f"Inference worker crashed: {str(error)}")
+            result.set_exception(error)
+
+        future.add_done_callback(_done)
+        return result
+
+    def predict(
+        self,
+        image: np.ndarray,
+        conf_thresh: Optional[float] = None,
+        mode: Optional[str] = None,
+        nms_thresh: Optional[float] = None,
+        keep_candidates: bool = False
+    ) -> SlicedPrediction:
+        """Run sliced inference in a worker and wait for the result."""
+        return self.submit(image, conf_thresh, mode, nms_thresh, keep_candidates).result()
+
+    async def predict_async(
+        self,
+        image: np.ndarray,
+        conf_thresh: Optional[float] = None,
+        mode: Optional[str] = None,
+        nms_thresh: Optional[float] = None,
+        keep_candidates: bool = False
+    ) -> SlicedPrediction:
+        """Run sliced inference in a worker without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(image, conf_thresh, mode, nms_thresh, keep_candidates))
+
+    async def predict_file_async(
+        self,
+        path: str,
+        conf_thresh: Optional[float] = None,
+        mode: Optional[str] = None,
+        nms_thresh: Optional[float] = None,
+        keep_candidates: bool = False
+    ) -> SlicedPrediction:
+        """Run sliced inference on an image file in a worker without blocking the event loop."""
+        return await asyncio.wrap_future(
+            self.submit_file(path, conf_thresh, mode, nms_thresh, keep_candidates)
+        )
+
+    def stats(self) -> Dict:
+        """Get worker pool statistics."""
+        return {
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "running": self._executor is not None,
+            **self._stats
+        }
+
+    def shutdown(self) -> None:
+        """Stop all worker processes."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+            logger.info("Inference workers stopped")
+
+
+# Lazily created process-wide instance
+_inference_workers: Optional[InferenceProcessPool] = None
+
+
+def get_inference_workers() -> InferenceProcessPool:
+    """Get the process-wide inference worker pool."""
+    global _inference_workers
+    if _inference_workers is None:
+        _inference_workers = InferenceProcessPool()
+    return _inference_workers
+
+
+def shutdown_inference_workers() -> None:
+    """Stop the process-wide inference worker pool if it was started."""
+    global _inference_workers
+    if _inference_workers is not None:
+        _inference_workers.shutdown()
+        _inference_workers = None
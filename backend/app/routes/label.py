@@ -1,42 +1,73 @@
 # app/routes/label.py
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi import APIRouter, HTTPException, Depends, Body, Query
 from fastapi.responses import JSONResponse
 
 from ..core.utils import create_success_response, create_error_response
 from ..models.annotation import Annotation
+from ..services.jobs import JobQueueError
 from ..services.labeling import LabelingService, LabelingError
-from ..pipeline.config import ModelConfig
+from ..pipeline.config import ModelConfig, config as model_config
+from ..pipeline.registry import model_registry
+from ..pipeline.slicing import SLICING_MODES
+from ..pipeline.workers import get_inference_workers
 
 router = APIRouter()
 
+# Shared service instance so models and job state outlive a single request
+_labeling_service: Optional[LabelingService] = None
+
 
 def get_labeling_service() -> LabelingService:
-    """Dependency to get labeling service instance."""
-    return LabelingService()
+    """Dependency to get the shared labeling service instance."""
+    global _labeling_service
+    if _labeling_service is None:
+        _labeling_service = LabelingService()
+    return _labeling_service
+
+
+async def shutdown_labeling_service() -> None:
+    """Stop the shared labeling service's job workers if it was created."""
+    global _labeling_service
+    if _labeling_service is not None:
+        await _labeling_service.close()
+        _labeling_service = None
 
 
 @router.post("/batch", response_model=dict)
 async def label_images(
     image_ids: List[str] = Body(..., description="List of image IDs to label"),
     confidence_threshold: Optional[float] = Body(0.5, description="Minimum confidence score for detections"),
+    slicing_mode: Optional[str] = Body(
+        None,
+        description="Slicing mode: exhaustive, or coarse_to_fine for large sparse scenes (defaults to config)"
+    ),
+    nms_threshold: Optional[float] = Body(None, description="NMS IoU threshold (defaults to config)"),
+    force: bool = Body(False, description="Label images again even if their stored result is current"),
     labeling_service: LabelingService = Depends(get_labeling_service)
 ):
     """
-    Process a batch of images through the SAHI + YOLOX pipeline.
+    Queue a batch of images for the SAHI + YOLOX pipeline.
+    
+    Returns as soon as the job is queued; poll /job/{job_id} for per-image
+    progress, throughput, ETA and, once completed, the annotations. Images
+    unchanged since they were labeled with the same model and config reuse
+    that result (stats.cache_hits) unless force is set.
     
     Args:
         image_ids: List of image IDs to process
         confidence_threshold: Minimum confidence score (0.0-1.0)
+        slicing_mode: Optional slicing mode override
+        nms_threshold: Optional NMS threshold override (0.0-1.0)
+        force: Whether to label every image again
         labeling_service: LabelingService instance
         
     Returns:
         Dict containing:
         - job_id: Unique identifier for this labeling job
-        - total_images: Number of images processed
-        - total_annotations: Number of objects detected
-        - annotations: List of annotations with bounding boxes
-        - processing_stats: Pipeline performance metrics
+        - status: Job status (queued)
+        - total_images: Number of images queued
+        - status_url: Where to poll the job
     """
     try:
         if not image_ids:
@@ -55,26 +86,47 @@ async def label_images(
                 )
             )
 
-        # Process images through pipeline
-        labeling_result = await labeling_service.process_batch(
+        if nms_threshold is not None and not 0.0 <= nms_threshold <= 1.0:
+            return JSONResponse(
+                status_code=400,
+                content=create_error_response(
+                    message="NMS threshold must be between 0.0 and 1.0"
+                )
+            )
+
+        if slicing_mode is not None and slicing_mode not in SLICING_MODES:
+            return JSONResponse(
+                status_code=400,
+                content=create_error_response(
+                    message=f"Slicing mode must be one of {', '.join(SLICING_MODES)}"
+                )
+            )
+
+        # Queue images for the pipeline's job workers
+        job = await labeling_service.submit_batch(
             image_ids=image_ids,
-            confidence_threshold=confidence_threshold
+            confidence_threshold=confidence_threshold,
+            slicing_mode=slicing_mode,
+            nms_threshold=nms_threshold,
+            force=force
         )
         
-        # Prepare response data
-        response_data = {
-            "job_id": labeling_result["job_id"],
-            "total_images": len(image_ids),
-            "total_annotations": len(labeling_result["annotations"]),
-            "annotations": labeling_result["annotations"],
-            "processing_stats": labeling_result["stats"]
-        }
-        
-        return create_success_response(
-            message=f"Successfully labeled {len(image_ids)} images. Found {response_data['total_annotations']} objects.",
-            data=response_data
+        return JSONResponse(
+            status_code=202,
+            content=create_success_response(
+                message=f"Queued {job['total_images']} images for labeling",
+                data={**job, "status_url": f"/api/v1/label/job/{job['job_id']}"}
+            )
         )
         
+    except JobQueueError as qe:
+        return JSONResponse(
+            status_code=503,
+            content=create_error_response(
+                message="Labeling queue is full, retry later",
+                details={"error": str(qe)}
+            )
+        )
     except LabelingError as le:
         return JSONResponse(
             status_code=400,
@@ -93,20 +145,75 @@ async def label_images(
         )
 
 
+@router.post("/rethreshold", response_model=dict)
+async def rethreshold_images(
+    image_ids: List[str] = Body(..., description="List of labeled image IDs"),
+    confidence_threshold: Optional[float] = Body(None, description="Minimum confidence score (defaults to config)"),
+    nms_threshold: Optional[float] = Body(None, description="NMS IoU threshold (defaults to config)"),
+    labeling_service: LabelingService = Depends(get_labeling_service)
+):
+    """
+    Recompute annotations of labeled images at new thresholds from their
+    cached detection candidates, without running the model again.
+    
+    Args:
+        image_ids: Images labeled with the current model
+        confidence_threshold: Minimum confidence score, not below the
+            candidate floor (MODELSHIP_CANDIDATE_CONF_THRESH)
+        nms_threshold: NMS IoU threshold (0.0-1.0)
+        labeling_service: LabelingService instance
+    """
+    for name, value in (("Confidence", confidence_threshold), ("NMS", nms_threshold)):
+        if value is not None and not 0.0 <= value <= 1.0:
+            return JSONResponse(
+                status_code=400,
+                content=create_error_response(
+                    message=f"{name} threshold must be between 0.0 and 1.0"
+                )
+            )
+    
+    try:
+        result = await labeling_service.rethreshold(image_ids, confidence_threshold, nms_threshold)
+        return create_success_response(
+            message=f"Re-thresholded {result['stats']['images']} images",
+            data=result
+        )
+        
+    except LabelingError as le:
+        return JSONResponse(
+            status_code=400,
+            content=create_error_response(
+                message="Failed to re-threshold images",
+                details={"error": str(le)}
+            )
+        )
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content=create_error_response(
+                message="Internal server error",
+                details={"error": str(e)}
+            )
+        )
+
+
 @router.get("/job/{job_id}")
 async def get_job_status(
     job_id: str,
+    include_annotations: bool = Query(True, description="Include the annotations found so far"),
     labeling_service: LabelingService = Depends(get_labeling_service)
 ):
     """
-    Get status and results of a labeling job.
+    Get status, per-image progress, throughput, ETA and results of a labeling job.
     
     Args:
         job_id: Unique identifier for the labeling job
+        include_annotations: Whether to include annotations (skip them when
+            polling progress)
         labeling_service: LabelingService instance
     """
     try:
-        job_status = await labeling_service.get_job_status(job_id)
+        job_status = await labeling_service.get_job_status(job_id, include_annotations)
         
         return create_success_response(
             message=f"Job status: {job_status['status']}",
@@ -153,4 +260,52 @@ async def get_model_config(
                 message="Failed to get model configuration",
                 error=str(e)
             )
-        ) 
\ No newline at end of file
+        ) 
+
+
+@router.get("/models")
+async def get_model_stats():
+    """
+    Get loaded models with load time, memory footprint and reference counts.
+    """
+    try:
+        stats = model_registry.stats()
+        if model_config.INFERENCE_BACKEND == "process":
+            stats["inference_workers"] = get_inference_workers().stats()
+        return create_success_response(
+            message="Loaded models",
+            data=stats
+        )
+        
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content=create_error_response(
+                message="Failed to get model statistics",
+                details={"error": str(e)}
+            )
+        )
+
+
+@router.get("/execution")
+async def get_execution_stats(
+    labeling_service: LabelingService = Depends(get_labeling_service)
+):
+    """
+    Get job queue depth, pipeline stage times, inference executor queue
+    depth and event loop lag.
+    """
+    try:
+        return create_success_response(
+            message="Execution statistics",
+            data=labeling_service.get_execution_stats()
+        )
+        
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content=create_error_response(
+                message="Failed to get execution statistics",
+                details={"error": str(e)}
+            )
+        )
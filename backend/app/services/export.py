@@ -1,4 +1,5 @@
 # app/services/export.py
+import asyncio
 import os
 import json
 import csv
@@ -12,11 +13,14 @@ from pathlib import Path
 import zipfile
 
 from ..storage.image_store import ImageStore
+from ..storage.job_store import get_job_store
 from ..models.annotation import Annotation, YOLOAnnotation, COCOAnnotation
 from ..core.utils import create_success_response, create_error_response
 
 logger = logging.getLogger(__name__)
 
+JOB_TYPE = "export"
+
 
 class ExportFormat(str, Enum):
     """Supported export formats."""
@@ -38,7 +42,7 @@ class ExportService:
         self.image_store = ImageStore()
         self.export_dir = Path("exports")  # Temporary export storage
         self.export_dir.mkdir(exist_ok=True)
-        self._jobs = {}  # In-memory job storage
+        self.job_store = get_job_store()  # Shared so any worker process can serve status and downloads
         
     async def create_export(
         self,
@@ -66,21 +70,30 @@ class ExportService:
             - media_type: Content type for download
             - estimated_size: Estimated export size in bytes
         """
+        job_id = None
         try:
             job_id = str(uuid.uuid4())
-            export_path = self.export_dir / job_id
+            export_path = self._export_path(job_id)
             export_path.mkdir(exist_ok=True)
             
             # Initialize job tracking
-            self._jobs[job_id] = {
-                "status": "processing",
-                "start_time": datetime.utcnow(),
-                "format": format,
-                "total_images": len(image_ids),
-                "processed_images": 0,
-                "export_path": str(export_path),
-                "errors": []
-            }
+            await asyncio.to_thread(
+                self.job_store.create_job,
+                {
+                    "job_id": job_id,
+                    "job_type": JOB_TYPE,
+                    "status": "processing",
+                    "start_time": datetime.utcnow(),
+                    "params": {
+                        "format": format.value,
+                        "include_images": include_images,
+                        "include_previews": include_previews,
+                        "min_confidence": min_confidence
+                    },
+                    "result": {"export_path": str(export_path)}
+                },
+                image_ids
+            )
             
             # Get annotations for all images
             annotations = await self._get_annotations(image_ids, min_confidence)
@@ -103,12 +116,15 @@ class ExportService:
                     job_id, annotations, image_ids, include_images, include_previews
                 )
             
-            # Update job completion
-            self._jobs[job_id].update({
-                "status": "completed",
-                "end_time": datetime.utcnow(),
-                **result
-            })
+            # Update job completion; the result points at the export file
+            await asyncio.to_thread(
+                self.job_store.update_job,
+                job_id,
+                status="completed",
+                end_time=datetime.utcnow(),
+                processed_images=len(image_ids),
+                result={"export_path": str(export_path), **result}
+            )
             
             return {
                 "job_id": job_id,
@@ -118,20 +134,38 @@ class ExportService:
         except Exception as e:
             error_msg = f"Export creation failed: {str(e)}"
             logger.error(error_msg)
-            if job_id in self._jobs:
-                self._jobs[job_id].update({
-                    "status": "failed",
-                    "error": error_msg
-                })
+            if job_id is not None:
+                await asyncio.to_thread(
+                    self.job_store.update_job,
+                    job_id,
+                    status="failed",
+                    end_time=datetime.utcnow(),
+                    error=error_msg
+                )
             raise ExportError(error_msg)
 
+    def _export_path(self, job_id: str) -> Path:
+        """Directory holding an export's files."""
+        return self.export_dir / job_id
+
     async def get_export_status(self, job_id: str) -> Dict:
         """Get status and details of an export job."""
         try:
-            if job_id not in self._jobs:
+            job = await asyncio.to_thread(self.job_store.get_job, job_id)
+            if job is None or job["job_type"] != JOB_TYPE:
                 raise ExportError(f"Export job {job_id} not found")
                 
-            return self._jobs[job_id]
+            params = job["params"] or {}
+            return {
+                "status": job["status"],
+                "start_time": job["start_time"],
+                "end_time": job["end_time"],
+                "format": params.get("format"),
+                "total_images": job["total_images"],
+                "processed_images": job["processed_images"],
+                "errors": [job["error"]] if job["error"] else [],
+                **(job["result"] or {})
+            }
             
         except Exception as e:
             logger.error(f"Failed to get export status: {str(e)}")
@@ -140,11 +174,12 @@ class ExportService:
     async def cleanup_export(self, job_id: str):
         """Clean up export files after download."""
         try:
-            if job_id in self._jobs:
-                export_path = Path(self._jobs[job_id]["export_path"])
+            job = await asyncio.to_thread(self.job_store.get_job, job_id)
+            if job is not None and job["job_type"] == JOB_TYPE:
+                export_path = Path((job["result"] or {}).get("export_path") or self._export_path(job_id))
                 if export_path.exists():
                     shutil.rmtree(export_path)
-                del self._jobs[job_id]
+                await asyncio.to_thread(self.job_store.delete_job, job_id)
                 
         except Exception as e:
             logger.error(f"Failed to cleanup export {job_id}: {str(e)}")
@@ -183,7 +218,7 @@ class ExportService:
     ) -> Dict:
         """Create YOLO format export."""
         try:
-            export_path = Path(self._jobs[job_id]["export_path"])
+            export_path = self._export_path(job_id)
             labels_dir = export_path.joinpath("labels")
             labels_dir.mkdir(exist_ok=True)
             
@@ -282,7 +317,7 @@ class ExportService:
     ) -> Dict:
         """Create COCO JSON format export."""
         try:
-            export_path = Path(self._jobs[job_id]["export_path"])
+            export_path = self._export_path(job_id)
             
             if include_images:
                 images_dir = export_path.joinpath("images")
@@ -380,7 +415,7 @@ class ExportService:
     ) -> Dict:
         """Create CSV format export."""
         try:
-            export_path = Path(self._jobs[job_id]["export_path"])
+            export_path = self._export_path(job_id)
             
             if include_images:
                 images_dir = export_path.joinpath("images")
@@ -462,7 +497,7 @@ class ExportService:
     ) -> Dict:
         """Create complete ZIP export with all formats."""
         try:
-            export_path = Path(self._jobs[job_id]["export_path"])
+            export_path = self._export_path(job_id)
             temp_dir = export_path.joinpath("temp")
             temp_dir.mkdir(exist_ok=True)
             
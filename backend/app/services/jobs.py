@@ -0,0 +1,359 @@
+# app/services/jobs.py
+"""
+Background job queue.
+
+Requests enqueue the units of work of a job (one per image for labeling)
+and return right away; a fixed number of worker tasks on the event loop
+take units off the queue in order. The workers only await, so the heavy
+lifting must happen off the loop (the detector pool threads or the
+inference worker processes), and the number of workers bounds how many
+units are in progress at once.
+
+A unit may in turn run through a StagedPipeline: stages connected by
+bounded queues, each with its own workers, so that different units are
+fetched, decoded, inferred and persisted at the same time.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueError(Exception):
+    """Custom exception for job queue errors."""
+    pass
+
+
+@dataclass
+class _WorkItem:
+    """One unit of work of a job."""
+    job_id: str
+    run: Callable[[], Awaitable[None]]
+
+
+def job_progress(
+    total: int,
+    completed: int,
+    started_at: Optional[datetime],
+    now: Optional[datetime] = None
+) -> Dict:
+    """
+    Get progress, throughput and ETA of a job.
+
+    Args:
+        total: Units in the job
+        completed: Units finished, successfully or not
+        started_at: When the first unit started, None while queued
+        now: Current time (defaults to utcnow)
+
+    Returns:
+        Dict with percent done, units per second and estimated seconds left
+        (None until a unit has finished)
+    """
+    now = now or datetime.utcnow()
+    elapsed = (now - started_at).total_seconds() if started_at else 0.0
+    throughput = completed / elapsed if completed and elapsed > 0 else 0.0
+    remaining = total - completed
+    return {
+        "completed": completed,
+        "total": total,
+        "percent": round(100.0 * completed / total, 2) if total else 100.0,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput": round(throughput, 4),
+        "eta_seconds": round(remaining / throughput, 1) if throughput else (0.0 if not remaining else None)
+    }
+
+
+class JobQueue:
+    """FIFO queue of job work items run by a bounded set of worker tasks."""
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None):
+        """
+        Initialize the queue. Worker tasks start with the first job.
+
+        Args:
+            workers: Work items run concurrently (defaults to settings)
+            max_pending: Queued work items before new jobs are refused
+                (defaults to settings; 0 = unlimited)
+        """
+        self.workers = workers or settings.LABELING_WORKERS
+        self.max_pending = settings.JOB_QUEUE_MAX_IMAGES if max_pending is None else max_pending
+        self._queue: Optional["asyncio.Queue[_WorkItem]"] = None
+        self._tasks: List[asyncio.Task] = []
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+
+    def _start(self) -> None:
+        """Start the worker tasks on the running event loop."""
+        if self._tasks and not all(task.done() for task in self._tasks):
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(index), name=f"job-worker-{index}")
+            for index in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} job workers")
+
+    async def _worker(self, index: int) -> None:
+        """Run queued work items until cancelled."""
+        while True:
+            item = await self._queue.get()
+            self._running += 1
+            try:
+                await item.run()
+                self._completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Work items record their own failures; this only keeps
+                # the worker alive
+                self._failed += 1
+                logger.error(f"Job {item.job_id} work item failed in worker {index}: {e}")
+            finally:
+                self._running -= 1
+                self._queue.task_done()
+
+    @property
+    def pending(self) -> int:
+        """Work items waiting for a worker."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def ensure_room(self, count: int) -> None:
+        """
+        Check that count more work items fit in the queue.
+
+        Raises:
+            JobQueueError: If they do not
+        """
+        if self.max_pending and self.pending + count > self.max_pending:
+            raise JobQueueError(
+                f"Job queue is full ({self.pending} items pending, limit {self.max_pending})"
+            )
+
+    def submit(self, job_id: str, work: List[Callable[[], Awaitable[None]]]) -> None:
+        """
+        Queue the work items of a job.
+
+        Args:
+            job_id: Job the items belong to
+            work: Coroutine functions, each running one unit of the job
+
+        Raises:
+            JobQueueError: If the queue has no room for the job
+        """
+        self.ensure_room(len(work))
+        self._start()
+        for run in work:
+            self._queue.put_nowait(_WorkItem(job_id=job_id, run=run))
+
+    def stats(self) -> Dict:
+        """Get queue depth and worker usage."""
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self._completed,
+            "failed": self._failed
+        }
+
+    async def close(self) -> None:
+        """Stop the workers; queued work items are dropped."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+
+@dataclass
+class Stage:
+    """One step of a staged pipeline."""
+    name: str
+    run: Callable[[Any], Awaitable[Any]]  # Takes an item, returns it for the next stage
+    concurrency: int = 1
+
+
+@dataclass
+class _StageCounters:
+    """Time a stage's workers spent working, waiting for input and waiting for room downstream."""
+    busy: float = 0.0
+    idle: float = 0.0
+    blocked: float = 0.0
+    items: int = 0
+    failed: int = 0
+    waiting: Dict[int, float] = field(default_factory=dict)  # Worker index -> waiting since
+
+
+@dataclass
+class _PipelineItem:
+    """An item on its way through a pipeline."""
+    value: Any
+    future: asyncio.Future
+
+
+class StagedPipeline:
+    """
+    Stages connected by bounded queues, each run by its own worker tasks.
+
+    Items go through the stages in order. While one item is in a slow stage
+    the following ones are already in the earlier stages, up to the size of
+    the queue in front of it; a stage whose output queue is full waits,
+    which bounds the items (and the memory they hold) between stages.
+    An item failing in a stage leaves the pipeline with that error.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 1):
+        """
+        Initialize the pipeline. Workers start with the first item.
+
+        Args:
+            stages: Stages in the order items go through them
+            queue_size: Items waiting in front of each stage
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+        self._queues: List["asyncio.Queue[_PipelineItem]"] = []
+        self._tasks: List[asyncio.Task] = []
+        self._counters = {stage.name: _StageCounters() for stage in stages}
+
+    @property
+    def capacity(self) -> int:
+        """Items the pipeline holds when every worker and queue is full."""
+        return sum(stage.concurrency for stage in self.stages) + self.queue_size * len(self.stages)
+
+    def _start(self) -> None:
+        """Start the stage workers on the running event loop."""
+        if self._tasks and not all(task.done() for task in self._tasks):
+            return
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        self._tasks = [
+            asyncio.create_task(self._worker(position, index), name=f"{stage.name}-worker-{index}")
+            for position, stage in enumerate(self.stages)
+            for index in range(stage.concurrency)
+        ]
+
+    async def _worker(self, position: int, index: int) -> None:
+        """Run items through one stage until cancelled."""
+        stage = self.stages[position]
+        counters = self._counters[stage.name]
+        inbox = self._queues[position]
+        outbox = self._queues[position + 1] if position + 1 < len(self.stages) else None
+        while True:
+            waiting_since = counters.waiting[index] = time.perf_counter()
+            try:
+                item = await inbox.get()
+            finally:
+                del counters.waiting[index]
+            started = time.perf_counter()
+            counters.idle += started - waiting_since
+            try:
+                if item.future.done():
+                    continue  # Abandoned by its caller
+                try:
+                    item.value = await stage.run(item.value)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    counters.failed += 1
+                    # The caller may have given up on the item meanwhile
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                    continue
+                finally:
+                    finished = time.perf_counter()
+                    counters.busy += finished - started
+                    counters.items += 1
+                
+                if outbox is None:
+                    if not item.future.done():
+                        item.future.set_result(item.value)
+                else:
+                    await outbox.put(item)
+                    counters.blocked += time.perf_counter() - finished
+            finally:
+                inbox.task_done()
+
+    async def run(self, value: Any) -> Any:
+        """
+        Send an item through all stages.
+
+        Args:
+            value: Item for the first stage
+
+        Returns:
+            What the last stage returned
+
+        Raises:
+            Exception: The error of the stage the item failed in
+        """
+        self._start()
+        item = _PipelineItem(value=value, future=asyncio.get_running_loop().create_future())
+        await self._queues[0].put(item)
+        try:
+            return await item.future
+        finally:
+            item.future.cancel()  # No-op once resolved; lets workers drop it otherwise
+
+    def stats(self) -> Dict[str, Dict]:
+        """Get per-stage busy, idle and blocked seconds, items and queue depth so far."""
+        now = time.perf_counter()
+        stats = {}
+        for position, stage in enumerate(self.stages):
+            counters = self._counters[stage.name]
+            stats[stage.name] = {
+                "concurrency": stage.concurrency,
+                "busy_seconds": counters.busy,
+                "idle_seconds": counters.idle + sum(now - since for since in counters.waiting.values()),
+                "blocked_seconds": counters.blocked,
+                "items": counters.items,
+                "failed": counters.failed,
+                "queued": self._queues[position].qsize() if self._queues else 0
+            }
+        return stats
+
+    @staticmethod
+    def stats_since(before: Dict[str, Dict], after: Dict[str, Dict]) -> Dict:
+        """
+        Get per-stage statistics between two stats() snapshots.
+
+        Utilization is the share of worker time spent working; the stage
+        with the highest utilization is the bottleneck.
+
+        Returns:
+            Dict of per-stage statistics and the bottleneck stage
+        """
+        stages = {}
+        for name, stage in after.items():
+            start = before.get(name, {})
+            busy, idle, blocked = (
+                stage[key] - start.get(key, 0.0)
+                for key in ("busy_seconds", "idle_seconds", "blocked_seconds")
+            )
+            total = busy + idle + blocked
+            stages[name] = {
+                "concurrency": stage["concurrency"],
+                "busy_seconds": round(busy, 3),
+                "idle_seconds": round(idle, 3),
+                "blocked_seconds": round(blocked, 3),
+                "utilization": round(busy / total, 4) if total > 0 else 0.0,
+                "items": stage["items"] - start.get("items", 0)
+            }
+        busiest = max(stages, key=lambda name: stages[name]["utilization"], default=None)
+        return {"stages": stages, "bottleneck": busiest}
+
+    async def close(self) -> None:
+        """Stop the stage workers; items in the pipeline are dropped."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues = []
@@ -1,65 +1,328 @@
 # app/services/labeling.py
+import asyncio
+import functools
+import hashlib
+import json
 import logging
-from typing import Dict, List, Optional
+import os
+import socket
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union
 import uuid
 from datetime import datetime
+from pathlib import Path
 
+from ..pipeline.candidates import CandidateCache, CandidateError, file_sha256, model_version
 from ..pipeline.detector import YOLOXDetector
-from ..pipeline.sahi_wrapper import SAHIWrapper, SliceConfig
+from ..pipeline.executor import get_inference_executor, loop_monitor
+from ..pipeline.pool import DetectorPool
+from ..pipeline.sahi_wrapper import SAHIWrapper, SlicedPrediction
+from ..pipeline.slicing import SLICING_MODES, SliceConfig
+from ..pipeline.tiling import ArraySource, ImageSource, open_image_source
 from ..pipeline.config import config
+from ..pipeline.registry import model_registry
+from ..pipeline.workers import InferenceProcessPool, get_inference_workers
 from ..storage.image_store import ImageStore
+from ..storage.job_store import ACTIVE_STATUSES, JobStoreError, get_job_store
 from ..models.annotation import Annotation, BoundingBox
+from ..core.config import settings
 from ..core.utils import create_success_response, create_error_response
+from .jobs import JobQueue, JobQueueError, Stage, StagedPipeline, job_progress
 
 logger = logging.getLogger(__name__)
 
+JOB_TYPE = "labeling"
+
+# Pipeline settings a labeling result depends on, besides the model, the
+# image and the job's thresholds and slicing mode
+RESULT_CONFIG_FIELDS = (
+    "OUTPUT_LAYOUT", "STRIDES", "MAX_CANDIDATES", "MAX_DETECTIONS", "CLASS_AGNOSTIC_NMS",
+    "SLICE_HEIGHT", "SLICE_WIDTH", "OVERLAP_HEIGHT_RATIO", "OVERLAP_WIDTH_RATIO",
+    "FULL_FRAME_PASS", "AUTO_SLICE_RESOLUTION", "MIN_OBJECT_SIZE", "SLICE_SKIP_MIN_CONTRAST",
+    "COARSE_CONF_THRESH", "COARSE_SAMPLE_RATIO", "STREAMING_MIN_PIXELS",
+    "POSTPROCESS_TYPE", "POSTPROCESS_MATCH_THRESHOLD", "POSTPROCESS_MATCH_METRIC",
+    "POSTPROCESS_CLASS_AGNOSTIC", "CLASSES"
+)
+
+# Identifies this process as the owner of the jobs it runs
+_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _owner_alive(owner: str) -> bool:
+    """Whether the process that owns a job may still be running it."""
+    host, pid = (owner.split(":") + ["", ""])[:2]
+    if owner == _OWNER:
+        return True
+    if host != socket.gethostname() or not pid.isdigit():
+        return True  # Another machine's job; it checks its own
+    if int(pid) == os.getpid():
+        return False  # An earlier run of this process (e.g. a restarted container)
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _write_annotations(path: Path, annotations: List[Annotation]) -> None:
+    """Write annotations to a JSON results file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump([annotation.dict() for annotation in annotations], f, default=str)
+    os.replace(tmp_path, path)
+
+
+def _read_annotations(path: Path) -> List[Annotation]:
+    """Read annotations from a JSON results file."""
+    with open(path) as f:
+        return [Annotation(**annotation) for annotation in json.load(f)]
+
 
 class LabelingError(Exception):
     """Custom exception for labeling service errors."""
     pass
 
 
+@dataclass
+class _ImageTask:
+    """One image of a job on its way through the labeling pipeline."""
+    image_id: str
+    confidence_threshold: Optional[float]
+    slicing_mode: Optional[str]
+    nms_threshold: Optional[float] = None
+    job_id: Optional[str] = None
+    force: bool = False  # Label even if a result for the same key is stored
+    image_path: Optional[Path] = None
+    result_key: Optional[str] = None  # Image content, model and config the result is for
+    reused: bool = False  # Stored result reused, the image was not labeled again
+    reused_stats: Optional[Dict] = None
+    source: Optional[ImageSource] = None
+    prediction: Optional[SlicedPrediction] = None
+    annotations: List[Annotation] = field(default_factory=list)
+
+
 class LabelingService:
     """Service to coordinate SAHI + YOLOX labeling pipeline."""
     
-    def __init__(self):
-        """Initialize labeling service with YOLOX detector and SAHI predictor."""
+    def __init__(self, detector: Optional[Union[YOLOXDetector, DetectorPool]] = None):
+        """
+        Initialize labeling service with YOLOX detector and SAHI predictor.
+        
+        Args:
+            detector: Optional detector or detector pool; defaults to the
+                shared detector pool from the model registry, or to the
+                inference worker processes if INFERENCE_BACKEND is "process"
+        """
         try:
             self.config = config
-            self.detector = YOLOXDetector(
-                model_path=self.config.model_path,
-                conf_thresh=self.config.CONF_THRESH,
-                nms_thresh=self.config.NMS_THRESH,
-                input_size=self.config.INPUT_SIZE
-            )
-            self.predictor = SAHIWrapper(
-                detector=self.detector,
-                slice_config=SliceConfig(
-                    slice_height=self.config.SLICE_HEIGHT,
-                    slice_width=self.config.SLICE_WIDTH,
-                    overlap_height_ratio=self.config.OVERLAP_HEIGHT_RATIO,
-                    overlap_width_ratio=self.config.OVERLAP_WIDTH_RATIO,
-                    auto_slice_resolution=self.config.AUTO_SLICE_RESOLUTION
+            self.workers: Optional[InferenceProcessPool] = None
+            self.detector = None
+            self.predictor = None
+            self.slice_config = SliceConfig.from_config()
+            if detector is None and self.config.INFERENCE_BACKEND == "process":
+                # Models are loaded by the worker processes
+                self.workers = get_inference_workers()
+            else:
+                self.detector = detector or model_registry.acquire(
+                    model_path=self.config.model_path,
+                    input_size=self.config.INPUT_SIZE
                 )
-            )
+                self.predictor = SAHIWrapper(
+                    detector=self.detector,
+                    slice_config=self.slice_config
+                )
+            # Decode and inference run on their own threads, never on the
+            # event loop or the default executor
+            self.executor = get_inference_executor()
+            self.candidate_cache = CandidateCache() if self.config.CANDIDATE_CACHE else None
+            self._model_version: Optional[str] = None
             self.image_store = ImageStore()
-            self._jobs = {}  # In-memory job storage
+            self.job_store = get_job_store()
+            self.results_dir = Path(settings.JOB_RESULTS_DIR)
+            self._jobs = {}  # Jobs run by this process, with their annotations
+            
+            # Images are fetched and decoded ahead of inference and their
+            # annotations persisted behind it; the job queue keeps the
+            # pipeline full
+            self.pipeline = StagedPipeline(
+                [
+                    Stage("fetch", self._fetch, settings.LABELING_FETCH_WORKERS),
+                    Stage("decode", self._decode, settings.LABELING_DECODE_WORKERS),
+                    Stage("infer", self._infer, settings.LABELING_WORKERS),
+                    Stage("persist", self._persist, settings.LABELING_PERSIST_WORKERS)
+                ],
+                queue_size=settings.LABELING_STAGE_QUEUE_SIZE
+            )
+            self.job_queue = JobQueue(workers=self.pipeline.capacity)
+            self._fail_interrupted_jobs()
             
         except Exception as e:
             logger.error(f"Failed to initialize labeling service: {str(e)}")
             raise LabelingError(f"Service initialization failed: {str(e)}")
 
+    def _new_job(
+        self,
+        job_id: str,
+        image_ids: List[str],
+        confidence_threshold: Optional[float],
+        slicing_mode: Optional[str],
+        nms_threshold: Optional[float] = None,
+        force: bool = False
+    ) -> Dict:
+        """Create the in-process record of a labeling job run here."""
+        return {
+            "job_id": job_id,
+            "status": "queued",
+            "created_at": datetime.utcnow(),
+            "start_time": None,
+            "confidence_threshold": confidence_threshold,
+            "nms_threshold": nms_threshold,
+            "slicing_mode": slicing_mode or self.slice_config.mode,
+            "force": force,
+            "total_images": len(image_ids),
+            "processed_images": 0,
+            "failed_images": 0,
+            "annotations": [],
+            "done": asyncio.get_running_loop().create_future(),
+            "pipeline_stats": self.pipeline.stats(),
+            "stats": {
+                "total_objects": 0,
+                "processing_time": 0,
+                "average_confidence": 0.0,
+                "total_slices": 0,
+                "skipped_slices": 0,
+                "unsliced_images": 0,
+                "slicing_mode": slicing_mode or self.slice_config.mode,
+                "model_inputs": 0,
+                "exhaustive_model_inputs": 0,
+                "compute_saved": 0.0,
+                "streamed_images": 0,
+                "cache_hits": 0,
+                "pipeline": {},
+                "slice_grids": {}
+            }
+        }
+
+    @staticmethod
+    def _stored_stats(stats: Dict) -> Dict:
+        """Job statistics as stored; slice grids are stored per image."""
+        return {key: value for key, value in stats.items() if key != "slice_grids"}
+
+    async def submit_batch(
+        self,
+        image_ids: List[str],
+        confidence_threshold: Optional[float] = None,
+        slicing_mode: Optional[str] = None,
+        nms_threshold: Optional[float] = None,
+        force: bool = False
+    ) -> Dict:
+        """
+        Queue a batch of images for labeling and return without waiting.
+        
+        The images are labeled by the job queue's workers; progress and
+        results are available from get_job_status(). Images whose content,
+        model and config are unchanged since they were last labeled reuse
+        that result instead (see LABELING_REUSE_RESULTS).
+        
+        Args:
+            image_ids: List of image IDs to process
+            confidence_threshold: Optional override for model confidence threshold
+            slicing_mode: Optional override for the slicing mode (exhaustive
+                or coarse_to_fine)
+            nms_threshold: Optional override for the NMS threshold
+            force: Label all images again, even those with a result to reuse
+            
+        Returns:
+            Dict containing job_id, status and total_images
+            
+        Raises:
+            LabelingError: If the slicing mode is unknown
+            JobQueueError: If the job queue has no room for the batch
+        """
+        job = await self._submit(image_ids, confidence_threshold, slicing_mode, nms_threshold, force)
+        return {
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "total_images": job["total_images"]
+        }
+
+    async def _submit(
+        self,
+        image_ids: List[str],
+        confidence_threshold: Optional[float],
+        slicing_mode: Optional[str],
+        nms_threshold: Optional[float] = None,
+        force: bool = False
+    ) -> Dict:
+        """Record and queue a labeling job, returning its in-process record."""
+        if slicing_mode is not None and slicing_mode not in SLICING_MODES:
+            raise LabelingError(
+                f"Unknown slicing mode {slicing_mode}, expected one of {SLICING_MODES}"
+            )
+        
+        # Each image is labeled once per job
+        image_ids = list(dict.fromkeys(image_ids))
+        job_id = str(uuid.uuid4())
+        job = self._new_job(job_id, image_ids, confidence_threshold, slicing_mode, nms_threshold, force)
+        self.job_queue.ensure_room(len(image_ids))
+        
+        await asyncio.to_thread(
+            self.job_store.create_job,
+            {
+                "job_id": job_id,
+                "job_type": JOB_TYPE,
+                "created_at": job["created_at"],
+                "params": {
+                    "confidence_threshold": confidence_threshold,
+                    "nms_threshold": nms_threshold,
+                    "slicing_mode": job["slicing_mode"],
+                    "force": force,
+                    "owner": _OWNER
+                },
+                "stats": self._stored_stats(job["stats"])
+            },
+            image_ids
+        )
+        self._jobs[job_id] = job
+        try:
+            self.job_queue.submit(
+                job_id,
+                [functools.partial(self._process_image, job_id, image_id) for image_id in image_ids]
+            )
+        except JobQueueError:
+            # Filled up by a concurrent request meanwhile
+            del self._jobs[job_id]
+            await asyncio.to_thread(self.job_store.delete_job, job_id)
+            raise
+        
+        if not image_ids:
+            await self._finish_job(job_id)
+        logger.info(f"Queued labeling job {job_id} with {len(image_ids)} images")
+        return job
+
     async def process_batch(
         self,
         image_ids: List[str],
-        confidence_threshold: Optional[float] = None
+        confidence_threshold: Optional[float] = None,
+        slicing_mode: Optional[str] = None,
+        nms_threshold: Optional[float] = None,
+        force: bool = False
     ) -> Dict:
         """
-        Process a batch of images through the SAHI + YOLOX pipeline.
+        Process a batch of images through the SAHI + YOLOX pipeline and wait
+        for the results.
         
         Args:
             image_ids: List of image IDs to process
             confidence_threshold: Optional override for model confidence threshold
+            slicing_mode: Optional override for the slicing mode (exhaustive
+                or coarse_to_fine)
+            nms_threshold: Optional override for the NMS threshold
+            force: Label all images again, even those with a result to reuse
             
         Returns:
             Dict containing:
@@ -68,106 +331,469 @@ class LabelingService:
             - stats: Processing statistics and metrics
         """
         try:
-            job_id = str(uuid.uuid4())
-            self._jobs[job_id] = {
-                "status": "processing",
-                "start_time": datetime.utcnow(),
-                "total_images": len(image_ids),
-                "processed_images": 0,
-                "annotations": [],
-                "errors": []
-            }
-
-            # Update confidence threshold if provided
-            if confidence_threshold is not None:
-                self.detector.conf_thresh = confidence_threshold
-
-            annotations = []
-            processing_stats = {
-                "total_objects": 0,
-                "processing_time": 0,
-                "average_confidence": 0.0
-            }
-
-            for image_id in image_ids:
-                try:
-                    # Get image path
-                    image_path = await self.image_store.get_image_path(image_id)
-                    
-                    # Run SAHI detection
-                    import cv2
-                    image = cv2.imread(str(image_path))
-                    predictions = await self.predictor.detect(image)
-                    
-                    # Add image_id to annotations
-                    for annotation in predictions:
-                        annotation.image_id = image_id
-                    
-                    annotations.extend(predictions)
-                    
-                    # Update statistics
-                    processing_stats["total_objects"] += len(predictions)
-                    processing_stats["average_confidence"] += sum(
-                        ann.confidence for ann in predictions
-                    )
-                    
-                    # Update job status
-                    self._jobs[job_id]["processed_images"] += 1
-                    
-                except Exception as e:
-                    error_msg = f"Failed to process image {image_id}: {str(e)}"
-                    logger.error(error_msg)
-                    self._jobs[job_id]["errors"].append(error_msg)
-
-            # Finalize statistics
-            if processing_stats["total_objects"] > 0:
-                processing_stats["average_confidence"] /= processing_stats["total_objects"]
-            
-            processing_stats["processing_time"] = (
-                datetime.utcnow() - self._jobs[job_id]["start_time"]
-            ).total_seconds()
-
-            # Update job completion
-            self._jobs[job_id].update({
-                "status": "completed",
-                "end_time": datetime.utcnow(),
-                "annotations": annotations,
-                "stats": processing_stats
-            })
-
+            job = await self._submit(image_ids, confidence_threshold, slicing_mode, nms_threshold, force)
+            await job["done"]
             return {
-                "job_id": job_id,
-                "annotations": annotations,
-                "stats": processing_stats
+                "job_id": job["job_id"],
+                "annotations": job["annotations"],
+                "stats": job["stats"]
             }
 
         except Exception as e:
             error_msg = f"Batch processing failed: {str(e)}"
             logger.error(error_msg)
-            if job_id in self._jobs:
-                self._jobs[job_id].update({
-                    "status": "failed",
-                    "error": error_msg
-                })
             raise LabelingError(error_msg)
 
-    async def get_job_status(self, job_id: str) -> Dict:
-        """Get status and results of a labeling job."""
+    async def _process_image(self, job_id: str, image_id: str) -> None:
+        """Label one image of a job and record the outcome."""
+        job = self._jobs[job_id]
+        if job["status"] == "queued":
+            job.update(status="processing", start_time=datetime.utcnow())
+            await asyncio.to_thread(
+                self.job_store.update_job, job_id, status="processing", start_time=job["start_time"]
+            )
+        self.job_store.update_image(job_id, image_id, status="processing")
+        start_time = time.perf_counter()
         try:
-            if job_id not in self._jobs:
+            task = await self.pipeline.run(
+                _ImageTask(
+                    image_id,
+                    job["confidence_threshold"],
+                    job["slicing_mode"],
+                    job["nms_threshold"],
+                    job_id=job_id,
+                    force=job["force"]
+                )
+            )
+            if task.reused:
+                image_stats = {**(task.reused_stats or {}), "cached": True}
+            else:
+                image_stats = task.prediction.stats()
+            self._record_image(job, image_id, task.annotations, task.prediction, image_stats)
+            job["processed_images"] += 1
+            self.job_store.update_image(
+                job_id,
+                image_id,
+                status="completed",
+                annotations=len(task.annotations),
+                stats=image_stats,
+                processing_time=round(time.perf_counter() - start_time, 4),
+                processed_at=datetime.utcnow()
+            )
+            
+        except Exception as e:
+            logger.error(f"Failed to process image {image_id}: {str(e)}")
+            job["failed_images"] += 1
+            self.job_store.update_image(
+                job_id,
+                image_id,
+                status="failed",
+                error=str(e),
+                processing_time=round(time.perf_counter() - start_time, 4),
+                processed_at=datetime.utcnow()
+            )
+            
+        # Stage times while the job ran show which stage holds it up
+        job["stats"]["pipeline"] = StagedPipeline.stats_since(job["pipeline_stats"], self.pipeline.stats())
+        
+        # Counters and statistics are written with the next batch of updates
+        self.job_store.update_job(
+            job_id,
+            processed_images=job["processed_images"],
+            failed_images=job["failed_images"],
+            stats=self._stored_stats(job["stats"])
+        )
+        if job["processed_images"] + job["failed_images"] == job["total_images"]:
+            await self._finish_job(job_id)
+
+    async def _fetch(self, task: _ImageTask) -> _ImageTask:
+        """Pipeline stage: look up where the image is stored and any result to reuse."""
+        task.image_path = await self.image_store.get_image_path(task.image_id)
+        if settings.LABELING_REUSE_RESULTS:
+            await asyncio.to_thread(self._find_result, task)
+        return task
+
+    async def _decode(self, task: _ImageTask) -> _ImageTask:
+        """Pipeline stage: open the image off the event loop; very large images are streamed later."""
+        if task.reused:
+            return task
+        task.source = await self.executor.run(open_image_source, task.image_path)
+        return task
+
+    async def _infer(self, task: _ImageTask) -> _ImageTask:
+        """Pipeline stage: run SAHI detection on the image."""
+        if task.reused:
+            return task
+        # Thresholds go with the call; the shared detector is never changed.
+        # A failed detection raises, so the image fails and persist never
+        # replaces its stored annotations or result with a partial one
+        try:
+            task.prediction = await self._predict(
+                task.source,
+                task.image_path,
+                task.confidence_threshold,
+                task.slicing_mode,
+                task.nms_threshold
+            )
+        finally:
+            task.source.close()
+            task.source = None
+        task.annotations = SAHIWrapper.to_annotations(task.prediction.detections, task.image_id)
+        return task
+
+    async def _persist(self, task: _ImageTask) -> _ImageTask:
+        """Pipeline stage: store the image's annotations and result and cache its candidates."""
+        if task.reused:
+            return task
+        # The previous result no longer matches the image's annotations;
+        # forgetting it first also gets the image labeled again next time if
+        # storing fails halfway
+        await asyncio.to_thread(self.job_store.delete_image_result, task.image_id)
+        await self.image_store.store_annotations(task.image_id, task.annotations)
+        if task.result_key is not None:
+            try:
+                await asyncio.to_thread(self._store_result, task)
+            except (OSError, JobStoreError) as e:
+                # The annotations are stored; only reusing them needs this
+                logger.warning(f"Failed to store result of image {task.image_id}: {e}")
+        candidates, task.prediction.candidates = task.prediction.candidates, None
+        if candidates is not None and self.candidate_cache is not None:
+            try:
+                await asyncio.to_thread(
+                    lambda: self.candidate_cache.put(task.image_id, self.model_version, candidates)
+                )
+            except OSError as e:
+                # Only re-thresholding needs them
+                logger.warning(f"Failed to cache candidates of image {task.image_id}: {e}")
+        return task
+
+    @staticmethod
+    def _record_image(
+        job: Dict,
+        image_id: str,
+        annotations: List[Annotation],
+        prediction: Optional[SlicedPrediction],
+        image_stats: Dict
+    ) -> None:
+        """
+        Add an image's annotations and slicing statistics to its job.
+        Without a prediction the image reused a stored result.
+        """
+        stats = job["stats"]
+        stats["slice_grids"][image_id] = image_stats
+        if prediction is None:
+            stats["cache_hits"] += 1
+        else:
+            # Record the slice grid chosen for the image and the slices skipped
+            stats["total_slices"] += len(prediction.plan.grid)
+            stats["skipped_slices"] += prediction.skipped_slices
+            stats["unsliced_images"] += not prediction.plan.sliced
+            stats["model_inputs"] += prediction.model_inputs
+            stats["exhaustive_model_inputs"] += prediction.exhaustive_model_inputs
+            stats["streamed_images"] += prediction.streamed
+        if stats["exhaustive_model_inputs"] > 0:
+            stats["compute_saved"] = round(
+                1.0 - stats["model_inputs"] / stats["exhaustive_model_inputs"], 4
+            )
+        
+        # Running average over all objects found so far
+        total_objects = stats["total_objects"] + len(annotations)
+        if total_objects > 0:
+            stats["average_confidence"] = (
+                stats["average_confidence"] * stats["total_objects"]
+                + sum(annotation.confidence for annotation in annotations)
+            ) / total_objects
+        stats["total_objects"] = total_objects
+        job["annotations"].extend(annotations)
+
+    async def _finish_job(self, job_id: str) -> None:
+        """Store the results of a job whose images are all done and mark it completed."""
+        job = self._jobs.pop(job_id)
+        end_time = datetime.utcnow()
+        job.update(status="completed", end_time=end_time)
+        job["stats"]["processing_time"] = (end_time - (job["start_time"] or job["created_at"])).total_seconds()
+        
+        # Annotations go to a results file the job points to, so any
+        # process can serve them
+        results_path = self.results_dir / f"{job_id}.json"
+        fields = {
+            "status": "completed",
+            "end_time": end_time,
+            "processed_images": job["processed_images"],
+            "failed_images": job["failed_images"],
+            "stats": self._stored_stats(job["stats"]),
+            "result": {
+                "annotations_path": str(results_path),
+                "total_annotations": len(job["annotations"])
+            }
+        }
+        try:
+            await asyncio.to_thread(_write_annotations, results_path, job["annotations"])
+        except OSError as e:
+            logger.error(f"Failed to store results of labeling job {job_id}: {e}")
+            job["status"] = "failed"
+            fields.update(status="failed", error=f"Failed to store results: {e}", result=None)
+        await asyncio.to_thread(self.job_store.update_job, job_id, **fields)
+        
+        logger.info(
+            f"Labeling job {job_id} {job['status']}: {job['processed_images']} images labeled "
+            f"({job['stats']['cache_hits']} from stored results), {job['failed_images']} failed"
+        )
+        job["done"].set_result(None)
+
+    def _fail_interrupted_jobs(self) -> None:
+        """Mark jobs left unfinished by a stopped process on this host as failed."""
+        for job in self.job_store.list_jobs(JOB_TYPE, ACTIVE_STATUSES, limit=1000):
+            owner = (job.get("params") or {}).get("owner", "")
+            if _owner_alive(owner):
+                continue
+            logger.warning(f"Labeling job {job['job_id']} was interrupted, marking it failed")
+            self.job_store.update_job(
+                job["job_id"],
+                status="failed",
+                end_time=datetime.utcnow(),
+                error="Interrupted by a restart"
+            )
+
+    async def _predict(
+        self,
+        source: ImageSource,
+        image_path: Path,
+        confidence_threshold: Optional[float] = None,
+        slicing_mode: Optional[str] = None,
+        nms_threshold: Optional[float] = None
+    ) -> SlicedPrediction:
+        """Run sliced inference in the worker processes or the detector pool."""
+        keep_candidates = self.candidate_cache is not None
+        if self.workers is not None:
+            if isinstance(source, ArraySource):
+                return await self.workers.predict_async(
+                    source.image, confidence_threshold, slicing_mode, nms_threshold, keep_candidates
+                )
+            # Streamed images are read by the worker itself
+            return await self.workers.predict_file_async(
+                str(image_path), confidence_threshold, slicing_mode, nms_threshold, keep_candidates
+            )
+        # Concurrent requests use the other sessions of the detector pool
+        return await self.executor.run(
+            self.predictor.predict_source,
+            source,
+            slicing_mode,
+            conf_thresh=confidence_threshold,
+            nms_thresh=nms_threshold,
+            keep_candidates=keep_candidates
+        )
+
+    def _result_key(self, image_sha256: str, task: _ImageTask) -> str:
+        """Key of an image's labeling result: its content, the model and everything configuring the run."""
+        params = {
+            "image_sha256": image_sha256,
+            "model_version": self.model_version,
+            "confidence_threshold": (
+                self.config.CONF_THRESH if task.confidence_threshold is None else task.confidence_threshold
+            ),
+            "nms_threshold": self.config.NMS_THRESH if task.nms_threshold is None else task.nms_threshold,
+            "slicing_mode": task.slicing_mode or self.slice_config.mode,
+            **{name: getattr(self.config, name) for name in RESULT_CONFIG_FIELDS}
+        }
+        return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _result_path(self, image_id: str) -> Path:
+        """Annotations file of an image's latest result."""
+        return self.results_dir / "images" / f"{hashlib.sha1(image_id.encode()).hexdigest()}.json"
+
+    def _find_result(self, task: _ImageTask) -> None:
+        """
+        Key the image's result and reuse a stored one with the same key.
+        Hashes the image (and the model on first use), so call it off the
+        event loop.
+        """
+        task.result_key = self._result_key(file_sha256(task.image_path), task)
+        if task.force:
+            return
+        result = self.job_store.get_image_result(task.image_id)
+        if result is None or result["result_key"] != task.result_key:
+            return
+        try:
+            task.annotations = _read_annotations(Path(result["annotations_path"]))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Labeling image {task.image_id} again, its stored result is unreadable: {e}")
+            return
+        task.reused = True
+        task.reused_stats = result["stats"]
+
+    def _store_result(self, task: _ImageTask) -> None:
+        """Record the image's annotations as the result for its key."""
+        path = self._result_path(task.image_id)
+        _write_annotations(path, task.annotations)
+        self.job_store.set_image_result(
+            task.image_id,
+            result_key=task.result_key,
+            job_id=task.job_id,
+            annotations=len(task.annotations),
+            annotations_path=str(path),
+            stats=task.prediction.stats()
+        )
+
+    @property
+    def model_version(self) -> str:
+        """
+        Version of the model labeling runs with, keying its cached candidates.
+        Hashes the model file on first use, so read it off the event loop.
+        """
+        if self._model_version is None:
+            model_path = getattr(self.detector, "model_path", None) or self.config.model_path
+            self._model_version = model_version(model_path, self.config.INPUT_SIZE)
+        return self._model_version
+
+    async def rethreshold(
+        self,
+        image_ids: List[str],
+        confidence_threshold: Optional[float] = None,
+        nms_threshold: Optional[float] = None
+    ) -> Dict:
+        """
+        Recompute annotations of labeled images at new thresholds from their
+        cached candidates, without running the model.
+        
+        Args:
+            image_ids: Images labeled with the current model
+            confidence_threshold: Confidence threshold (defaults to config),
+                at least the candidate floor
+            nms_threshold: NMS threshold (defaults to config)
+            
+        Returns:
+            Dict containing annotations per image, errors for images without
+            cached candidates, and timing
+            
+        Raises:
+            LabelingError: If the candidate cache is disabled
+        """
+        if self.candidate_cache is None:
+            raise LabelingError("Candidate cache is disabled (MODELSHIP_CANDIDATE_CACHE)")
+        confidence_threshold = self.config.CONF_THRESH if confidence_threshold is None else confidence_threshold
+        nms_threshold = self.config.NMS_THRESH if nms_threshold is None else nms_threshold
+        version = await asyncio.to_thread(lambda: self.model_version)
+        
+        def _apply(image_id: str) -> List[Annotation]:
+            candidates = self.candidate_cache.get(image_id, version)
+            if candidates is None:
+                raise LabelingError(f"No cached candidates for image {image_id}, label it again")
+            detections = candidates.apply_thresholds(confidence_threshold, nms_threshold)
+            return SAHIWrapper.to_annotations(detections, image_id)
+        
+        start_time = time.perf_counter()
+        annotations: Dict[str, List[Annotation]] = {}
+        errors = []
+        for image_id in dict.fromkeys(image_ids):
+            try:
+                annotations[image_id] = await asyncio.to_thread(_apply, image_id)
+            except (LabelingError, CandidateError) as e:
+                errors.append(str(e))
+        
+        return {
+            "confidence_threshold": confidence_threshold,
+            "nms_threshold": nms_threshold,
+            "model_version": version,
+            "annotations": annotations,
+            "errors": errors,
+            "stats": {
+                "images": len(annotations),
+                "total_objects": sum(len(image_annotations) for image_annotations in annotations.values()),
+                "processing_time": round(time.perf_counter() - start_time, 4)
+            }
+        }
+
+    async def get_job_status(self, job_id: str, include_annotations: bool = True) -> Dict:
+        """Get status, per-image progress, throughput, ETA and results of a labeling job."""
+        try:
+            job = await asyncio.to_thread(self.job_store.get_job, job_id)
+            if job is None or job["job_type"] != JOB_TYPE:
                 raise LabelingError(f"Job {job_id} not found")
-                
-            return self._jobs[job_id]
+            images = await asyncio.to_thread(self.job_store.get_job_images, job_id)
+            
+            params = job["params"] or {}
+            status = {
+                "job_id": job_id,
+                "status": job["status"],
+                "created_at": job["created_at"],
+                "start_time": job["start_time"],
+                "end_time": job["end_time"],
+                "error": job["error"],
+                "confidence_threshold": params.get("confidence_threshold"),
+                "nms_threshold": params.get("nms_threshold"),
+                "slicing_mode": params.get("slicing_mode"),
+                "force": params.get("force", False),
+                "total_images": job["total_images"],
+                "processed_images": job["processed_images"],
+                "failed_images": job["failed_images"],
+                "images": {
+                    image_id: {
+                        "status": image["status"],
+                        "annotations": image["annotations"],
+                        "processing_time": image["processing_time"],
+                        "cached": bool((image["stats"] or {}).get("cached")),
+                        "error": image["error"]
+                    }
+                    for image_id, image in images.items()
+                },
+                "errors": [
+                    f"Failed to process image {image_id}: {image['error']}"
+                    for image_id, image in images.items()
+                    if image["status"] == "failed"
+                ],
+                "stats": {
+                    **(job["stats"] or {}),
+                    "slice_grids": {
+                        image_id: image["stats"]
+                        for image_id, image in images.items()
+                        if image["stats"]
+                    }
+                },
+                "result": job["result"],
+                "progress": job_progress(
+                    job["total_images"],
+                    job["processed_images"] + job["failed_images"],
+                    job["start_time"],
+                    job["end_time"]
+                )
+            }
+            if include_annotations:
+                status["annotations"] = await self._get_annotations(job_id, job["result"])
+            return status
             
         except Exception as e:
             logger.error(f"Failed to get job status: {str(e)}")
             raise LabelingError(f"Failed to get job status: {str(e)}")
 
+    async def _get_annotations(self, job_id: str, result: Optional[Dict]) -> List[Annotation]:
+        """Get the annotations of a job found so far."""
+        if job_id in self._jobs:
+            return list(self._jobs[job_id]["annotations"])
+        if result and result.get("annotations_path"):
+            return await asyncio.to_thread(_read_annotations, Path(result["annotations_path"]))
+        return []
+
+    def get_execution_stats(self) -> Dict:
+        """Get job queue, pipeline stage, executor and event loop lag statistics."""
+        return {
+            "job_queue": self.job_queue.stats(),
+            "pipeline": self.pipeline.stats(),
+            "executor": self.executor.stats(),
+            "event_loop": loop_monitor.stats()
+        }
+
+    async def close(self) -> None:
+        """Stop the job workers and the pipeline."""
+        await self.job_queue.close()
+        await self.pipeline.close()
+
     async def get_model_config(self) -> Dict:
         """Get current model and SAHI configuration."""
         try:
             return {
                 "model_path": str(self.config.model_path),
+                "model_precision": self.config.MODEL_PRECISION,
                 "confidence_threshold": self.config.CONF_THRESH,
                 "nms_threshold": self.config.NMS_THRESH,
                 "input_size": self.config.INPUT_SIZE,
@@ -175,6 +801,19 @@ class LabelingService:
                 "slice_width": self.config.SLICE_WIDTH,
                 "overlap_height_ratio": self.config.OVERLAP_HEIGHT_RATIO,
                 "overlap_width_ratio": self.config.OVERLAP_WIDTH_RATIO,
+                "auto_slice_resolution": self.config.AUTO_SLICE_RESOLUTION,
+                "min_object_size": self.config.MIN_OBJECT_SIZE,
+                "full_frame_pass": self.config.FULL_FRAME_PASS,
+                "slice_skip_min_contrast": self.config.SLICE_SKIP_MIN_CONTRAST,
+                "slicing_mode": self.config.SLICING_MODE,
+                "coarse_conf_thresh": self.config.COARSE_CONF_THRESH,
+                "coarse_sample_ratio": self.config.COARSE_SAMPLE_RATIO,
+                "postprocess_type": self.config.POSTPROCESS_TYPE,
+                "postprocess_match_metric": self.config.POSTPROCESS_MATCH_METRIC,
+                "postprocess_match_threshold": self.config.POSTPROCESS_MATCH_THRESHOLD,
+                "postprocess_class_agnostic": self.config.POSTPROCESS_CLASS_AGNOSTIC,
+                "candidate_cache": self.config.CANDIDATE_CACHE,
+                "candidate_conf_thresh": self.config.CANDIDATE_CONF_THRESH,
                 "classes": self.config.CLASSES
             }
         except Exception as e:
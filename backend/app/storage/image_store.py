@@ -24,9 +24,9 @@ from app.models.annotation import Annotation, BoundingBox
 logger = logging.getLogger(__name__)
 
 # Constants
-MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
-ALLOWED_MIME_TYPES = ['image/jpeg', 'image/png', 'image/webp']
-MAX_IMAGE_DIMENSION = 4096  # Maximum width or height
+MAX_FILE_SIZE = settings.MAX_FILE_SIZE  # Maximum upload size in bytes
+ALLOWED_MIME_TYPES = ['image/jpeg', 'image/png', 'image/webp', 'image/tiff']
+MAX_IMAGE_DIMENSION = settings.MAX_IMAGE_DIMENSION  # Maximum width or height
 
 class ImageMetadata(BaseModel):
     """Metadata for stored images."""
@@ -179,11 +179,12 @@ class ImageStore:
         image_id: str,
         annotations: List[Annotation]
     ):
-        """Store annotations for an image."""
+        """Store annotations for an image, replacing any it already has."""
         try:
             # Convert annotations to database format
             annotation_data = [
                 {
+                    "id": str(uuid.uuid4()),
                     "image_id": image_id,
                     "class_id": ann.class_id,
                     "class_name": ann.class_name,
@@ -198,12 +199,35 @@ class ImageStore:
                 for ann in annotations
             ]
             
+            # Relabeling replaces the image's annotations instead of adding
+            # a second copy. The new ones go in before the old ones are
+            # deleted, so a failed insert leaves the image as it was
+            existing = await self.supabase.table("annotations") \
+                .select("id") \
+                .eq("image_id", image_id) \
+                .execute()
+            old_ids = [row["id"] for row in existing.data or []]
+            
             # Insert annotations in batches of 100
             batch_size = 100
-            for i in range(0, len(annotation_data), batch_size):
-                batch = annotation_data[i:i + batch_size]
+            try:
+                for i in range(0, len(annotation_data), batch_size):
+                    batch = annotation_data[i:i + batch_size]
+                    await self.supabase.table("annotations") \
+                        .insert(batch) \
+                        .execute()
+            except Exception:
+                # Take back the batches already inserted
+                await self.supabase.table("annotations") \
+                    .delete() \
+                    .in_("id", [row["id"] for row in annotation_data]) \
+                    .execute()
+                raise
+            
+            for i in range(0, len(old_ids), batch_size):
                 await self.supabase.table("annotations") \
-                    .insert(batch) \
+                    .delete() \
+                    .in_("id", old_ids[i:i + batch_size]) \
                     .execute()
                 
         except Exception as e:
@@ -0,0 +1,479 @@
+# app/storage/job_store.py
+"""
+Durable storage of job state.
+
+Labeling and export jobs are recorded in a job store so their status
+survives restarts and can be polled from any API worker process, not only
+the one running the job. The store keeps one row per job (status, progress
+counters, parameters, statistics and result pointers such as an export
+file) and one row per image of the job; results themselves live elsewhere.
+
+It also keeps the latest labeling result of each image: the key it was
+computed for (image content, model and config) and where its annotations
+are, so a later batch can reuse it instead of labeling the image again.
+
+Progress is written in batches: per-image updates and counter changes are
+buffered and written in one transaction every JOB_STORE_FLUSH_INTERVAL
+seconds, while status changes are written at once. Reads in the process
+that buffered a change already see it.
+
+SQLiteJobStore keeps the jobs and job_images tables of
+supabase/schema.sql and the image_results table in a local database file.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Job columns holding JSON documents and timestamps
+JSON_FIELDS = ("params", "stats", "result")
+DATETIME_FIELDS = ("created_at", "updated_at", "start_time", "end_time")
+
+JOB_FIELDS = (
+    "job_id", "job_type", "status", "total_images", "processed_images", "failed_images",
+    *DATETIME_FIELDS, "error", *JSON_FIELDS
+)
+IMAGE_FIELDS = ("status", "annotations", "processing_time", "processed_at", "error", "stats")
+RESULT_FIELDS = ("result_key", "job_id", "annotations", "annotations_path", "stats", "labeled_at")
+
+# Jobs that are neither completed nor failed
+ACTIVE_STATUSES = ("queued", "processing")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    job_type TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    total_images INTEGER NOT NULL DEFAULT 0,
+    processed_images INTEGER NOT NULL DEFAULT 0,
+    failed_images INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    start_time TEXT,
+    end_time TEXT,
+    error TEXT,
+    params TEXT,
+    stats TEXT,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+CREATE INDEX IF NOT EXISTS idx_jobs_type_created ON jobs(job_type, created_at);
+
+CREATE TABLE IF NOT EXISTS job_images (
+    job_id TEXT NOT NULL REFERENCES jobs(job_id) ON DELETE CASCADE,
+    image_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    annotations INTEGER NOT NULL DEFAULT 0,
+    processing_time REAL,
+    processed_at TEXT,
+    error TEXT,
+    stats TEXT,
+    PRIMARY KEY (job_id, image_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS image_results (
+    image_id TEXT PRIMARY KEY,
+    result_key TEXT NOT NULL,
+    job_id TEXT,
+    annotations INTEGER NOT NULL DEFAULT 0,
+    annotations_path TEXT NOT NULL,
+    stats TEXT,
+    labeled_at TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+class JobStoreError(Exception):
+    """Custom exception for job store errors."""
+    pass
+
+
+class JobStore(ABC):
+    """Interface of job stores; implementations must provide every abstract method."""
+
+    @abstractmethod
+    def create_job(self, job: Dict, image_ids: Sequence[str] = ()) -> None:
+        """
+        Record a new job and its images, written at once.
+
+        Args:
+            job: Job fields (see JOB_FIELDS); job_id and job_type are required
+            image_ids: Images of the job, in processing order
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_job(self, job_id: str, **fields: Any) -> None:
+        """Update job fields; buffered unless the status changes."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_image(self, job_id: str, image_id: str, **fields: Any) -> None:
+        """Update fields of one image of a job (see IMAGE_FIELDS); buffered."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Get a job's fields, or None if there is no such job."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_job_images(self, job_id: str) -> Dict[str, Dict]:
+        """Get the fields of a job's images by image ID, in processing order."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_jobs(
+        self,
+        job_type: Optional[str] = None,
+        statuses: Optional[Sequence[str]] = None,
+        limit: int = 100
+    ) -> List[Dict]:
+        """Get the most recent jobs, optionally of one type and in the given statuses."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_job(self, job_id: str) -> None:
+        """Remove a job and its images."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_image_result(self, image_id: str) -> Optional[Dict]:
+        """Get the latest labeling result of an image (see RESULT_FIELDS), or None."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_image_result(self, image_id: str, **fields: Any) -> None:
+        """
+        Record the latest labeling result of an image, written at once.
+
+        Args:
+            image_id: Labeled image
+            **fields: Result fields; result_key and annotations_path are required
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_image_result(self, image_id: str) -> None:
+        """Forget the labeling result of an image, written at once."""
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Write buffered updates."""
+
+    def close(self) -> None:
+        """Write buffered updates and release the store."""
+        self.flush()
+
+
+def _encode(field: str, value: Any) -> Any:
+    """Convert a field value to its column value."""
+    if value is None:
+        return None
+    if field in JSON_FIELDS:
+        return json.dumps(value, default=str)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _decode_row(row: sqlite3.Row, datetime_fields: Sequence[str], json_fields: Sequence[str]) -> Dict:
+    """Convert a row to a dict of field values."""
+    values = dict(row)
+    for field in datetime_fields:
+        if values.get(field) is not None:
+            values[field] = datetime.fromisoformat(values[field])
+    for field in json_fields:
+        if values.get(field) is not None:
+            values[field] = json.loads(values[field])
+    return values
+
+
+class SQLiteJobStore(JobStore):
+    """Job store in a local SQLite database, safe to share between processes."""
+
+    def __init__(self, path: Optional[Union[str, Path]] = None, flush_interval: Optional[float] = None):
+        """
+        Open (and create if needed) the database and start the flusher thread.
+
+        Args:
+            path: Database file (defaults to settings)
+            flush_interval: Seconds between batched progress writes
+                (defaults to settings)
+        """
+        self.path = Path(path or settings.JOB_STORE_PATH)
+        self.flush_interval = (
+            settings.JOB_STORE_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # One connection per thread; WAL lets readers in other processes
+        # poll while a job writes
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+
+        # Buffered updates, latest value per field wins
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # Keeps writes in buffering order
+        self._job_updates: Dict[str, Dict] = {}
+        self._image_updates: Dict[Tuple[str, str], Dict] = {}
+        self._writes = 0
+        self._flushes = 0
+
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._run_flusher, name="job-store-flusher", daemon=True)
+        self._flusher.start()
+        logger.info(f"Job store at {self.path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this thread's connection."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("PRAGMA foreign_keys=ON")
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def _run_flusher(self) -> None:
+        """Flush buffered updates periodically until closed."""
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to flush job updates: {e}")
+
+    def create_job(self, job: Dict, image_ids: Sequence[str] = ()) -> None:
+        now = datetime.utcnow()
+        row = {"status": "queued", "created_at": now, **job, "updated_at": now}
+        row.setdefault("total_images", len(image_ids))
+        unknown = set(row) - set(JOB_FIELDS)
+        if unknown:
+            raise JobStoreError(f"Unknown job fields: {sorted(unknown)}")
+
+        fields = list(row)
+        try:
+            with self._connection() as connection:
+                connection.execute(
+                    f"INSERT INTO jobs ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})",
+                    [_encode(field, row[field]) for field in fields]
+                )
+                connection.executemany(
+                    "INSERT INTO job_images (job_id, image_id, position) VALUES (?, ?, ?)",
+                    [(row["job_id"], image_id, position) for position, image_id in enumerate(image_ids)]
+                )
+        except sqlite3.Error as e:
+            raise JobStoreError(f"Failed to create job {row['job_id']}: {e}")
+
+    def update_job(self, job_id: str, **fields: Any) -> None:
+        unknown = set(fields) - set(JOB_FIELDS)
+        if unknown:
+            raise JobStoreError(f"Unknown job fields: {sorted(unknown)}")
+        with self._lock:
+            self._job_updates.setdefault(job_id, {}).update(fields)
+        # Status changes are what pollers wait for
+        if "status" in fields:
+            self.flush()
+
+    def update_image(self, job_id: str, image_id: str, **fields: Any) -> None:
+        unknown = set(fields) - set(IMAGE_FIELDS)
+        if unknown:
+            raise JobStoreError(f"Unknown image fields: {sorted(unknown)}")
+        with self._lock:
+            self._image_updates.setdefault((job_id, image_id), {}).update(fields)
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        with self._lock:
+            job_updates, self._job_updates = self._job_updates, {}
+            image_updates, self._image_updates = self._image_updates, {}
+        if not job_updates and not image_updates:
+            return
+
+        # Group updates setting the same fields into one statement each
+        now = datetime.utcnow()
+        statements: Dict[str, List[List]] = {}
+        for job_id, fields in job_updates.items():
+            fields = {**fields, "updated_at": now}
+            sql = f"UPDATE jobs SET {', '.join(f'{field} = ?' for field in fields)} WHERE job_id = ?"
+            statements.setdefault(sql, []).append(
+                [_encode(field, value) for field, value in fields.items()] + [job_id]
+            )
+        for (job_id, image_id), fields in image_updates.items():
+            sql = (
+                f"UPDATE job_images SET {', '.join(f'{field} = ?' for field in fields)} "
+                "WHERE job_id = ? AND image_id = ?"
+            )
+            statements.setdefault(sql, []).append(
+                [_encode(field, value) for field, value in fields.items()] + [job_id, image_id]
+            )
+
+        try:
+            with self._connection() as connection:
+                for sql, rows in statements.items():
+                    connection.executemany(sql, rows)
+        except sqlite3.Error:
+            # Put the updates back under any newer ones so they are retried
+            with self._lock:
+                for job_id, fields in job_updates.items():
+                    self._job_updates[job_id] = {**fields, **self._job_updates.get(job_id, {})}
+                for key, fields in image_updates.items():
+                    self._image_updates[key] = {**fields, **self._image_updates.get(key, {})}
+            raise
+        with self._lock:
+            self._writes += len(job_updates) + len(image_updates)
+            self._flushes += 1
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        row = self._connection().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = _decode_row(row, DATETIME_FIELDS, JSON_FIELDS)
+        with self._lock:
+            job.update(self._job_updates.get(job_id, {}))
+        return job
+
+    def get_job_images(self, job_id: str) -> Dict[str, Dict]:
+        rows = self._connection().execute(
+            f"SELECT image_id, {', '.join(IMAGE_FIELDS)} FROM job_images WHERE job_id = ? ORDER BY position",
+            (job_id,)
+        ).fetchall()
+        images = {}
+        with self._lock:
+            for row in rows:
+                image = _decode_row(row, ("processed_at",), ("stats",))
+                image_id = image.pop("image_id")
+                image.update(self._image_updates.get((job_id, image_id), {}))
+                images[image_id] = image
+        return images
+
+    def list_jobs(
+        self,
+        job_type: Optional[str] = None,
+        statuses: Optional[Sequence[str]] = None,
+        limit: int = 100
+    ) -> List[Dict]:
+        conditions, parameters = [], []
+        if job_type is not None:
+            conditions.append("job_type = ?")
+            parameters.append(job_type)
+        if statuses:
+            conditions.append(f"status IN ({', '.join('?' * len(statuses))})")
+            parameters.extend(statuses)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._connection().execute(
+            f"SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT ?",
+            (*parameters, limit)
+        ).fetchall()
+        return [_decode_row(row, DATETIME_FIELDS, JSON_FIELDS) for row in rows]
+
+    def delete_job(self, job_id: str) -> None:
+        with self._lock:
+            self._job_updates.pop(job_id, None)
+            for key in [key for key in self._image_updates if key[0] == job_id]:
+                del self._image_updates[key]
+        with self._connection() as connection:
+            connection.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def get_image_result(self, image_id: str) -> Optional[Dict]:
+        row = self._connection().execute(
+            f"SELECT {', '.join(RESULT_FIELDS)} FROM image_results WHERE image_id = ?", (image_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return _decode_row(row, ("labeled_at",), ("stats",))
+
+    def set_image_result(self, image_id: str, **fields: Any) -> None:
+        row = {"labeled_at": datetime.utcnow(), **fields}
+        unknown = set(row) - set(RESULT_FIELDS)
+        if unknown:
+            raise JobStoreError(f"Unknown result fields: {sorted(unknown)}")
+        missing = {"result_key", "annotations_path"} - set(row)
+        if missing:
+            raise JobStoreError(f"Missing result fields: {sorted(missing)}")
+
+        fields = list(row)
+        try:
+            with self._connection() as connection:
+                connection.execute(
+                    f"INSERT OR REPLACE INTO image_results (image_id, {', '.join(fields)}) "
+                    f"VALUES (?, {', '.join('?' * len(fields))})",
+                    [image_id] + [_encode(field, row[field]) for field in fields]
+                )
+        except sqlite3.Error as e:
+            raise JobStoreError(f"Failed to store result of image {image_id}: {e}")
+
+    def delete_image_result(self, image_id: str) -> None:
+        with self._connection() as connection:
+            connection.execute("DELETE FROM image_results WHERE image_id = ?", (image_id,))
+
+    def stats(self) -> Dict:
+        """Get buffered and written update counts."""
+        with self._lock:
+            return {
+                "path": str(self.path),
+                "flush_interval": self.flush_interval,
+                "pending_updates": len(self._job_updates) + len(self._image_updates),
+                "rows_written": self._writes,
+                "flushes": self._flushes
+            }
+
+    def close(self) -> None:
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+        self._local = threading.local()
+        logger.info("Job store closed")
+
+
+# Process-wide job store, created on first use
+_job_store: Optional[JobStore] = None
+_job_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """Get the shared job store of the configured backend."""
+    global _job_store
+    with _job_store_lock:
+        if _job_store is None:
+            backend = settings.JOB_STORE_BACKEND.lower()
+            if backend == "sqlite":
+                _job_store = SQLiteJobStore()
+            else:
+                raise JobStoreError(f"Unknown job store backend {settings.JOB_STORE_BACKEND}")
+        return _job_store
+
+
+def close_job_store() -> None:
+    """Flush and close the shared job store if it was created."""
+    global _job_store
+    with _job_store_lock:
+        if _job_store is not None:
+            _job_store.close()
+            _job_store = None
@@ -89,7 +89,7 @@ class LabelStore:
         user_id: Optional[str] = None
     ):
         """
-        Store annotations for an image.
+        Store annotations for an image, replacing any it already has.
         
         Args:
             image_id: ID of the image
@@ -118,10 +118,25 @@ class LabelStore:
                 for ann in annotations
             ]
             
-            # Store in database
-            self.supabase.table("annotations") \
-                .insert(annotation_data) \
+            # Earlier annotations of the image are dropped so a relabel does
+            # not duplicate them, but only once the new ones are in
+            existing = self.supabase.table("annotations") \
+                .select("id") \
+                .eq("image_id", image_id) \
                 .execute()
+            old_ids = [row["id"] for row in existing.data or []]
+            
+            # Store in database
+            if annotation_data:
+                self.supabase.table("annotations") \
+                    .insert(annotation_data) \
+                    .execute()
+            
+            if old_ids:
+                self.supabase.table("annotations") \
+                    .delete() \
+                    .in_("id", old_ids) \
+                    .execute()
             
         except Exception as e:
             raise LabelStoreError(f"Failed to store annotations: {str(e)}")
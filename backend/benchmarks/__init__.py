@@ -0,0 +1,5 @@
+"""
+Benchmarks for ModelShip pipeline components.
+
+Run from the backend directory, e.g. `python -m benchmarks.preprocess_benchmark`.
+"""
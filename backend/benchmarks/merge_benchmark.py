@@ -0,0 +1,115 @@
+# benchmarks/merge_benchmark.py
+"""
+Compare the NumPy slice merge engine against SAHI's postprocessing.
+
+Synthetic candidates are clustered like duplicates from overlapping slices
+of a large image: several boxes of slightly different extent and score per
+object. SAHI wraps every box in an ObjectPrediction and matches each kept
+box against all remaining boxes, so its time grows quadratically; the
+engine only compares boxes whose x ranges intersect.
+
+SAHI (and torch) are optional; without them only the engine is timed.
+
+Usage:
+    python -m benchmarks.merge_benchmark [--iterations 20] [--metric IOU]
+"""
+
+import argparse
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from app.pipeline.merge import MERGE_TYPES, merge_detections
+from app.pipeline.postprocess import Detections
+from benchmarks.postprocess_benchmark import time_call
+
+CANDIDATES = [500, 2000, 5000]
+DUPLICATES_PER_OBJECT = 4
+NUM_CLASSES = 10
+IMAGE_SIZE = 8192
+
+
+def make_detections(count: int, rng: np.random.Generator) -> Detections:
+    """Build `count` candidates, DUPLICATES_PER_OBJECT per object on average."""
+    objects = max(count // DUPLICATES_PER_OBJECT, 1)
+    centers = rng.uniform(0, IMAGE_SIZE, (objects, 2))
+    sizes = rng.uniform(16, 128, (objects, 2))
+    owner = rng.integers(0, objects, count)
+    center = centers[owner] + rng.normal(0, 3, (count, 2))
+    half = sizes[owner] * rng.uniform(0.4, 0.6, (count, 2))
+    return Detections(
+        boxes=np.concatenate([center - half, center + half], axis=1).astype(np.float32),
+        scores=rng.uniform(0.3, 1.0, count).astype(np.float32),
+        class_ids=(owner % NUM_CLASSES).astype(np.int32)
+    )
+
+
+def sahi_merge(postprocess_type: str, metric: str, threshold: float) -> Optional[Callable[[Detections], List]]:
+    """Get SAHI's postprocess for the given settings, or None if SAHI is not installed."""
+    try:
+        from sahi.postprocess.combine import GreedyNMMPostprocess, NMMPostprocess, NMSPostprocess
+        from sahi.prediction import ObjectPrediction
+    except ImportError:
+        return None
+
+    postprocess_class = {
+        "NMS": NMSPostprocess,
+        "NMM": NMMPostprocess,
+        "GREEDYNMM": GreedyNMMPostprocess
+    }[postprocess_type]
+    postprocess = postprocess_class(match_threshold=threshold, match_metric=metric, class_agnostic=False)
+
+    def merge(detections: Detections) -> List:
+        predictions = [
+            ObjectPrediction(bbox=box, category_id=class_id, category_name=str(class_id), score=score)
+            for box, score, class_id in zip(
+                detections.boxes.tolist(),
+                detections.scores.tolist(),
+                detections.class_ids.tolist()
+            )
+        ]
+        return postprocess(predictions)
+
+    return merge
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--sahi-iterations", type=int, default=1)
+    parser.add_argument("--metric", default="IOU", choices=["IOU", "IOS"])
+    parser.add_argument("--threshold", type=float, default=0.5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    sets = {count: make_detections(count, rng) for count in CANDIDATES}
+
+    if sahi_merge("NMS", args.metric, args.threshold) is None:
+        print("sahi is not installed, timing the merge engine only\n")
+
+    print(f"{'type':>10} {'boxes':>6} {'kept':>6} {'sahi kept':>10} {'sahi ms':>10} {'engine ms':>10} {'speedup':>8}")
+    for postprocess_type in MERGE_TYPES:
+        reference = sahi_merge(postprocess_type, args.metric, args.threshold)
+        for count, detections in sets.items():
+            def engine() -> Detections:
+                return merge_detections(
+                    detections, postprocess_type, args.metric, args.threshold, class_agnostic=False
+                )
+
+            kept = len(engine())
+            engine_seconds = time_call(engine, args.iterations)
+            if reference is None:
+                print(f"{postprocess_type:>10} {count:>6} {kept:>6} {'-':>10} {'-':>10} {engine_seconds * 1e3:>10.2f} {'-':>8}")
+                continue
+
+            sahi_kept = len(reference(detections))
+            sahi_seconds = time_call(lambda: reference(detections), args.sahi_iterations)
+            print(
+                f"{postprocess_type:>10} {count:>6} {kept:>6} {sahi_kept:>10} "
+                f"{sahi_seconds * 1e3:>10.2f} {engine_seconds * 1e3:>10.2f} "
+                f"{sahi_seconds / engine_seconds:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/postprocess_benchmark.py
+"""
+Compare vectorized postprocessing against the previous cv2-based path.
+
+Synthetic YOLOX outputs are generated with an increasing number of
+confident anchors to mimic crowded scenes.
+
+Usage:
+    python -m benchmarks.postprocess_benchmark [--iterations 50]
+"""
+
+import argparse
+import time
+from typing import Callable, Dict, List
+
+import cv2
+import numpy as np
+
+from app.pipeline.config import config
+from app.pipeline.postprocess import postprocess, xywh2xyxy
+
+NUM_ANCHORS = 8400
+NUM_CLASSES = 80
+CONFIDENT_ANCHORS = [10, 200, 1000, 4000]
+
+
+def legacy_postprocess(outputs: np.ndarray, conf_thresh: float, nms_thresh: float) -> List[Dict]:
+    """Previous YOLOXDetector._postprocess implementation (without rescaling)."""
+    predictions = []
+    scores = outputs[..., 4:5] * outputs[..., 5:]
+    boxes = outputs[..., :4]
+    mask = scores.max(1) > conf_thresh
+    boxes = boxes[mask]
+    scores = scores[mask]
+    if boxes.shape[0] == 0:
+        return predictions
+    class_ids = np.argmax(scores, axis=1)
+    confidences = scores.max(1)
+    boxes = xywh2xyxy(boxes)
+    indices = cv2.dnn.NMSBoxes(boxes.tolist(), confidences.tolist(), conf_thresh, nms_thresh)
+    for idx in indices:
+        idx = idx if isinstance(idx, int) else idx.item()
+        predictions.append({
+            "bbox": boxes[idx].tolist(),
+            "confidence": float(confidences[idx]),
+            "class_id": int(class_ids[idx]),
+            "class_name": config.get_class_name(class_ids[idx])
+        })
+    return predictions
+
+
+def make_outputs(confident: int, rng: np.random.Generator) -> np.ndarray:
+    """Build one image's decoded outputs with `confident` high-objectness anchors."""
+    outputs = np.zeros((NUM_ANCHORS, 5 + NUM_CLASSES), dtype=np.float32)
+    outputs[:, :2] = rng.uniform(0, 640, (NUM_ANCHORS, 2))
+    outputs[:, 2:4] = rng.uniform(8, 64, (NUM_ANCHORS, 2))
+    outputs[:, 4] = rng.uniform(0, 0.1, NUM_ANCHORS)
+    outputs[rng.choice(NUM_ANCHORS, confident, replace=False), 4] = rng.uniform(0.5, 1.0, confident)
+    outputs[:, 5:] = rng.uniform(0, 1, (NUM_ANCHORS, NUM_CLASSES)) ** 4
+    return outputs
+
+
+def time_call(fn: Callable[[], object], iterations: int) -> float:
+    """Mean seconds per call after one warmup call."""
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--conf-thresh", type=float, default=0.3)
+    parser.add_argument("--nms-thresh", type=float, default=0.45)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'confident':>10} {'legacy ms':>10} {'vectorized ms':>14} {'speedup':>8}")
+    for confident in CONFIDENT_ANCHORS:
+        outputs = make_outputs(confident, rng)
+        legacy = time_call(
+            lambda: legacy_postprocess(outputs, args.conf_thresh, args.nms_thresh),
+            args.iterations
+        )
+        vectorized = time_call(
+            lambda: postprocess(outputs, args.conf_thresh, args.nms_thresh),
+            args.iterations
+        )
+        print(f"{confident:>10} {legacy * 1e3:>10.2f} {vectorized * 1e3:>14.2f} {legacy / vectorized:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# benchmarks/slicing_benchmark.py
+"""
+Compare NumPy view slicing against the previous PIL round-trip.
+
+The previous SAHIWrapper converted the image to PIL, let SAHI crop every
+slice and converted each crop back with np.array, copying the image once
+and every slice twice. Slicing into views copies nothing, so its time is
+just the grid computation and its memory columns should be zero.
+
+Usage:
+    python -m benchmarks.slicing_benchmark [--iterations 20] [--overlap 0.2]
+"""
+
+import argparse
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.pipeline.slicing import get_slice_grid, slice_views
+from benchmarks.preprocess_benchmark import measure
+
+IMAGE_SHAPES: List[Tuple[int, int]] = [(1080, 1920), (3000, 4000), (4096, 4096)]
+
+
+def legacy_slices(image: np.ndarray, grid: np.ndarray) -> List[np.ndarray]:
+    """Previous path: PIL image, one crop per slice, back to numpy."""
+    pil_image = Image.fromarray(image)
+    return [np.array(pil_image.crop(tuple(window))) for window in grid.tolist()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--slice-size", type=int, default=512)
+    parser.add_argument("--overlap", type=float, default=0.2)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+
+    print(f"{'image':>12} {'slices':>7} {'path':>7} {'ms':>9} {'retained':>9} {'peak MB':>8}")
+    for height, width in IMAGE_SHAPES:
+        image = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+        def native() -> List[np.ndarray]:
+            grid = get_slice_grid(
+                height, width, args.slice_size, args.slice_size, args.overlap, args.overlap
+            )
+            return slice_views(image, grid)
+
+        grid = get_slice_grid(
+            height, width, args.slice_size, args.slice_size, args.overlap, args.overlap
+        )
+        for name, fn in (
+            ("pil", lambda: legacy_slices(image, grid)),
+            ("views", native)
+        ):
+            result = measure(fn, args.iterations)
+            print(
+                f"{width:>5}x{height:<6} {len(grid):>7} {name:>7} "
+                f"{result['seconds_per_call'] * 1000:>9.3f} "
+                f"{result['retained_allocations']:>9} "
+                f"{result['peak_bytes'] / 1024 / 1024:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()